@@ -1,23 +1,62 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
-db = SQLAlchemy()
+from .transactions import ShopSession
+
+db = SQLAlchemy(session_options={"class_": ShopSession})
 
-def create_app():
+from .cache import cache
+from .auth import auth
+from .idempotency import idempotency
+from .json_provider import JSON_PROVIDERS
+from .engine import init_engine_profile, init_sqlite_pragmas
+
+def create_app(config_object=None):
     app = Flask(__name__)
-    app.config.from_object('config.Config')
-    
+    app.config.from_object(config_object or os.environ.get("SHOP_CONFIG", "config.Config"))
+    if not app.config.get("SECRET_KEY"):
+        # Access tokens are signed with it; a shared default would let anyone forge them
+        raise RuntimeError("SECRET_KEY is not set")
+    app.json = JSON_PROVIDERS[app.config.get("JSON_PROVIDER", "default")](app)
+
+    init_engine_profile(app)
     db.init_app(app)    
+    cache.init_app(app)
+    auth.init_app(app)
+    idempotency.init_app(app)
     CORS(app)  # Enable CORS for all routes
     
     with app.app_context():
+        init_sqlite_pragmas(db.engine, app.config.get("SQLITE_PRAGMAS"))
+        from .events import init_events
+        init_events()
+
         from . import models, routes
-        db.create_all()
+        # Before migrating: rebuilding rollups reads archived history
+        from .archive import init_archive
+        init_archive(app)
+        if app.config.get("AUTO_MIGRATE", True):
+            from .migrations import upgrade
+            upgrade(db.engine)
+
+        from .query_budget import init_query_budget
+        init_query_budget(app, db.engines.values())
         
         from .routes import bp as api_bp
+        from .metrics import init_metrics
+        init_metrics(app, db.engines.values(), api_bp)
+        from .inventory import init_inventory
+        init_inventory(app, api_bp)
+        from .replicas import init_read_replica
+        init_read_replica(app, api_bp)
         app.register_blueprint(api_bp)
 
+        from .commands import register_commands
+        register_commands(app)
+
     
         
     return app
\ No newline at end of file
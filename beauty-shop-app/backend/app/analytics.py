@@ -0,0 +1,151 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from . import archive, db
+from .dialects import dialect_name
+from .models import Customer, Order, OrderItem, Product
+
+BUCKETS = ("day", "week", "month")
+GROUPINGS = ("product", "customer")
+
+
+def time_bucket(column, bucket, dialect=None):
+    """SQL expression truncating ``column`` to the start of its day/week/month."""
+    if (dialect or dialect_name()) == "postgresql":
+        return func.date_trunc(bucket, column)
+    if bucket == "day":
+        return func.date(column)
+    if bucket == "week":
+        # Weeks start on Monday, matching PostgreSQL's date_trunc('week')
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", column)
+
+
+def profit_loss_breakdown(start=None, end=None, bucket=None, group_by=None):
+    """Aggregate revenue and cost of completed orders in a single grouped query.
+
+    Costs come from the snapshot stored on each order item, so no join to
+    the live products table is needed unless grouping by product. When the
+    range reaches back into archived orders, the same aggregate over the
+    archive is added in.
+    """
+    revenue = func.coalesce(func.sum(OrderItem.quantity * OrderItem.price), 0)
+    cost = func.coalesce(func.sum(OrderItem.quantity * OrderItem.cost_price), 0)
+
+    keys = []
+    if bucket:
+        keys.append(time_bucket(Order.order_date, bucket).label("bucket"))
+    if group_by == "product":
+        keys += [OrderItem.product_id.label("product_id"), Product.name.label("product_name")]
+    elif group_by == "customer":
+        keys += [Order.customer_id.label("customer_id"), Customer.name.label("customer_name")]
+
+    query = db.session.query(*keys, revenue.label("revenue"), cost.label("cost")).select_from(
+        Order
+    ).join(OrderItem, OrderItem.order_id == Order.id).filter(Order.status == "completed")
+    if group_by == "product":
+        query = query.join(Product, Product.id == OrderItem.product_id)
+    elif group_by == "customer":
+        query = query.join(Customer, Customer.id == Order.customer_id)
+    if start:
+        query = query.filter(Order.order_date >= start)
+    if end:
+        query = query.filter(Order.order_date <= end)
+
+    if keys:
+        query = query.group_by(*keys).order_by(*keys)
+
+    dialect = dialect_name()
+    rows = []
+    for row in query.all():
+        entry = row._asdict()
+        if "bucket" in entry:
+            entry["bucket"] = _bucket_label(entry["bucket"], dialect)
+        entry["profit"] = entry["revenue"] - entry["cost"]
+        rows.append(entry)
+
+    current = archive.stats()
+    if archive.covers(current.get(archive.archived_orders.name), start, end):
+        archived = archive.memo.get(
+            ("profit_loss", start, end, bucket, group_by), current,
+            lambda: _archived_breakdown(start, end, bucket, group_by, dialect)
+        )
+        rows = _merge(rows, archived, bool(bucket), group_by)
+    return rows
+
+
+def _bucket_label(value, dialect):
+    """Render a bucket as the primary database does: date_trunc's timestamp, or SQLite's date string."""
+    if value is None or isinstance(value, str) and dialect != "postgresql":
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.isoformat() if dialect == "postgresql" else value.date().isoformat()
+
+
+def _archived_breakdown(start, end, bucket, group_by, primary_dialect):
+    """``profit_loss_breakdown`` over archived orders, keyed by ids (names live in the primary database)."""
+    orders, items = archive.archived_orders, archive.archived_order_items
+    keys = []
+    dialect = archive.engine().dialect.name
+    if bucket:
+        keys.append(time_bucket(orders.c.order_date, bucket, dialect).label("bucket"))
+    if group_by == "product":
+        keys.append(items.c.product_id.label("product_id"))
+    elif group_by == "customer":
+        keys.append(orders.c.customer_id.label("customer_id"))
+
+    query = select(
+        *keys,
+        func.coalesce(func.sum(items.c.quantity * items.c.price), 0).label("revenue"),
+        func.coalesce(func.sum(items.c.quantity * items.c.cost_price), 0).label("cost"),
+    ).select_from(orders).join(items, items.c.order_id == orders.c.id).where(orders.c.status == "completed")
+    if start:
+        query = query.where(orders.c.order_date >= start)
+    if end:
+        query = query.where(orders.c.order_date <= end)
+    if keys:
+        query = query.group_by(*keys)
+
+    rows = []
+    for row in archive.rows(query):
+        entry = row._asdict()
+        if "bucket" in entry:
+            entry["bucket"] = _bucket_label(entry["bucket"], primary_dialect)
+        rows.append(entry)
+    return rows
+
+
+def _merge(rows, archived, by_bucket, group_by):
+    """Add archived totals into the primary's rows, matching on bucket and product/customer id."""
+    id_key, name_key, model = {
+        "product": ("product_id", "product_name", Product),
+        "customer": ("customer_id", "customer_name", Customer),
+    }.get(group_by, (None, None, None))
+
+    def key(entry):
+        return (entry["bucket"] if by_bucket else None, entry[id_key] if id_key else None)
+
+    merged = {key(entry): entry for entry in rows}
+    missing = [entry for entry in archived if key(entry) not in merged]
+    names = {}
+    if id_key and missing:
+        # Same as the primary query's inner join: ids no longer in the catalog drop out
+        names = dict(db.session.execute(
+            select(model.id, model.name).where(model.id.in_({entry[id_key] for entry in missing}))
+        ).all())
+    for entry in map(dict, archived):  # Copies: ``archived`` may be a memoized result
+        existing = merged.get(key(entry))
+        if existing is not None:
+            existing["revenue"] += entry["revenue"]
+            existing["cost"] += entry["cost"]
+            existing["profit"] = existing["revenue"] - existing["cost"]
+        elif not id_key or entry[id_key] in names:
+            if id_key:
+                entry[name_key] = names[entry[id_key]]
+            entry["profit"] = entry["revenue"] - entry["cost"]
+            merged[key(entry)] = entry
+    if not by_bucket and not id_key:
+        return list(merged.values())
+    return [merged[k] for k in sorted(merged, key=lambda k: [(part is not None, part) for part in k])]
@@ -0,0 +1,282 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, String, Table, delete, func, insert, inspect, select, text, update
+)
+
+from . import db
+from .engine import init_sqlite_pragmas
+from .models import Booking, Order, OrderItem, ProductSale
+
+# Hot/cold split of order, sale and booking history. ``archive`` moves closed
+# rows older than ARCHIVE_AFTER_DAYS from the primary database to the
+# "archive" bind (ARCHIVE_DATABASE_URL), one chunk per transaction, so the
+# hot tables hold about the horizon's worth of rows and their list and
+# aggregate queries stop growing with the shop's age. The archive is only
+# appended to. Rollups and pair counts are aggregates and keep covering all
+# history; code reading raw rows adds the archive in when a date range
+# reaches back into it (``covers``).
+
+BIND = "archive"
+
+# Kept out of db.metadata: these tables only exist in the archive database
+archive_metadata = MetaData()
+
+
+def _archive_table(model, *indexes):
+    """``model``'s columns without foreign keys: archived rows outlive the rows they point at."""
+    source = model.__table__
+    return Table(
+        f"archived_{source.name}", archive_metadata,
+        *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+          for column in source.columns],
+        *indexes
+    )
+
+
+archived_orders = _archive_table(Order, Index("ix_archived_orders_date", "order_date"))
+archived_order_items = _archive_table(OrderItem, Index("ix_archived_order_items_order", "order_id"))
+archived_product_sales = _archive_table(ProductSale, Index("ix_archived_product_sales_date", "sale_date"))
+archived_bookings = _archive_table(Booking, Index("ix_archived_bookings_time", "scheduled_time"))
+
+# Row count and date span per archived table, kept in step by every run
+archive_stats = Table(
+    "archive_stats", archive_metadata,
+    Column("table_name", String(50), primary_key=True),
+    Column("rows", Integer, nullable=False),
+    Column("oldest", DateTime, nullable=True),
+    Column("newest", DateTime, nullable=True),
+    Column("archived_at", DateTime, nullable=False),
+)
+
+
+class Source:
+    """A hot table archived by date, with the child rows that move along with it."""
+
+    def __init__(self, model, archived, date_column, closed_statuses=None, children=()):
+        self.model = model
+        self.archived = archived
+        self.date_column = date_column
+        self.closed_statuses = closed_statuses
+        self.children = children  # (child model, archived child table, foreign key column)
+
+    @property
+    def name(self):
+        return self.model.__tablename__
+
+    def eligible(self, cutoff):
+        table = self.model.__table__
+        predicates = [
+            table.c[self.date_column] < cutoff,
+            # SQLite reuses the highest id once its row is gone, so the newest row always stays hot
+            table.c.id < select(func.max(table.c.id)).scalar_subquery(),
+        ]
+        if self.closed_statuses:
+            predicates.append(table.c.status.in_(self.closed_statuses))
+        return predicates
+
+
+SOURCES = (
+    Source(Order, archived_orders, "order_date", ("completed", "cancelled"),
+           children=((OrderItem, archived_order_items, "order_id"),)),
+    Source(ProductSale, archived_product_sales, "sale_date"),
+    Source(Booking, archived_bookings, "scheduled_time", ("completed", "cancelled")),
+)
+
+
+def engine():
+    """The archive bind's engine, or None when ARCHIVE_DATABASE_URL is not set."""
+    return db.engines.get(BIND)
+
+
+def _append(conn, table, rows):
+    """Insert ``rows``, replacing copies left by a run whose hot delete failed to commit."""
+    replaced = conn.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows]))).rowcount
+    conn.execute(insert(table), rows)
+    return len(rows) - replaced
+
+
+def _record_stats(conn, name, added, oldest, newest, now):
+    table = archive_stats
+    current = conn.execute(select(table).where(table.c.table_name == name)).first()
+    if current is None:
+        conn.execute(insert(table).values(table_name=name, rows=added, oldest=oldest, newest=newest,
+                                          archived_at=now))
+        return
+    conn.execute(update(table).where(table.c.table_name == name).values(
+        rows=current.rows + added,
+        oldest=min(filter(None, (current.oldest, oldest)), default=None),
+        newest=max(filter(None, (current.newest, newest)), default=None),
+        archived_at=now,
+    ))
+
+
+def move_chunk(source, cutoff, batch_size, target):
+    """Move up to ``batch_size`` eligible rows of ``source`` to ``target``; returns how many moved.
+
+    The rows are deleted from the hot tables first (RETURNING their
+    contents), written to the archive and committed there, and only then is
+    the hot delete committed. A failure before the archive commit leaves
+    everything in place; one after it leaves copies in both databases until
+    the next run moves the same rows again and replaces them.
+    """
+    table = source.model.__table__
+    ids = db.session.execute(
+        select(table.c.id).where(*source.eligible(cutoff)).order_by(table.c.id).limit(batch_size)
+        .with_for_update()
+    ).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return 0
+
+    try:
+        moved_children = [
+            (archived, [dict(row._mapping) for row in db.session.execute(
+                delete(child.__table__).where(child.__table__.c[key].in_(ids)).returning(*child.__table__.c)
+            )])
+            for child, archived, key in source.children
+        ]
+        rows = [dict(row._mapping) for row in db.session.execute(
+            delete(table).where(table.c.id.in_(ids)).returning(*table.c)
+        )]
+        dates = [row[source.date_column] for row in rows if row[source.date_column] is not None]
+        now = datetime.utcnow()
+        with target.begin() as conn:
+            for archived, child_rows in moved_children:
+                if child_rows:
+                    _record_stats(conn, archived.name, _append(conn, archived, child_rows), None, None, now)
+            added = _append(conn, source.archived, rows)
+            _record_stats(conn, source.archived.name, added, min(dates, default=None), max(dates, default=None), now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def archive(cutoff=None, batch_size=None, progress=None):
+    """Move every closed row older than ``cutoff`` (default: ARCHIVE_AFTER_DAYS ago); returns rows per table."""
+    target = engine()
+    if target is None:
+        raise RuntimeError("No archive database configured (set ARCHIVE_DATABASE_URL)")
+    config = current_app.config
+    cutoff = cutoff or datetime.utcnow() - timedelta(days=config.get("ARCHIVE_AFTER_DAYS", 180))
+    batch_size = batch_size or config.get("ARCHIVE_BATCH_SIZE", 1000)
+
+    moved = {}
+    for source in SOURCES:
+        moved[source.name] = 0
+        while True:
+            count = move_chunk(source, cutoff, batch_size, target)
+            if not count:
+                break
+            moved[source.name] += count
+            if progress:
+                progress(source.name, moved[source.name])
+    memo.clear()
+    return moved
+
+
+def stats():
+    """``{archived table: stats row}``; empty without an archive database."""
+    target = engine()
+    if target is None:
+        return {}
+    with target.connect() as conn:
+        return {row.table_name: row for row in conn.execute(select(archive_stats))}
+
+
+def covers(table_stats, start=None, end=None):
+    """Whether archived rows (per ``table_stats``) can fall inside ``[start, end]``."""
+    if table_stats is None or not table_stats.rows:
+        return False
+    return (start is None or start <= table_stats.newest) and (end is None or end >= table_stats.oldest)
+
+
+def row_count(current, table):
+    row = current.get(table.name)
+    return row.rows if row is not None else 0
+
+
+def partitions(statement, batch_size=1000):
+    """Run ``statement`` on the archive and yield its rows in lists of ``batch_size``."""
+    target = engine()
+    if target is None:
+        return
+    with target.connect() as conn:
+        yield from conn.execution_options(yield_per=batch_size).execute(statement).partitions()
+
+
+def rows(statement, batch_size=1000):
+    for chunk in partitions(statement, batch_size):
+        yield from chunk
+
+
+class ArchiveMemo:
+    """Results computed from archived rows, reused until a run changes the archive.
+
+    Archived rows are never edited, so a result keyed by the archive's
+    stats stays exact, and repeat reads of old periods cost no archive scan.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, current, compute):
+        version = tuple(sorted((name, row.rows, row.archived_at) for name, row in current.items()))
+        key = (key, version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+memo = ArchiveMemo()
+
+
+def clear():
+    """Delete every archived row (used when resetting seed data)."""
+    target = engine()
+    if target is None:
+        return
+    with target.begin() as conn:
+        for table in reversed(archive_metadata.sorted_tables):
+            conn.execute(delete(table))
+    memo.clear()
+
+
+def _add_missing_columns(target):
+    """Add columns the hot tables gained after the archive was created; rows archived earlier read NULL."""
+    with target.begin() as conn:
+        inspector = inspect(conn)
+        for table in archive_metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                      f"{column.type.compile(dialect=conn.dialect)}"))
+
+
+def init_archive(app):
+    """Prepare the ``archive`` bind when ``ARCHIVE_DATABASE_URL`` is set."""
+    target = engine()
+    if target is None:
+        return
+    init_sqlite_pragmas(target, app.config.get("SQLITE_PRAGMAS"))
+    archive_metadata.create_all(target)
+    _add_missing_columns(target)
@@ -0,0 +1,169 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from . import db
+from .cache import MemoryBackend
+from .models import Customer, RevokedToken
+
+TOKEN_SALT = "access-token"
+
+
+class AuthError(Exception):
+    pass
+
+
+class RevocationList:
+    """Revoked token ids, mirrored in process from the ``revoked_tokens`` table.
+
+    Checking a token is a dict lookup. The table is polled for revocations
+    made by other processes at most every ``AUTH_REVOCATION_SYNC_SECONDS``,
+    so a logout elsewhere takes effect within that interval (immediately in
+    the process that handled it).
+    """
+
+    # Re-read this much history on each sync so rows committed late are not missed
+    OVERLAP = timedelta(seconds=60)
+
+    def __init__(self):
+        self._revoked = {}  # jti -> expires_at
+        self._synced_at = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti):
+        self._sync()
+        return jti in self._revoked
+
+    def _sync(self):
+        interval = current_app.config.get("AUTH_REVOCATION_SYNC_SECONDS", 10)
+        if self._checked is not None and time.monotonic() - self._checked < interval:
+            return
+        with self._lock:
+            if self._checked is not None and time.monotonic() - self._checked < interval:
+                return
+            now = datetime.utcnow()
+            query = db.session.query(RevokedToken.jti, RevokedToken.expires_at).filter(
+                RevokedToken.expires_at > now
+            )
+            if self._synced_at is not None:
+                query = query.filter(RevokedToken.revoked_at >= self._synced_at - self.OVERLAP)
+            for jti, expires_at in query:
+                self._revoked[jti] = expires_at
+            # Expired tokens fail signature checks anyway; stop tracking them
+            for jti in [jti for jti, expires_at in self._revoked.items() if expires_at <= now]:
+                del self._revoked[jti]
+            self._synced_at = now
+            self._checked = time.monotonic()
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+class TokenAuth:
+    """Signed, expiring access tokens verified without a database round trip.
+
+    Tokens carry the customer id and a random token id (``jti``) signed with
+    ``SECRET_KEY``. Verification checks the signature and age, the in-process
+    revocation list and an LRU cache of customer records.
+    """
+
+    def __init__(self, app=None):
+        self.customers = None
+        self.revoked = RevocationList()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.customers = MemoryBackend(
+            app.config.get("AUTH_CUSTOMER_CACHE_SIZE", 4096),
+            ttl=app.config.get("AUTH_CUSTOMER_CACHE_TTL", 300)
+        )
+        app.extensions["token_auth"] = self
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=TOKEN_SALT)
+
+    def _max_age(self):
+        return current_app.config.get("AUTH_TOKEN_MAX_AGE", 3600)
+
+    def issue(self, customer):
+        """Return ``(token, expires_in_seconds)`` for ``customer``."""
+        self.customers.set(customer.id, customer.to_dict())
+        token = self._serializer().dumps({"cid": customer.id, "jti": secrets.token_urlsafe(16)})
+        return token, self._max_age()
+
+    def verify(self, token):
+        """Return the token's claims, raising AuthError if it is invalid, expired or revoked."""
+        try:
+            claims, issued_at = self._serializer().loads(
+                token, max_age=self._max_age(), return_timestamp=True
+            )
+        except SignatureExpired:
+            raise AuthError("Token has expired")
+        except BadSignature:
+            raise AuthError("Invalid token")
+        if self.revoked.is_revoked(claims["jti"]):
+            raise AuthError("Token has been revoked")
+        claims["expires_at"] = issued_at.replace(tzinfo=None) + timedelta(seconds=self._max_age())
+        return claims
+
+    def revoke(self, claims):
+        """Revoke a verified token; the caller commits."""
+        self.revoked.add(claims["jti"], claims["expires_at"])
+        db.session.add(RevokedToken(
+            jti=claims["jti"], customer_id=claims["cid"], expires_at=claims["expires_at"]
+        ))
+
+    def customer(self, customer_id):
+        record = self.customers.get(customer_id)
+        if record is None:
+            customer = db.session.get(Customer, customer_id)
+            if customer is None:
+                return None
+            record = customer.to_dict()
+            self.customers.set(customer_id, record)
+        return record
+
+    def forget(self, customer_id):
+        self.customers.delete(customer_id)
+
+
+auth = TokenAuth()
+
+
+def _bearer_token():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+
+def login_required(view):
+    """Require a valid bearer token; sets ``g.customer_id``, ``g.customer`` and ``g.token_claims``."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _bearer_token()
+        if token is None:
+            return jsonify({"error": "Missing bearer token"}), 401
+        try:
+            claims = auth.verify(token)
+        except AuthError as e:
+            return jsonify({"error": str(e)}), 401
+        customer = auth.customer(claims["cid"])
+        if customer is None:
+            return jsonify({"error": "Unknown customer"}), 401
+        g.customer_id = claims["cid"]
+        g.customer = customer
+        g.token_claims = claims
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,131 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import update
+
+from . import db
+from .models import Booking, Service
+
+DEFAULT_DURATION_MINUTES = 60
+# Upper bound on any booking's length; lets conflict lookups use a bounded
+# range scan on (service_id, scheduled_time) instead of reading all history.
+MAX_DURATION = timedelta(hours=24)
+MAX_RANGE = timedelta(days=62)
+# Cap on slots listed per availability response
+MAX_SLOTS = 2000
+
+
+class BookingConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__("Requested time overlaps an existing booking")
+        self.conflicts = conflicts
+
+
+def duration_minutes(value):
+    """Validate a service's ``duration_minutes``; empty means "use the default" (None)."""
+    if value in (None, ""):
+        return None
+    minutes = int(value)
+    if not 0 < minutes <= MAX_DURATION.total_seconds() // 60:
+        raise ValueError("duration_minutes must be between 1 and 1440")
+    return minutes
+
+
+def booking_duration(service):
+    return timedelta(minutes=service.duration_minutes or DEFAULT_DURATION_MINUTES)
+
+
+def lock_service(service_id):
+    """Serialize booking writes for one service until the transaction ends.
+
+    The no-op UPDATE takes the row lock on PostgreSQL and the write lock on
+    SQLite, so a concurrent check-then-insert for the same service waits
+    instead of racing.
+    """
+    db.session.execute(
+        update(Service).where(Service.id == service_id).values(id=Service.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def overlapping(service_id, start, end, exclude_id=None):
+    """Active bookings of ``service_id`` whose interval intersects [start, end)."""
+    query = Booking.query.filter(
+        Booking.service_id == service_id,
+        Booking.scheduled_time > start - MAX_DURATION,
+        Booking.scheduled_time < end,
+        Booking.end_time > start,
+        Booking.status != "cancelled"
+    )
+    if exclude_id is not None:
+        query = query.filter(Booking.id != exclude_id)
+    return query.order_by(Booking.scheduled_time).all()
+
+
+def reserve(booking, service):
+    """Set ``booking.end_time`` and reject it atomically if its slot is taken."""
+    booking.end_time = booking.scheduled_time + booking_duration(service)
+    if booking.status == "cancelled":
+        return
+    lock_service(service.id)
+    conflicts = overlapping(service.id, booking.scheduled_time, booking.end_time, exclude_id=booking.id)
+    if conflicts:
+        raise BookingConflict(conflicts)
+
+
+def busy_intervals(service_id, start, end):
+    rows = db.session.query(Booking.scheduled_time, Booking.end_time).filter(
+        Booking.service_id == service_id,
+        Booking.scheduled_time > start - MAX_DURATION,
+        Booking.scheduled_time < end,
+        Booking.end_time > start,
+        Booking.status != "cancelled"
+    ).order_by(Booking.scheduled_time)
+    return [(row.scheduled_time, row.end_time) for row in rows]
+
+
+def opening_windows(start, end, open_hour, close_hour):
+    """Yield the parts of [start, end) that fall inside daily opening hours."""
+    midnight = datetime.combine(start.date(), time())
+    while midnight < end:
+        window_start = max(start, midnight + timedelta(hours=open_hour))
+        window_end = min(end, midnight + timedelta(hours=close_hour))
+        if window_start < window_end:
+            yield window_start, window_end
+        midnight += timedelta(days=1)
+
+
+def free_intervals(service_id, start, end, open_hour=0, close_hour=24):
+    """Sweep the sorted busy intervals once and return the gaps inside opening hours."""
+    busy = busy_intervals(service_id, start, end)
+    free = []
+    index = 0
+    for window_start, window_end in opening_windows(start, end, open_hour, close_hour):
+        cursor = window_start
+        # Skip bookings that ended before this window
+        while index < len(busy) and busy[index][1] <= window_start:
+            index += 1
+        scan = index
+        while scan < len(busy) and busy[scan][0] < window_end:
+            busy_start, busy_end = busy[scan]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            scan += 1
+        if cursor < window_end:
+            free.append((cursor, window_end))
+    return free
+
+
+def available_slots(free, duration, step, limit=MAX_SLOTS):
+    """Start times every ``step`` that fit ``duration``; at most ``limit`` of them."""
+    if step <= timedelta(0):
+        raise ValueError("step must be positive")
+    slots = []
+    for free_start, free_end in free:
+        slot = free_start
+        while slot + duration <= free_end:
+            if len(slots) >= limit:
+                return slots
+            slots.append(slot)
+            slot += step
+    return slots
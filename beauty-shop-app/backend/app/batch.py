@@ -0,0 +1,92 @@
+from flask import current_app, request
+from werkzeug.exceptions import HTTPException
+
+from . import db
+from .cache import cache
+from .streaming import stream_format
+from .transactions import single_transaction
+
+MAX_OPERATIONS = 500
+METHODS = ("GET", "POST", "PUT", "DELETE")
+# Views whose responses are streamed: buffering them would hold whole tables
+# in memory, and the event feed never ends
+STREAMING_ENDPOINTS = {"api.export_products", "api.export_services", "api.export_sales", "api.admin_events"}
+
+
+class BatchError(ValueError):
+    """Raised when a batch request is malformed."""
+
+
+def _validate(operations, prefix):
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("'operations' must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f"At most {MAX_OPERATIONS} operations per batch")
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            raise BatchError(f"Operation {index} must be an object")
+        if op.get("method", "GET").upper() not in METHODS:
+            raise BatchError(f"Operation {index}: method must be one of {', '.join(METHODS)}")
+        path = op.get("path")
+        if not isinstance(path, str) or not path.startswith(prefix + "/"):
+            raise BatchError(f"Operation {index}: path must start with {prefix}/")
+        if path.split("?")[0].rstrip("/") == request.path.rstrip("/"):
+            raise BatchError(f"Operation {index}: batches cannot be nested")
+
+
+def _dispatch(op, headers):
+    """Run one operation through its view, in a request context of its own."""
+    method = op.get("method", "GET").upper()
+    path, _, query = op["path"].partition("?")
+    kwargs = {"json": op["body"]} if op.get("body") is not None else {}
+    with current_app.test_request_context(path, method=method, query_string=query, headers=headers, **kwargs):
+        if request.endpoint in STREAMING_ENDPOINTS or stream_format() is not None:
+            return {"status": 400, "body": {"error": "Streaming endpoints are not batchable"}}
+        try:
+            response = current_app.make_response(current_app.dispatch_request())
+        except HTTPException as e:
+            return {"status": e.code, "body": {"error": e.description}}
+        if response.is_streamed:
+            response.close()
+            return {"status": 400, "body": {"error": "Streaming endpoints are not batchable"}}
+        body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        return {"status": response.status_code, "body": body}
+
+
+def run(operations, atomic=False, prefix="/api"):
+    """Run ``operations`` (``{"method", "path", "body"}`` dicts) against the API views.
+
+    Each operation sees the caller's ``Authorization`` header. By default
+    every write commits on its own and a failure does not stop the batch.
+    With ``atomic`` the views' commits are deferred: the whole batch is one
+    transaction, committed at the end or rolled back at the first failure.
+    Returns ``(results, committed)``; a failing final commit is raised.
+    """
+    _validate(operations, prefix)
+    headers = {"Authorization": request.headers["Authorization"]} if "Authorization" in request.headers else {}
+    results = []
+
+    if not atomic:
+        for op in operations:
+            try:
+                results.append(_dispatch(op, headers))
+            except Exception as e:
+                db.session.rollback()
+                results.append({"status": 500, "body": {"error": str(e)}})
+        return results, True
+
+    with cache.deferred_invalidation():
+        try:
+            with single_transaction(db.session):
+                for op in operations:
+                    result = _dispatch(op, headers)
+                    results.append(result)
+                    if result["status"] >= 400:
+                        break
+        except Exception as e:
+            results.append({"status": 500, "body": {"error": str(e)}})
+        if results[-1]["status"] >= 400:
+            db.session.rollback()
+            return results, False
+        db.session.commit()
+    return results, True
@@ -0,0 +1,416 @@
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from .seed import SEED_PASSWORD
+
+
+# Transports: both return (status_code, body_bytes)
+class ClientTransport:
+    """Drives the app in process through the Flask test client."""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+
+    def send(self, method, path, headers=None, json_body=None, data=None, content_type=None):
+        response = self.client.open(path, method=method, headers=headers, json=json_body,
+                                    data=data, content_type=content_type)
+        return response.status_code, response.get_data()
+
+
+class HttpTransport:
+    """Drives a running server (e.g. gunicorn) over HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, method, path, headers=None, json_body=None, data=None, content_type=None):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            content_type = "application/json"
+        elif isinstance(data, str):
+            data = data.encode()
+        if content_type:
+            headers["Content-Type"] = content_type
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Scenario:
+    """One benchmarked request shape.
+
+    ``build(i, prepared)`` returns the keyword arguments for ``send``;
+    ``prepare(i)`` runs untimed beforehand, e.g. to create the row a DELETE
+    will remove. Heavy scenarios run a tenth as often.
+    """
+
+    def __init__(self, name, endpoint, build, prepare=None, heavy=False):
+        self.name = name
+        self.endpoint = endpoint
+        self.build = build
+        self.prepare = prepare
+        self.heavy = heavy
+
+
+def _json(transport, method, path, **kwargs):
+    status, body = transport.send(method, path, **kwargs)
+    if status >= 400:
+        raise RuntimeError(f"Benchmark setup failed: {method} {path} returned {status}: {body[:200]!r}")
+    return json.loads(body)
+
+
+class Fixtures:
+    """Ids and credentials the scenarios need, discovered and created through the API."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.run = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+        products = _json(transport, "GET", "/api/products?limit=100")["items"]
+        services = _json(transport, "GET", "/api/services?limit=100")["items"]
+        bookings = _json(transport, "GET", "/api/bookings?limit=100")["items"]
+        orders = _json(transport, "GET", "/api/orders?limit=100")["items"]
+        if not products or not services:
+            raise RuntimeError("No products or services found; run `flask seed` first.")
+        self.product_ids = [p["id"] for p in products]
+        self.service_ids = [s["id"] for s in services]
+        self.booking_ids = [b["id"] for b in bookings] or [0]
+        self.order_ids = [o["id"] for o in orders] or [0]
+        self.search_terms = [p["name"].split()[1].lower()[:4] for p in products[:20]]
+
+        # Dedicated rows so write scenarios never run out of stock or slots
+        self.product_id = self.create_product(quantity=10 ** 9)
+        self.service_id = _json(transport, "POST", "/api/services", json_body={
+            "name": f"Benchmark service {self.run}", "price": 50, "duration_minutes": 30
+        })["id"]
+        self.booking_start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.booking_slots = 0
+        self.slot_lock = threading.Lock()
+
+        self.customer_id, self.token = self.login()
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+
+    def login(self):
+        status, body = self.transport.send("POST", "/api/auth/login", json_body={
+            "email": "customer1@example.com", "password": SEED_PASSWORD
+        })
+        if status != 200:
+            email = f"bench-{self.run}@example.com"
+            _json(self.transport, "POST", "/api/auth/register", json_body={
+                "name": "Benchmark", "email": email, "password": SEED_PASSWORD
+            })
+            status, body = self.transport.send("POST", "/api/auth/login", json_body={
+                "email": email, "password": SEED_PASSWORD
+            })
+        data = json.loads(body)
+        return data["customer"]["id"], data["access_token"]
+
+    def create_product(self, quantity=100):
+        return _json(self.transport, "POST", "/api/products", json_body={
+            "name": f"Benchmark product {self.run}", "price": 10, "cost_price": 4, "quantity": quantity
+        })["id"]
+
+    def next_slot(self):
+        with self.slot_lock:
+            self.booking_slots += 1
+            return (self.booking_start + timedelta(hours=self.booking_slots)).isoformat()
+
+    def place_order(self):
+        return _json(self.transport, "POST", "/api/orders", headers=self.headers, json_body={
+            "items": [{"product_id": self.product_id, "quantity": 1}]
+        })["id"]
+
+    def pick(self, ids, i):
+        return ids[i % len(ids)]
+
+
+def scenarios(fx):
+    """Every API route, with representative arguments."""
+    today = datetime.utcnow().date()
+    week = (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def get(path):
+        return lambda i, prepared: {"method": "GET", "path": path(i) if callable(path) else path}
+
+    def csv_rows(kind, count=100):
+        def build(i, prepared):
+            if kind == "products":
+                body = "name,price,quantity\n" + "".join(
+                    f"Imported {fx.run} {i} {n},9.99,5\n" for n in range(count))
+            elif kind == "services":
+                body = "name,price,duration_minutes\n" + "".join(
+                    f"Imported {fx.run} {i} {n},30,45\n" for n in range(count))
+            else:
+                body = "product_id,quantity_sold,sale_price\n" + "".join(
+                    f"{fx.product_id},1,10\n" for _ in range(count))
+            return {"method": "POST", "path": f"/api/{kind}/import", "data": body, "content_type": "text/csv"}
+        return build
+
+    return [
+        # Catalog reads
+        Scenario("products list", "api.get_products", get("/api/products")),
+        Scenario("products list (200, filtered)", "api.get_products",
+                 get("/api/products?limit=200&in_stock=true&min_price=10&max_price=80")),
+        Scenario("products list (streamed)", "api.get_products", get("/api/products?stream=true"), heavy=True),
+        Scenario("product detail", "api.get_product", get(lambda i: f"/api/products/{fx.pick(fx.product_ids, i)}")),
+        Scenario("products multi-get (20 ids)", "api.get_products", get(
+            lambda i: "/api/products?ids=" + ",".join(str(fx.pick(fx.product_ids, i + n)) for n in range(20)))),
+        Scenario("products export", "api.export_products", get("/api/products/export"), heavy=True),
+        Scenario("product stock", "api.get_product_stock", get(lambda i: f"/api/products/{fx.product_id}/stock")),
+        Scenario("product movements", "api.get_product_movements",
+                 get(lambda i: f"/api/products/{fx.product_id}/movements")),
+        Scenario("related products", "api.get_related_products",
+                 get(lambda i: f"/api/products/{fx.pick(fx.product_ids, i)}/related")),
+        Scenario("services list", "api.get_services", get("/api/services")),
+        Scenario("service detail", "api.get_service", get(lambda i: f"/api/services/{fx.pick(fx.service_ids, i)}")),
+        Scenario("service availability (week)", "api.get_service_availability", get(
+            lambda i: f"/api/services/{fx.pick(fx.service_ids, i)}/availability"
+                      f"?from={week.isoformat()}&to={(week + timedelta(days=7)).isoformat()}")),
+        Scenario("services export", "api.export_services", get("/api/services/export"), heavy=True),
+        Scenario("search", "api.search_catalog", get(lambda i: f"/api/search?q={fx.pick(fx.search_terms, i)}")),
+
+        # Catalog writes
+        Scenario("create product", "api.create_product", lambda i, prepared: {
+            "method": "POST", "path": "/api/products",
+            "json_body": {"name": f"Bench {fx.run} {i}", "price": 5, "quantity": 10}}),
+        Scenario("update product", "api.update_product", lambda i, prepared: {
+            "method": "PUT", "path": f"/api/products/{fx.product_id}", "json_body": {"price": 10 + i % 5}}),
+        Scenario("batch update (50, atomic)", "api.run_batch", lambda i, prepared: {
+            "method": "POST", "path": "/api/batch", "json_body": {"atomic": True, "operations": [
+                {"method": "PUT", "path": f"/api/products/{fx.product_id}", "body": {"price": 10 + n % 5}}
+                for n in range(50)]}}, heavy=True),
+        Scenario("delete product", "api.delete_product", lambda i, product_id: {
+            "method": "DELETE", "path": f"/api/products/{product_id}"}, prepare=lambda i: fx.create_product()),
+        Scenario("import products (100 rows)", "api.import_products", csv_rows("products"), heavy=True),
+        Scenario("create service", "api.create_service", lambda i, prepared: {
+            "method": "POST", "path": "/api/services",
+            "json_body": {"name": f"Bench {fx.run} {i}", "price": 30, "duration_minutes": 45}}),
+        Scenario("update service", "api.update_service", lambda i, prepared: {
+            "method": "PUT", "path": f"/api/services/{fx.service_id}", "json_body": {"price": 50 + i % 5}}),
+        Scenario("delete service", "api.delete_service", lambda i, service_id: {
+            "method": "DELETE", "path": f"/api/services/{service_id}"},
+            prepare=lambda i: _json(fx.transport, "POST", "/api/services",
+                                    json_body={"name": f"Bench {fx.run} {i}", "price": 30})["id"]),
+        Scenario("import services (100 rows)", "api.import_services", csv_rows("services"), heavy=True),
+
+        # Bookings
+        Scenario("bookings list", "api.get_bookings", get("/api/bookings")),
+        Scenario("bookings by service (day)", "api.get_bookings", get(
+            lambda i: f"/api/bookings?service_id={fx.pick(fx.service_ids, i)}"
+                      f"&from={week.isoformat()}&to={(week + timedelta(days=1)).isoformat()}")),
+        Scenario("booking detail", "api.get_booking", get(lambda i: f"/api/bookings/{fx.pick(fx.booking_ids, i)}")),
+        Scenario("create booking", "api.create_booking", lambda i, slot: {
+            "method": "POST", "path": "/api/bookings",
+            "json_body": {"service_id": fx.service_id, "customer_id": fx.customer_id, "scheduled_time": slot}},
+            prepare=lambda i: fx.next_slot()),
+        Scenario("update booking", "api.update_booking", lambda i, booking_id: {
+            "method": "PUT", "path": f"/api/bookings/{booking_id}", "json_body": {"payment_status": "paid"}},
+            prepare=lambda i: _json(fx.transport, "POST", "/api/bookings", json_body={
+                "service_id": fx.service_id, "customer_id": fx.customer_id, "scheduled_time": fx.next_slot()
+            })["id"]),
+        Scenario("delete booking", "api.delete_booking", lambda i, booking_id: {
+            "method": "DELETE", "path": f"/api/bookings/{booking_id}"},
+            prepare=lambda i: _json(fx.transport, "POST", "/api/bookings", json_body={
+                "service_id": fx.service_id, "customer_id": fx.customer_id, "scheduled_time": fx.next_slot()
+            })["id"]),
+
+        # Sales
+        Scenario("sales list", "api.get_product_sales", get("/api/sales")),
+        Scenario("sales by product", "api.get_product_sales",
+                 get(lambda i: f"/api/sales?product_id={fx.pick(fx.product_ids, i)}")),
+        Scenario("create sale", "api.create_product_sale", lambda i, prepared: {
+            "method": "POST", "path": "/api/sales",
+            "json_body": {"product_id": fx.product_id, "quantity_sold": 1, "sale_price": 10}}),
+        Scenario("import sales (100 rows)", "api.import_sales", csv_rows("sales"), heavy=True),
+        Scenario("sales export", "api.export_sales", get("/api/sales/export"), heavy=True),
+        Scenario("sales summary", "api.get_sales_summary", get("/api/sales/summary")),
+
+        # Orders
+        Scenario("place order", "api.place_order", lambda i, prepared: {
+            "method": "POST", "path": "/api/orders", "headers": fx.headers,
+            "json_body": {"items": [{"product_id": fx.product_id, "quantity": 1},
+                                    {"product_id": fx.pick(fx.product_ids, i), "quantity": 1}]}}),
+        Scenario("place order (idempotent replay)", "api.place_order", lambda i, prepared: {
+            "method": "POST", "path": "/api/orders",
+            "headers": {**fx.headers, "Idempotency-Key": f"bench-{fx.run}"},
+            "json_body": {"items": [{"product_id": fx.product_id, "quantity": 1}]}}),
+        Scenario("orders list", "api.get_all_orders", get("/api/orders")),
+        Scenario("orders list (completed)", "api.get_all_orders", get("/api/orders?status=completed")),
+        Scenario("orders by customer", "api.get_orders_by_customer", lambda i, prepared: {
+            "method": "GET", "path": f"/api/orders/customer/{fx.customer_id}", "headers": fx.headers}),
+        Scenario("update order status", "api.update_order_status", lambda i, order_id: {
+            "method": "PUT", "path": f"/api/orders/{order_id}/status", "json_body": {"status": "completed"}},
+            prepare=lambda i: fx.place_order()),
+        Scenario("cancel order", "api.cancel_order", lambda i, order_id: {
+            "method": "PUT", "path": f"/api/orders/{order_id}/cancel"}, prepare=lambda i: fx.place_order()),
+
+        # Reports and alerts
+        Scenario("low stock alerts", "api.low_stock_alerts", get("/api/alerts/low-stock")),
+        Scenario("reorder alerts", "api.reorder_alerts", get("/api/alerts/reorder")),
+        Scenario("expiring soon alerts", "api.expiring_soon_alerts", get("/api/alerts/expiring-soon?days=30")),
+        Scenario("product alerts", "api.product_alerts", get("/api/alerts/products")),
+        Scenario("profit/loss", "api.profit_loss", get(f"/api/analytics/profit-loss?start={today - timedelta(days=90)}")),
+        Scenario("profit/loss by month and product", "api.profit_loss",
+                 get("/api/analytics/profit-loss?bucket=month&group_by=product"), heavy=True),
+        Scenario("admin summary", "api.admin_summary", get("/api/admin/summary")),
+        Scenario("cache stats", "api.cache_stats", get("/api/cache/stats")),
+
+        # Auth (register and login run the password KDF on purpose)
+        Scenario("register", "api.register", lambda i, prepared: {
+            "method": "POST", "path": "/api/auth/register",
+            "json_body": {"name": "Bench", "email": f"bench-{fx.run}-{i}@example.com", "password": SEED_PASSWORD}},
+            heavy=True),
+        Scenario("login", "api.login", lambda i, prepared: {
+            "method": "POST", "path": "/api/auth/login",
+            "json_body": {"email": "customer1@example.com", "password": SEED_PASSWORD}}, heavy=True),
+        Scenario("current customer", "api.current_customer", lambda i, prepared: {
+            "method": "GET", "path": "/api/auth/me", "headers": fx.headers}),
+        Scenario("logout", "api.logout", lambda i, token: {
+            "method": "POST", "path": "/api/auth/logout", "headers": {"Authorization": f"Bearer {token}"}},
+            prepare=lambda i: fx.login()[1], heavy=True),
+    ]
+
+
+def uncovered_endpoints(app, results):
+    covered = {result["endpoint"] for result in results.values()}
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if rule.endpoint.startswith("api.") and rule.endpoint not in covered)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+# Query counting: in process via engine events, over HTTP from /metrics
+class EngineQueryCounter:
+    def __init__(self, engines):
+        self.count = 0
+        self._lock = threading.Lock()
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._increment)
+
+    def _increment(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def snapshot(self):
+        return self.count
+
+
+class MetricsQueryCounter:
+    """Sums shop_db_statements_total from /metrics. Each worker keeps its own
+    registry, so counts are only exact against a single-worker server."""
+
+    _LINE = re.compile(r'^shop_db_statements_total\{endpoint="([^"]+)",method="[^"]+"\} (\d+)$', re.M)
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def snapshot(self):
+        status, body = self.transport.send("GET", "/metrics")
+        if status != 200:
+            return None
+        return sum(int(count) for _, count in self._LINE.findall(body.decode()))
+
+
+def run_scenario(transport, scenario, iterations, concurrency, counter):
+    if scenario.heavy:
+        iterations = max(1, iterations // 10)
+    prepared = [scenario.prepare(i) if scenario.prepare else None for i in range(iterations)]
+    requests = [scenario.build(i, prepared[i]) for i in range(iterations)]
+    timings = [0.0] * iterations
+    statuses = [0] * iterations
+
+    def send(index):
+        kwargs = dict(requests[index])
+        started = time.perf_counter()
+        status, _ = transport.send(kwargs.pop("method"), kwargs.pop("path"), **kwargs)
+        timings[index] = (time.perf_counter() - started) * 1000
+        statuses[index] = status
+
+    # One untimed request first for reads, so one-off costs (first connection,
+    # statement compilation) do not land in the percentiles
+    if requests and requests[0]["method"] == "GET":
+        kwargs = dict(requests[0])
+        transport.send(kwargs.pop("method"), kwargs.pop("path"), **kwargs)
+
+    queries_before = counter.snapshot()
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(send, range(iterations)))
+    else:
+        for index in range(iterations):
+            send(index)
+    elapsed = time.perf_counter() - started
+    queries_after = counter.snapshot()
+
+    timings.sort()
+    queries = None
+    if queries_before is not None and queries_after is not None:
+        # The /metrics scrape itself is not an API request, so it adds no statements
+        queries = round((queries_after - queries_before) / iterations, 2)
+    return {
+        "endpoint": scenario.endpoint,
+        "requests": iterations,
+        "errors": sum(1 for status in statuses if status >= 400),
+        "throughput": round(iterations / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "queries_per_request": queries,
+    }
+
+
+def run(transport, counter, iterations=50, concurrency=1, only=None, progress=None):
+    """Run every scenario (or those whose name contains ``only``); returns ``{name: result}``."""
+    fx = Fixtures(transport)
+    results = {}
+    for scenario in scenarios(fx):
+        if only and only not in scenario.name:
+            continue
+        results[scenario.name] = run_scenario(transport, scenario, iterations, concurrency, counter)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
+
+
+def compare(results, baseline, tolerance=0.5, min_delta_ms=1.0):
+    """Regressions against a saved baseline: slower p50/p95, more queries or more errors.
+
+    Latency only counts as regressed when it is both ``tolerance`` slower and
+    ``min_delta_ms`` slower, and p95 is only judged with 50+ samples, so
+    sub-millisecond jitter on fast routes is not flagged.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if key == "p95_ms" and result["requests"] < 50:
+                continue
+            if (result[key] - base[key] > min_delta_ms
+                    and result[key] > base[key] * (1 + tolerance)):
+                regressions.append(f"{name}: {key[:3]} {base[key]:.2f} -> {result[key]:.2f} ms")
+        if (result["queries_per_request"] is not None and base.get("queries_per_request") is not None
+                and result["queries_per_request"] > base["queries_per_request"] + 0.5):
+            regressions.append(f"{name}: queries/request {base['queries_per_request']} -> "
+                               f"{result['queries_per_request']}")
+        if result["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: errors {base.get('errors', 0)} -> {result['errors']}")
+    return regressions
@@ -0,0 +1,278 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import insert
+
+from . import db
+from .availability import duration_minutes
+from .dialects import upsert_insert
+from .models import Product, Service, ProductSale, money, utc_datetime
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class RowError(ValueError):
+    pass
+
+
+def is_ndjson(content_type):
+    return (content_type or "").split(";")[0].strip().lower() in NDJSON_TYPES
+
+
+class _RawStream(io.RawIOBase):
+    """Adapts any object with ``read(n)`` (e.g. gunicorn's request body) to raw IO."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_records(stream, content_type):
+    """Yield ``(line_number, dict)`` pairs from a CSV or NDJSON request body.
+
+    The body is read incrementally, so memory use does not depend on its size.
+    Lines that cannot be parsed are yielded as ``(line_number, RowError)``.
+    """
+    text = io.TextIOWrapper(io.BufferedReader(_RawStream(stream)), encoding="utf-8-sig", newline="")
+    if is_ndjson(content_type):
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+                yield line_number, record
+            except ValueError as e:
+                yield line_number, RowError(f"Invalid JSON: {e}")
+    else:
+        reader = csv.DictReader(text)
+        for record in reader:
+            # Header is line 1; empty CSV cells mean "not provided"
+            yield reader.line_num, {k: v for k, v in record.items() if v not in ("", None)}
+
+
+def _required(record, field, convert):
+    if field not in record:
+        raise RowError(f"Missing required field '{field}'")
+    return _optional(record, field, convert)
+
+
+def _optional(record, field, convert, default=None):
+    value = record.get(field)
+    if value in (None, ""):
+        return default
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise RowError(f"Invalid value for '{field}': {value!r}")
+
+
+def _date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+# Row converters: validate one parsed record and return column values
+def product_row(record):
+    row = {
+        "name": _required(record, "name", str),
+        "description": _optional(record, "description", str),
+        "price": _required(record, "price", money),
+        "cost_price": _optional(record, "cost_price", money, 0),
+        "quantity": _required(record, "quantity", int),
+        "expiration_date": _optional(record, "expiration_date", _date),
+        "created_at": datetime.utcnow(),
+    }
+    if "id" in record:
+        row["id"] = _required(record, "id", int)
+    return row
+
+
+def service_row(record):
+    row = {
+        "name": _required(record, "name", str),
+        "description": _optional(record, "description", str),
+        "price": _required(record, "price", money),
+        "duration_minutes": _optional(record, "duration_minutes", duration_minutes),
+        "created_at": datetime.utcnow(),
+    }
+    if "id" in record:
+        row["id"] = _required(record, "id", int)
+    return row
+
+
+def sale_row(record):
+    quantity = _required(record, "quantity_sold", int)
+    if quantity <= 0:
+        raise RowError("'quantity_sold' must be positive")
+    return {
+        "product_id": _required(record, "product_id", int),
+        "quantity_sold": quantity,
+        "sale_price": _required(record, "sale_price", money),
+        "cost_price": _optional(record, "cost_price", money),  # the product's current cost when omitted
+        "sale_date": _optional(record, "sale_date", utc_datetime) or datetime.utcnow(),
+    }
+
+
+def _write_chunk(model, rows, upsert):
+    if upsert:
+        insert_ = upsert_insert()
+        if insert_ is None:
+            raise RowError("Upsert is not supported on this database")
+        stmt = insert_(model.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={name: stmt.excluded[name] for name in rows[0] if name not in ("id", "created_at")}
+        )
+        # ON CONFLICT needs uniform keys per executemany batch
+        with_id = [row for row in rows if "id" in row]
+        without_id = [row for row in rows if "id" not in row]
+        if with_id:
+            db.session.execute(stmt, with_id)
+        if without_id:
+            db.session.execute(insert(model), without_id)
+    else:
+        db.session.execute(insert(model), rows)
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def import_records(model, records, convert, upsert=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                   prepare_chunk=None, after_chunk=None):
+    """Convert and insert ``records`` in committed chunks of ``chunk_size`` rows.
+
+    ``prepare_chunk(rows)`` may drop rows by returning ``(kept_rows, errors)``
+    and ``after_chunk(rows)`` runs inside the chunk's transaction. If a
+    chunk fails as a whole, its rows are retried one by one in savepoints so
+    that only the offending rows are reported.
+    """
+    report = ImportReport()
+    chunk = []
+
+    def flush():
+        rows = chunk[:]
+        chunk.clear()
+        if prepare_chunk:
+            rows, errors = prepare_chunk(rows)
+            for line_number, message in errors:
+                report.add_error(line_number, message)
+        if not rows:
+            return
+        try:
+            _write_chunk(model, [row for _, row in rows], upsert)
+            if after_chunk:
+                after_chunk([row for _, row in rows])
+            db.session.commit()
+            report.processed += len(rows)
+        except Exception:
+            db.session.rollback()
+            written = []
+            for line_number, row in rows:
+                try:
+                    with db.session.begin_nested():
+                        _write_chunk(model, [row], upsert)
+                    written.append(row)
+                except Exception as e:
+                    report.add_error(line_number, str(getattr(e, "orig", e)))
+            if written and after_chunk:
+                after_chunk(written)
+            db.session.commit()
+            report.processed += len(written)
+
+    for line_number, record in records:
+        if isinstance(record, RowError):
+            report.add_error(line_number, str(record))
+            continue
+        try:
+            chunk.append((line_number, convert(record)))
+        except RowError as e:
+            report.add_error(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return report
+
+
+# Export side
+EXPORT_COLUMNS = {
+    Product: ["id", "name", "description", "price", "cost_price", "quantity", "expiration_date", "created_at"],
+    Service: ["id", "name", "description", "price", "duration_minutes", "created_at"],
+    ProductSale: ["id", "product_id", "quantity_sold", "sale_price", "cost_price", "sale_date"],
+}
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def export_response(model, fmt="csv", batch_size=DEFAULT_CHUNK_SIZE):
+    """Stream every row of ``model`` as CSV or NDJSON using a server-side cursor."""
+    names = EXPORT_COLUMNS[model]
+    columns = [getattr(model, name) for name in names]
+    query = db.session.query(*columns).order_by(model.id).execution_options(
+        stream_results=True, yield_per=batch_size
+    )
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for index, row in enumerate(query, start=1):
+            writer.writerow([_plain(value) for value in row])
+            if index % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    dumps = current_app.json.dumps
+
+    def generate_ndjson():
+        lines = []
+        for row in query:
+            lines.append(dumps(dict(zip(names, map(_plain, row)))))
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    if fmt == "ndjson":
+        return Response(stream_with_context(generate_ndjson()), mimetype="application/x-ndjson")
+    filename = f"{model.__tablename__}.csv"
+    return Response(
+        stream_with_context(generate_csv()), mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import current_app, g, request, make_response
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._counters = {}  # Kept apart from the LRU so they are never evicted
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Shared cache backend; any Redis-protocol server (including a local one) works."""
+
+    def __init__(self, url, ttl=60, prefix="shoplite:"):
+        import redis  # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0  # Redis tracks its own evictions
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "*"))
+
+
+# Invalidations to repeat when the enclosing deferred_invalidation block exits
+_replay = ContextVar("cache_replay", default=None)
+
+
+class ResponseCache:
+    """Read-through cache of GET responses with strong ETags.
+
+    Keys embed generation counters instead of being deleted on write: each
+    resource id has its own counter, and each namespace has one for its list
+    pages and one for "everything". A write bumps the relevant counters, so
+    entries computed before the write can never be read again, even if a
+    slow reader stores them after the write committed.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get("CACHE_BACKEND", "memory")
+        ttl = app.config.get("CACHE_TTL", 60)
+        if kind == "redis":
+            self.backend = RedisBackend(app.config["CACHE_REDIS_URL"], ttl=ttl)
+        elif kind == "memory":
+            # Invalidation is per process, so multi-worker deployments cap how long entries live
+            max_ttl = app.config.get("CACHE_MEMORY_MAX_TTL")
+            if max_ttl:
+                ttl = min(ttl, max_ttl)
+            self.backend = MemoryBackend(app.config.get("CACHE_MAXSIZE", 1024), ttl=ttl)
+        else:
+            self.backend = None
+        app.extensions["response_cache"] = self
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _item_key(self, namespace, id):
+        everything = self.backend.counter(f"{namespace}:all")
+        generation = self.backend.counter(f"{namespace}:item:{id}")
+        return f"{namespace}:item:{id}:{everything}.{generation}"
+
+    def _list_key(self, namespace):
+        generation = self.backend.counter(f"{namespace}:list")
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        accept = request.headers.get("Accept", "")
+        return f"{namespace}:list:{generation}:{request.path}?{query}|{accept}"
+
+    def cached(self, namespace, id_arg=None):
+        """Cache a GET view; ``id_arg`` names the URL argument of detail views.
+
+        A request with ``g.cache_fresh`` set skips the lookup (its response is
+        still stored), and ``g.cache_max_ttl`` caps how long it is kept.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+
+                if id_arg is not None:
+                    key = self._item_key(namespace, kwargs[id_arg])
+                else:
+                    key = self._list_key(namespace)
+
+                entry = None
+                if not g.get("cache_fresh"):
+                    entry = self.backend.get(key)
+                    self._count(entry is not None)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        "body": body.decode(),
+                        "mimetype": response.mimetype,
+                        "etag": hashlib.sha256(body).hexdigest()[:32],
+                    }
+                    ttl = g.get("cache_max_ttl")
+                    if ttl and self.backend.ttl:
+                        ttl = min(ttl, self.backend.ttl)  # A cap never lengthens the backend's own TTL
+                    self.backend.set(key, entry, ttl=ttl)
+                else:
+                    response = current_app.response_class(entry["body"], mimetype=entry["mimetype"])
+
+                response.set_etag(entry["etag"])
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+    def invalidate(self, namespace, ids=()):
+        """Invalidate cached detail responses for ``ids`` and every cached list page."""
+        if self.backend is None:
+            return
+        self._record(self.invalidate, namespace, list(ids))
+        for id in ids:
+            self.backend.incr(f"{namespace}:item:{id}")
+        self.backend.incr(f"{namespace}:list")
+
+    def invalidate_all(self, namespace):
+        if self.backend is None:
+            return
+        self._record(self.invalidate_all, namespace)
+        self.backend.incr(f"{namespace}:all")
+        self.backend.incr(f"{namespace}:list")
+
+    @staticmethod
+    def _record(method, *args):
+        calls = _replay.get()
+        if calls is not None:
+            calls.append((method, args))
+
+    @contextmanager
+    def deferred_invalidation(self):
+        """Repeat the invalidations made inside the block when it exits.
+
+        For writes whose commit comes later than their invalidation: a reader
+        could cache the old rows in between, so the counters are bumped again
+        once the block (and the commit inside it) is done.
+        """
+        calls = []
+        token = _replay.set(calls)
+        try:
+            yield
+        finally:
+            _replay.reset(token)
+        for method, args in calls:
+            method(*args)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions if self.backend else 0,
+            "size": len(self.backend) if self.backend else 0,
+        }
+
+
+cache = ResponseCache()
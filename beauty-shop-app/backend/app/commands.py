@@ -0,0 +1,333 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("rebuild-rollups")
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute the sales and booking rollup tables from raw history."""
+    from .rollups import rebuild_rollups
+    product_rows, service_rows = rebuild_rollups()
+    click.echo(f"Rebuilt {product_rows} product and {service_rows} service rollup rows.")
+
+
+@click.command("rebuild-related")
+@with_appcontext
+def rebuild_related_command():
+    """Recompute the frequently-bought-together tables from order history."""
+    from .recommendations import rebuild
+    pairs, ranked = rebuild()
+    click.echo(f"Counted {pairs} product pairs; kept {ranked} related products.")
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    from . import db
+    from .migrations import upgrade
+    applied = upgrade(db.engine)
+    click.echo(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+
+
+@click.command("db-version")
+@with_appcontext
+def db_version_command():
+    """Show the current schema version."""
+    from . import db
+    from .migrations import current_version, LATEST_VERSION
+    click.echo(f"Schema version {current_version(db.engine)} (latest {LATEST_VERSION})")
+
+
+@click.command("compact-inventory")
+@click.option("--check", is_flag=True, help="Also fail if any product's live stock differs from its ledger.")
+@click.option("--interval", type=float, default=None,
+              help="Keep running, compacting products moved since the last pass every INTERVAL seconds.")
+@with_appcontext
+def compact_inventory_command(check, interval):
+    """Write live stock back into products.quantity and rebalance stock shards."""
+    import time
+    from . import db
+    from .cache import cache
+    from .inventory import Compactor, compact, ledger_mismatches
+    if interval:
+        compactor = Compactor()
+        while True:
+            compactor.run()
+            db.session.remove()
+            time.sleep(interval)
+    changed = compact()
+    db.session.commit()
+    if changed:
+        cache.invalidate("products", changed)
+    click.echo(f"Updated the stored quantity of {len(changed)} products.")
+    if check:
+        mismatches = ledger_mismatches()
+        for product_id, on_hand, ledger_total in mismatches:
+            click.echo(f"  product {product_id}: on hand {on_hand}, ledger total {ledger_total}")
+        if mismatches:
+            raise SystemExit(1)
+        click.echo("Every tracked product matches its ledger.")
+
+
+@click.command("replica-status")
+@with_appcontext
+def replica_status_command():
+    """Check the read replica now and show whether GET requests would use it."""
+    from flask import current_app
+    monitor = current_app.extensions.get("read_replica")
+    if monitor is None:
+        click.echo("No read replica configured (set READ_REPLICA_URL).")
+        return
+    monitor.check()
+    status = monitor.status()
+    if status["error"]:
+        click.echo(f"Replica unavailable: {status['error']}")
+    elif status["lag_seconds"] is None:
+        click.echo("Replica has not replicated a heartbeat yet; reads stay on the primary.")
+    else:
+        verdict = "serving reads" if status["available"] else "too far behind, reads stay on the primary"
+        click.echo(f"Replica lag {status['lag_seconds']:.1f}s (max {status['max_lag_seconds']}s): {verdict}.")
+    if not status["available"]:
+        raise SystemExit(1)
+
+
+@click.command("archive-history")
+@click.option("--days", type=int, default=None, help="Archive closed rows older than this (default ARCHIVE_AFTER_DAYS).")
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction (default ARCHIVE_BATCH_SIZE).")
+@with_appcontext
+def archive_history_command(days, batch_size):
+    """Move closed orders, sales and bookings past the horizon to the archive database."""
+    from datetime import datetime, timedelta
+    from .archive import archive, engine, stats
+    if engine() is None:
+        click.echo("No archive database configured (set ARCHIVE_DATABASE_URL).")
+        raise SystemExit(1)
+
+    def progress(table, count):
+        click.echo(f"  {table}: {count} rows moved")
+
+    cutoff = datetime.utcnow() - timedelta(days=days) if days is not None else None
+    moved = archive(cutoff, batch_size, progress)
+    click.echo(f"Archived {sum(moved.values())} rows.")
+    for name, row in sorted(stats().items()):
+        span = f", {row.oldest:%Y-%m-%d} to {row.newest:%Y-%m-%d}" if row.oldest else ""
+        click.echo(f"  {name}: {row.rows} rows{span}")
+
+
+@click.command("check-indexes")
+@click.option("--verbose", is_flag=True, help="Print the full plan for every query.")
+@with_appcontext
+def check_indexes_command(verbose):
+    """EXPLAIN the hot queries from routes.py and fail if any needs a full table scan."""
+    from .explain import check_indexes
+    failed = False
+    for name, table, plan, scans in check_indexes():
+        status = "FULL SCAN" if scans else "ok"
+        click.echo(f"[{status}] {name} ({table})")
+        if scans or verbose:
+            for line in plan:
+                click.echo(f"    {line}")
+        failed = failed or bool(scans)
+    if failed:
+        raise SystemExit(1)
+
+
+@click.command("search-benchmark")
+@click.option("--requests", "count", default=500, show_default=True, help="Number of searches to run.")
+@click.option("--p99-ms", default=50.0, show_default=True, help="Fail if p99 latency exceeds this.")
+@click.option("--seed", default=0, show_default=True)
+@with_appcontext
+def search_benchmark_command(count, p99_ms, seed):
+    """Time /api/search with typeahead prefixes of existing names and report p50/p95/p99."""
+    import random
+    import time
+    from flask import current_app
+    from .models import Product, Service
+    from .search import tokenize
+
+    rng = random.Random(seed)
+    names = [name for model in (Product, Service)
+             for (name,) in model.query.with_entities(model.name).limit(5000)]
+    words = sorted({word for name in names for word in tokenize(name or "")})
+    if not words:
+        click.echo("No products or services to search; load some data first.")
+        raise SystemExit(1)
+
+    client = current_app.test_client()
+    timings = []
+    for _ in range(count):
+        word = rng.choice(words)
+        q = word[:rng.randint(min(2, len(word)), len(word))]
+        started = time.perf_counter()
+        response = client.get("/api/search", query_string={"q": q, "type": "all"})
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            click.echo(f"Search for {q!r} failed with {response.status_code}")
+            raise SystemExit(1)
+
+    timings.sort()
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+
+    p99 = percentile(99)
+    click.echo(f"{count} searches over {len(words)} words: "
+               f"p50 {percentile(50):.2f} ms, p95 {percentile(95):.2f} ms, p99 {p99:.2f} ms")
+    if p99 > p99_ms:
+        click.echo(f"p99 exceeds target of {p99_ms:.2f} ms")
+        raise SystemExit(1)
+
+
+@click.command("metrics-benchmark")
+@click.option("--iterations", default=100000, show_default=True)
+@click.option("--max-us", default=10.0, show_default=True, help="Fail if per-request overhead exceeds this.")
+@with_appcontext
+def metrics_benchmark_command(iterations, max_us):
+    """Measure the per-request and per-SQL-statement cost of the metrics hooks."""
+    import time
+    from types import SimpleNamespace
+    from flask import current_app
+    from .metrics import metrics, request_hooks, _before_execute, _after_execute
+
+    start_request, finish_request = request_hooks(current_app.config.get("SLOW_REQUEST_MS"))
+    with current_app.test_request_context("/api/products"):
+        response = current_app.response_class("{}", mimetype="application/json")
+        started = time.perf_counter()
+        for _ in range(iterations):
+            start_request()
+            finish_request(response)
+        per_request = (time.perf_counter() - started) / iterations * 1e6
+
+        start_request()
+        context = SimpleNamespace()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            _before_execute(None, None, "SELECT 1", (), context, False)
+            _after_execute(None, None, "SELECT 1", (), context, False)
+        per_statement = (time.perf_counter() - started) / iterations * 1e6
+        finish_request(response)
+    metrics.reset()
+
+    click.echo(f"Metrics overhead: {per_request:.2f} us per request, {per_statement:.2f} us per SQL statement")
+    if per_request > max_us:
+        click.echo(f"Per-request overhead exceeds {max_us:.2f} us")
+        raise SystemExit(1)
+
+
+@click.command("seed")
+@click.option("--products", default=1000, show_default=True)
+@click.option("--services", default=50, show_default=True)
+@click.option("--customers", default=1000, show_default=True)
+@click.option("--bookings", default=5000, show_default=True)
+@click.option("--orders", default=5000, show_default=True)
+@click.option("--sales", default=50000, show_default=True)
+@click.option("--seed", "seed_value", default=42, show_default=True, help="Random seed; same seed, same data.")
+@click.option("--batch-size", default=5000, show_default=True)
+@click.option("--reset", is_flag=True, help="Delete existing shop data first.")
+@with_appcontext
+def seed_command(products, services, customers, bookings, orders, sales, seed_value, batch_size, reset):
+    """Fill the database with deterministic synthetic data using bulk inserts."""
+    import time
+    from .models import Product
+    from .seed import clear, generate
+
+    if reset:
+        clear()
+    elif Product.query.first() is not None:
+        click.echo("Database already has data; pass --reset to replace it.")
+        raise SystemExit(1)
+
+    started = time.perf_counter()
+
+    def progress(table, count):
+        click.echo(f"  {table}: {count} rows ({time.perf_counter() - started:.1f}s)")
+
+    written = generate({
+        "products": products, "services": services, "customers": customers,
+        "bookings": bookings, "orders": orders, "sales": sales,
+    }, seed=seed_value, batch_size=batch_size, progress=progress)
+    click.echo(f"Seeded {sum(written.values())} rows in {time.perf_counter() - started:.1f}s.")
+
+
+@click.command("benchmark")
+@click.option("--iterations", default=50, show_default=True, help="Requests per scenario (heavy ones run a tenth).")
+@click.option("--concurrency", default=1, show_default=True, help="Parallel requests per scenario.")
+@click.option("--url", default=None, help="Benchmark a running server over HTTP instead of the test client.")
+@click.option("--only", default=None, help="Run only scenarios whose name contains this text.")
+@click.option("--save-baseline", type=click.Path(dir_okay=False), default=None)
+@click.option("--compare", "baseline_path", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Fail if p95 latency, queries or errors regress against this baseline.")
+@click.option("--tolerance", default=0.5, show_default=True, help="Allowed relative p95 slowdown.")
+@with_appcontext
+def benchmark_command(iterations, concurrency, url, only, save_baseline, baseline_path, tolerance):
+    """Drive every API route and report throughput, p50/p95/p99 latency and queries per request."""
+    import json
+    import subprocess
+    from datetime import datetime
+    from flask import current_app
+    from . import db
+    from .benchmark import (
+        ClientTransport, EngineQueryCounter, HttpTransport, MetricsQueryCounter,
+        compare, run, uncovered_endpoints
+    )
+
+    if url:
+        transport = HttpTransport(url)
+        counter = MetricsQueryCounter(transport)
+    else:
+        transport = ClientTransport(current_app)
+        counter = EngineQueryCounter(db.engines.values())
+
+    click.echo(f"{'scenario':<36} {'reqs':>5} {'err':>4} {'req/s':>8} "
+               f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+
+    def progress(name, r):
+        queries = "-" if r["queries_per_request"] is None else r["queries_per_request"]
+        click.echo(f"{name:<36} {r['requests']:>5} {r['errors']:>4} {r['throughput']:>8} "
+                   f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {queries:>8}")
+
+    results = run(transport, counter, iterations, concurrency, only, progress)
+    if not only:
+        missing = uncovered_endpoints(current_app, results)
+        if missing:
+            click.echo(f"Routes without a scenario: {', '.join(missing)}")
+    if save_baseline:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                    text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        with open(save_baseline, "w") as f:
+            json.dump({
+                "created_at": datetime.utcnow().isoformat(), "commit": commit,
+                "mode": "http" if url else "client", "iterations": iterations,
+                "concurrency": concurrency, "results": results,
+            }, f, indent=2, sort_keys=True)
+        click.echo(f"Baseline written to {save_baseline}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], tolerance)
+        if regressions:
+            click.echo(f"Regressions against {baseline_path} (commit {baseline.get('commit')}):")
+            for line in regressions:
+                click.echo(f"  {line}")
+            raise SystemExit(1)
+        click.echo(f"No regressions against {baseline_path}.")
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(rebuild_related_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_version_command)
+    app.cli.add_command(compact_inventory_command)
+    app.cli.add_command(replica_status_command)
+    app.cli.add_command(archive_history_command)
+    app.cli.add_command(check_indexes_command)
+    app.cli.add_command(search_benchmark_command)
+    app.cli.add_command(metrics_benchmark_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(benchmark_command)
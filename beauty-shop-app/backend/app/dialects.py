@@ -0,0 +1,17 @@
+from . import db
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def upsert_insert():
+    """Return the dialect's ``insert`` construct supporting ON CONFLICT, or None."""
+    dialect = dialect_name()
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
@@ -0,0 +1,57 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def normalize_url(url):
+    # Heroku-style URLs use the scheme SQLAlchemy 1.4+ no longer accepts
+    if url.startswith("postgres://"):
+        url = "postgresql+psycopg2://" + url[len("postgres://"):]
+    return url
+
+
+def engine_profile(config, url=None):
+    """Engine options for the configured database (or ``url``), chosen by its URL scheme."""
+    backend = make_url(url or config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+    if backend == "sqlite":
+        # sqlite3's own lock wait (seconds), kept in step with the busy_timeout pragma (ms)
+        return {"connect_args": {"timeout": config["SQLITE_PRAGMAS"].get("busy_timeout", 5000) / 1000}}
+    if backend == "postgresql":
+        return {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT"],
+            "pool_recycle": config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": True,
+            "connect_args": {"connect_timeout": config["DB_CONNECT_TIMEOUT"]},
+        }
+    return {}
+
+
+def init_engine_profile(app):
+    app.config["SQLALCHEMY_DATABASE_URI"] = normalize_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    options = engine_profile(app.config)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    # No model is bound to these: reads are routed to the "replica" per
+    # request, and app/archive.py uses the "archive" engine directly
+    for bind, setting in (("replica", "READ_REPLICA_URL"), ("archive", "ARCHIVE_DATABASE_URL")):
+        url = app.config.get(setting)
+        if url:
+            url = normalize_url(url)
+            binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+            binds[bind] = {**engine_profile(app.config, url), "url": url}
+            app.config["SQLALCHEMY_BINDS"] = binds
+
+
+def init_sqlite_pragmas(engine, pragmas):
+    """Apply ``pragmas`` to every new connection of a SQLite ``engine``."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
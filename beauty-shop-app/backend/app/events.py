@@ -0,0 +1,278 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Response, current_app, jsonify, stream_with_context
+from sqlalchemy import delete, event, func, insert, select
+
+from . import db
+from .models import ChangeEvent
+from .transactions import ShopSession
+
+# Change feed for the admin dashboard. Write handlers call ``emit``; the
+# events are inserted into ``change_events`` by the commit that makes the
+# change, so rolled-back work sends nothing and every worker process sees
+# every event. One tailer thread per process polls that table and fans new
+# events out to the process's open /api/admin/events streams, so database
+# load follows the write rate rather than the number of dashboards.
+
+SESSION_KEY = "change_events"
+
+
+def _encode(value):
+    # Money as a number and times in ISO 8601, as the API renders them
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def emit(kind, key, **payload):
+    """Queue an event on the current session; the next commit writes it.
+
+    Events sharing ``key`` (e.g. ``"order:12"``) are coalesced for clients
+    that fall behind, so only the latest one per key is delivered.
+    """
+    db.session.info.setdefault(SESSION_KEY, []).append({
+        "kind": kind, "key": key, "payload": json.dumps(payload, default=_encode),
+        "created_at": datetime.utcnow()
+    })
+
+
+class Pruner:
+    """Deletes events older than ``EVENTS_RETENTION_SECONDS``, at most once a minute per process."""
+
+    INTERVAL = 60
+
+    def __init__(self):
+        self._ran = None
+        self._lock = threading.Lock()
+
+    def due(self):
+        with self._lock:
+            if self._ran is not None and time.monotonic() - self._ran < self.INTERVAL:
+                return False
+            self._ran = time.monotonic()
+            return True
+
+
+pruner = Pruner()
+
+
+def _write_pending(session):
+    events = session.info.pop(SESSION_KEY, None)
+    if not events:
+        return
+    session.execute(insert(ChangeEvent), events)
+    if pruner.due():
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get("EVENTS_RETENTION_SECONDS", 3600))
+        session.execute(delete(ChangeEvent).where(ChangeEvent.created_at < cutoff))
+
+
+def _drop_pending(session, previous_transaction):
+    if previous_transaction.parent is None:  # A savepoint rollback keeps the outer transaction's events
+        session.info.pop(SESSION_KEY, None)
+
+
+def _coalesce(previous, current):
+    """Fold two events with the same key into one; stock deltas add up, anything else is replaced."""
+    if previous["kind"] == current["kind"] == "stock.changed":
+        payload = {**current["payload"], "delta": previous["payload"]["delta"] + current["payload"]["delta"]}
+        return {**current, "payload": payload, "data": json.dumps(payload)}
+    return current
+
+
+class Subscriber:
+    """One stream's undelivered events, coalesced by key.
+
+    A client that falls more than ``limit`` keys behind has its backlog
+    dropped and is sent a single ``resync`` event instead, so a slow
+    dashboard costs bounded memory and never slows the tailer down.
+    """
+
+    def __init__(self, limit, kinds=None):
+        self.limit = limit
+        self.kinds = kinds
+        self.pending = OrderedDict()
+        self.overflowed = False
+        self.changed = threading.Condition()
+
+    def wants(self, change):
+        return self.kinds is None or change["kind"].split(".")[0] in self.kinds
+
+    def push(self, change):
+        with self.changed:
+            previous = self.pending.pop(change["key"], None)
+            self.pending[change["key"]] = change if previous is None else _coalesce(previous, change)
+            if len(self.pending) > self.limit:
+                self.pending.clear()
+                self.overflowed = True
+            self.changed.notify()
+
+    def take(self, timeout):
+        """Wait up to ``timeout`` seconds, then return ``(events, overflowed)`` and reset."""
+        with self.changed:
+            if not self.pending and not self.overflowed:
+                self.changed.wait(timeout)
+            events, overflowed = list(self.pending.values()), self.overflowed
+            self.pending.clear()
+            self.overflowed = False
+        return events, overflowed
+
+
+def _to_event(row):
+    return {"id": row.id, "kind": row.kind, "key": row.key, "payload": json.loads(row.payload), "data": row.payload}
+
+
+class ChangeFeed:
+    """Tails ``change_events`` in one background thread while this process has subscribers.
+
+    Ids come from the database, but a transaction can commit after one that
+    took a later id. Missing ids below the newest one seen are kept as gaps
+    and re-read for ``GAP_SECONDS`` before they are given up as rolled back.
+    """
+
+    GAP_SECONDS = 10
+    BATCH = 1000
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = None
+        self._gaps = {}  # id -> monotonic time it was first missed
+        self._seen = set()  # delivered ids above the read floor
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber):
+        """Register ``subscriber`` and return the id it will receive events after, or None if full."""
+        with self._lock:
+            if len(self.subscribers) >= current_app.config.get("EVENTS_MAX_CLIENTS", 8):
+                return None
+            if self._thread is None:
+                self.last_id = db.session.execute(select(func.max(ChangeEvent.id))).scalar() or 0
+                self._gaps.clear()
+                self._seen.clear()
+                self._thread = threading.Thread(
+                    target=self._run, args=(current_app._get_current_object(),), daemon=True,
+                    name="change-feed"
+                )
+                self._thread.start()
+            self.subscribers.add(subscriber)
+            return self.last_id
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def _run(self, app):
+        with app.app_context():
+            interval = app.config.get("EVENTS_POLL_SECONDS", 0.5)
+            while True:
+                with self._lock:
+                    if not self.subscribers:
+                        self._thread = None
+                        return
+                try:
+                    self.poll(db.engine)
+                except Exception:
+                    app.logger.exception("Change feed poll failed")
+                time.sleep(interval)
+
+    def poll(self, engine):
+        floor = min(self._gaps) - 1 if self._gaps else self.last_id
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(ChangeEvent.__table__).where(ChangeEvent.id > floor).order_by(ChangeEvent.id).limit(self.BATCH)
+            ).all()
+        events = [_to_event(row) for row in rows if row.id not in self._seen]
+        for row in rows:
+            self._gaps.pop(row.id, None)
+
+        now = time.monotonic()
+        newest = max([self.last_id] + [row.id for row in rows])
+        present = {row.id for row in rows} | self._seen
+        for missing in range(self.last_id + 1, newest):
+            if missing not in present:
+                self._gaps.setdefault(missing, now)
+        for gap, since in list(self._gaps.items()):
+            if now - since > self.GAP_SECONDS:
+                del self._gaps[gap]
+        self.last_id = newest
+        floor = min(self._gaps) - 1 if self._gaps else newest
+        self._seen = {id for id in self._seen | {change["id"] for change in events} if id > floor}
+
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for change in events:
+            for subscriber in subscribers:
+                if subscriber.wants(change):
+                    subscriber.push(change)
+
+
+feed = ChangeFeed()
+
+
+def _format(changeid, kind, data):
+    head = f"id: {changeid}\n" if changeid is not None else ""
+    return f"{head}event: {kind}\ndata: {data}\n\n"
+
+
+def stream_response(last_changeid=None, kinds=None):
+    """An SSE response of committed changes; ``Last-Event-ID`` replays what a reconnecting client missed."""
+    config = current_app.config
+    subscriber = Subscriber(config.get("EVENTS_CLIENT_BUFFER", 1000), kinds)
+    position = feed.subscribe(subscriber)
+    if position is None:
+        return jsonify({"error": "Too many open event streams, try again later"}), 503
+
+    replayed, resync = [], False
+    if last_changeid is not None and last_changeid < position:
+        limit = config.get("EVENTS_REPLAY_LIMIT", 1000)
+        try:
+            rows = db.session.execute(
+                select(ChangeEvent.__table__).where(ChangeEvent.id > last_changeid, ChangeEvent.id <= position)
+                .order_by(ChangeEvent.id).limit(limit + 1)
+            ).all()
+        except Exception:
+            feed.unsubscribe(subscriber)
+            raise
+        resync = len(rows) > limit
+        replayed = [] if resync else [change for change in map(_to_event, rows) if subscriber.wants(change)]
+    db.session.close()  # Return the connection; the stream itself never touches the database
+    heartbeat = config.get("EVENTS_HEARTBEAT_SECONDS", 15)
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if resync:
+                yield _format(None, "resync", "{}")
+            for change in replayed:
+                yield _format(change["id"], change["kind"], change["data"])
+            sent = {change["id"] for change in replayed}
+            while True:
+                events, overflowed = subscriber.take(heartbeat)
+                if overflowed:
+                    yield _format(None, "resync", "{}")
+                for change in events:
+                    if change["id"] not in sent:
+                        yield _format(change["id"], change["kind"], change["data"])
+                if not events and not overflowed:
+                    yield ": keepalive\n\n"
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Keep nginx from buffering the stream
+    })
+
+
+def init_events():
+    """Write queued events on commit and drop them on rollback, for every ``ShopSession``."""
+    if not event.contains(ShopSession, "before_commit", _write_pending):
+        event.listen(ShopSession, "before_commit", _write_pending)
+        event.listen(ShopSession, "after_soft_rollback", _drop_pending)
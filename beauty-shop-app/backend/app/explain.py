@@ -0,0 +1,85 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+
+from . import db
+from .models import Booking, Order, OrderItem, Product, ProductSale, ProductSalesRollup, StockShard
+
+
+def hot_queries():
+    """The hottest queries issued by routes.py, with the table each must reach via an index."""
+    now = datetime(2025, 1, 1)
+    page = 51  # DEFAULT_LIMIT + 1, as issued by paginate()
+    return [
+        ("get_orders_by_customer", "orders",
+         Order.query.filter(Order.customer_id == 1).order_by(Order.order_date.desc())),
+        ("get_all_orders (status filter)", "orders",
+         Order.query.filter(Order.status == "completed")
+         .order_by(Order.order_date.desc(), Order.id.desc()).limit(page)),
+        ("get_all_orders (first page)", "orders",
+         Order.query.order_by(Order.order_date.desc(), Order.id.desc()).limit(page)),
+        ("order items preload", "order_items",
+         OrderItem.query.filter(OrderItem.order_id.in_([1, 2, 3]))),
+        ("get_product_sales (by product)", "product_sales",
+         ProductSale.query.filter(ProductSale.product_id == 1)
+         .order_by(ProductSale.sale_date.desc(), ProductSale.id.desc()).limit(page)),
+        ("get_product_sales (first page)", "product_sales",
+         ProductSale.query.order_by(ProductSale.sale_date.desc(), ProductSale.id.desc()).limit(page)),
+        ("product_alerts (last sale per product)", "product_sales",
+         db.session.query(ProductSale.product_id, db.func.max(ProductSale.sale_date))
+         .group_by(ProductSale.product_id)),
+        ("get_bookings (service schedule)", "bookings",
+         Booking.query.filter(
+             Booking.service_id == 1,
+             Booking.scheduled_time >= now, Booking.scheduled_time < now + timedelta(days=1)
+         )),
+        ("low_stock_alerts (untracked products)", "products",
+         Product.query.filter(
+             Product.quantity <= 5,
+             ~select(StockShard.product_id).where(StockShard.product_id == Product.id).exists()
+         )),
+        ("expiring_soon_alerts", "products",
+         Product.query.filter(Product.expiration_date != None, Product.expiration_date <= now.date())),
+        ("profit_loss", "orders",
+         db.session.query(db.func.sum(OrderItem.quantity)).select_from(Order)
+         .join(OrderItem, OrderItem.order_id == Order.id)
+         .filter(Order.status == "completed", Order.order_date >= now)),
+        ("sales summary rollups", "product_sales_rollups",
+         db.session.query(db.func.sum(ProductSalesRollup.units)).filter(
+             ProductSalesRollup.granularity == "day", ProductSalesRollup.channel == "sale"
+         )),
+    ]
+
+
+def explain(query):
+    """Return the database's query plan for ``query`` as a list of lines."""
+    conn = db.session.connection()
+    sql = str(query.statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        # Small tables make sequential scans look cheap; forbid them so the
+        # plan shows whether an index *can* serve the query.
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = conn.exec_driver_sql("EXPLAIN " + sql)
+    else:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan, table):
+    """Plan lines showing ``table`` being read without any index."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        pattern = re.compile(rf"Seq Scan on {table}\b")
+        return [line for line in plan if pattern.search(line)]
+    pattern = re.compile(rf"^SCAN {table}\b(?!.*USING)")
+    return [line.strip() for line in plan if pattern.search(line.strip())]
+
+
+def check_indexes():
+    """Explain every hot query; returns ``(name, table, plan, full_scan_lines)`` tuples."""
+    results = []
+    for name, table, query in hot_queries():
+        plan = explain(query)
+        results.append((name, table, plan, full_scans(plan, table)))
+    db.session.rollback()
+    return results
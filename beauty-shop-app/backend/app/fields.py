@@ -0,0 +1,189 @@
+from functools import lru_cache
+from operator import attrgetter
+
+from flask import request
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
+
+from .loading import with_profile
+from .models import Booking, Customer, Order, OrderItem, Product, ProductSale, Service
+from .pagination import QueryArgError
+
+
+class Field:
+    """One output key: the columns it reads, an optional relationship loader, and its renderer."""
+
+    __slots__ = ("columns", "render", "loader")
+
+    def __init__(self, columns, render, loader=None):
+        self.columns = columns
+        self.render = render
+        self.loader = loader
+
+
+def column(name, iso=False):
+    get = attrgetter(name)
+    if not iso:
+        return Field((name,), get)
+
+    def render(obj):
+        value = get(obj)
+        return value.isoformat() if value is not None else None
+    return Field((name,), render)
+
+
+def related(relationship, attribute, loader):
+    """A value read through a to-one relationship, e.g. a booking's service name."""
+    get_related = attrgetter(relationship)
+
+    def render(obj):
+        target = get_related(obj)
+        return getattr(target, attribute) if target is not None else None
+    return Field((), render, loader)
+
+
+class FieldSet:
+    """The fields a list endpoint can return, mirroring the model's ``to_dict``.
+
+    ``always`` names columns loaded even when not requested (the keyset sort
+    column), ``includes`` maps ``include=`` names to the fields they add and
+    ``profile`` is the loading profile used for the full representation.
+    """
+
+    def __init__(self, model, fields, always=("id",), includes=None, profile=None):
+        self.model = model
+        self.fields = fields
+        self.always = always
+        self.includes = includes or {}
+        self.profile = profile
+
+    def parse(self):
+        """Requested field names from ``fields=``/``include=``, or None for the full representation."""
+        requested = request.args.get("fields", "")
+        if not requested.strip():
+            return None
+        names = ["id"] + [name.strip() for name in requested.split(",") if name.strip()]
+        for include in filter(None, (name.strip() for name in request.args.get("include", "").split(","))):
+            if include not in self.includes:
+                raise QueryArgError(f"Unknown include '{include}'. Use: {', '.join(sorted(self.includes))}")
+            names += self.includes[include]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise QueryArgError(f"Unknown field(s): {', '.join(unknown)}. Use: {', '.join(self.fields)}")
+        return tuple(dict.fromkeys(names))
+
+    @lru_cache(maxsize=256)
+    def options(self, names):
+        columns = dict.fromkeys(self.always)
+        loaders = []
+        for name in names:
+            field = self.fields[name]
+            columns.update(dict.fromkeys(field.columns))
+            if field.loader is not None:
+                loaders.append(field.loader())
+        # Unrequested columns and relationships raise instead of lazy loading
+        return (
+            load_only(*(getattr(self.model, name) for name in columns), raiseload=True),
+            *loaders,
+            raiseload("*"),
+        )
+
+    @lru_cache(maxsize=256)
+    def serializer(self, names):
+        renderers = tuple((name, self.fields[name].render) for name in names)
+
+        def serialize(obj):
+            return {name: render(obj) for name, render in renderers}
+        return serialize
+
+
+class Projection:
+    """A parsed ``fields=`` request applied to one query and its serializer."""
+
+    def __init__(self, fieldset, names):
+        self.fieldset = fieldset
+        self.names = names
+
+    def apply(self, query):
+        if self.names is None:
+            return with_profile(query, self.fieldset.profile) if self.fieldset.profile else query
+        return query.options(*self.fieldset.options(self.names))
+
+    @property
+    def serialize(self):
+        if self.names is None:
+            return lambda obj: obj.to_dict()
+        return self.fieldset.serializer(self.names)
+
+
+_ORDER_ITEM_FIELDS = (OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+
+FIELDSETS = {
+    "products": FieldSet(Product, {
+        "id": column("id"),
+        "name": column("name"),
+        "description": column("description"),
+        "price": column("price"),
+        "cost_price": column("cost_price"),
+        "quantity": column("quantity"),
+        "expiration_date": column("expiration_date", iso=True),
+        "created_at": column("created_at", iso=True),
+    }),
+    "services": FieldSet(Service, {
+        "id": column("id"),
+        "name": column("name"),
+        "description": column("description"),
+        "price": column("price"),
+        "duration_minutes": column("duration_minutes"),
+        "created_at": column("created_at", iso=True),
+    }),
+    "bookings": FieldSet(Booking, {
+        "id": column("id"),
+        "service_id": column("service_id"),
+        "service_name": related("service", "name",
+                                lambda: joinedload(Booking.service).load_only(Service.name)),
+        "customer_id": column("customer_id"),
+        "customer_name": related("customer", "name",
+                                 lambda: joinedload(Booking.customer).load_only(Customer.name)),
+        "scheduled_time": column("scheduled_time", iso=True),
+        "end_time": column("end_time", iso=True),
+        "status": column("status"),
+        "payment_status": column("payment_status"),
+        "created_at": column("created_at", iso=True),
+    }, includes={
+        "service": ["service_id", "service_name"],
+        "customer": ["customer_id", "customer_name"],
+    }, profile="booking"),
+    "sales": FieldSet(ProductSale, {
+        "id": column("id"),
+        "product_id": column("product_id"),
+        "product_name": related("product", "name",
+                                lambda: joinedload(ProductSale.product).load_only(Product.name)),
+        "quantity_sold": column("quantity_sold"),
+        "sale_price": column("sale_price"),
+        "sale_date": column("sale_date", iso=True),
+    }, always=("id", "sale_date"), includes={
+        "product": ["product_id", "product_name"],
+    }, profile="sale"),
+    "orders": FieldSet(Order, {
+        "id": column("id"),
+        "customer_id": column("customer_id"),
+        "total_price": column("total_price"),
+        "status": column("status"),
+        "order_date": column("order_date"),
+        "items": Field((), lambda order: [item.to_dict() for item in order.items],
+                       lambda: selectinload(Order.items).load_only(*_ORDER_ITEM_FIELDS)
+                       .joinedload(OrderItem.product).load_only(Product.name)),
+    }, always=("id", "order_date"), includes={
+        "items": ["items"],
+    }, profile="order"),
+}
+
+
+def project(name):
+    """Parse ``fields=``/``include=`` for the ``name`` list endpoint.
+
+    Without ``fields=`` the endpoint's full ``to_dict`` representation and
+    loading profile are used; ``include=`` only matters alongside it.
+    """
+    fieldset = FIELDSETS[name]
+    return Projection(fieldset, fieldset.parse())
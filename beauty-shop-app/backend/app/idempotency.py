@@ -0,0 +1,195 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, make_response, request
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .cache import MemoryBackend
+from .models import IdempotencyKey
+from .transactions import single_transaction
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+
+
+class KeyConflict(Exception):
+    """The key is in use by another request, or was first used with a different one."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class IdempotencyStore:
+    """First responses per (scope, key), kept in ``idempotency_keys`` for ``IDEMPOTENCY_TTL``.
+
+    A request claims its key by inserting a row before the view runs; the
+    response is written to that row in the view's own transaction, so the
+    stored answer and the order it describes commit together. Completed
+    responses are also held in a bounded in-process LRU so most replays
+    never reach the database. Expired rows are purged periodically.
+    """
+
+    def __init__(self, app=None):
+        self.recent = None
+        self._purged = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.recent = MemoryBackend(
+            app.config.get("IDEMPOTENCY_CACHE_SIZE", 10000),
+            ttl=app.config.get("IDEMPOTENCY_TTL", 86400)
+        )
+        app.extensions["idempotency"] = self
+
+    def _ttl(self):
+        return timedelta(seconds=current_app.config.get("IDEMPOTENCY_TTL", 86400))
+
+    def _claim(self, scope, key, fingerprint):
+        """Claim the key for this request; returns None if claimed, else the existing row."""
+        now = datetime.utcnow()
+        table = IdempotencyKey.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(
+                    scope=scope, key=key, fingerprint=fingerprint,
+                    created_at=now, expires_at=now + self._ttl()
+                ))
+            return None
+        except IntegrityError:
+            pass
+
+        abandoned = now - timedelta(seconds=current_app.config.get("IDEMPOTENCY_LOCK_SECONDS", 60))
+        with db.engine.begin() as conn:
+            row = conn.execute(select(table).where(table.c.scope == scope, table.c.key == key)).first()
+            if row is None:
+                return self._claim(scope, key, fingerprint)  # Released in the meantime
+            # Take over expired responses and claims whose request died mid-flight
+            if row.expires_at < now or (row.status is None and row.created_at < abandoned):
+                taken = conn.execute(
+                    update(table)
+                    .where(table.c.scope == scope, table.c.key == key, table.c.created_at == row.created_at)
+                    .values(fingerprint=fingerprint, status=None, body=None, mimetype=None,
+                            created_at=now, expires_at=now + self._ttl())
+                ).rowcount
+                if taken:
+                    return None
+            return row
+
+    def release(self, scope, key):
+        """Drop an unfinished claim so a retry runs the view again."""
+        with db.engine.begin() as conn:
+            conn.execute(delete(IdempotencyKey.__table__).where(
+                IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.status == None
+            ))
+
+    def purge_expired(self):
+        """Delete expired rows, at most every ``IDEMPOTENCY_PURGE_SECONDS`` per process."""
+        interval = current_app.config.get("IDEMPOTENCY_PURGE_SECONDS", 300)
+        if self._purged is not None and time.monotonic() - self._purged < interval:
+            return
+        with self._lock:
+            if self._purged is not None and time.monotonic() - self._purged < interval:
+                return
+            self._purged = time.monotonic()
+        with db.engine.begin() as conn:
+            conn.execute(delete(IdempotencyKey.__table__).where(IdempotencyKey.expires_at < datetime.utcnow()))
+
+    def acquire(self, scope, key, fingerprint):
+        """Return a stored response dict to replay, or None once this request owns the key.
+
+        A duplicate of an in-flight request waits for it, up to
+        ``IDEMPOTENCY_WAIT_SECONDS``, then gets a 409.
+        """
+        self.purge_expired()
+        deadline = time.monotonic() + current_app.config.get("IDEMPOTENCY_WAIT_SECONDS", 10)
+        while True:
+            stored = self.recent.get(f"{scope}|{key}")
+            if stored is None:
+                row = self._claim(scope, key, fingerprint)
+                if row is None:
+                    return None
+                stored = {"fingerprint": row.fingerprint, "status": row.status,
+                          "body": row.body, "mimetype": row.mimetype}
+            if stored["fingerprint"] != fingerprint:
+                raise KeyConflict(f"{HEADER} was already used for a different request", 422)
+            if stored["status"] is not None:
+                self.recent.set(f"{scope}|{key}", stored)
+                return stored
+            if time.monotonic() > deadline:
+                raise KeyConflict(f"A request with this {HEADER} is still in progress", 409)
+            time.sleep(POLL_SECONDS)
+
+    def complete(self, scope, key, fingerprint, response):
+        """Store ``response`` in the current session's transaction; the caller commits."""
+        body = response.get_data(as_text=True)
+        db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .values(status=response.status_code, body=body, mimetype=response.mimetype)
+        )
+        return {"fingerprint": fingerprint, "status": response.status_code,
+                "body": body, "mimetype": response.mimetype}
+
+
+idempotency = IdempotencyStore()
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def idempotent(view):
+    """Replay the first response to a retried request carrying an ``Idempotency-Key`` header.
+
+    Keys are scoped to the endpoint and the authenticated customer (apply
+    this inside ``login_required``). Server errors are not stored, so a
+    retry after a 5xx runs the view again.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters"}), 400
+
+        scope = f"{request.endpoint}:{g.get('customer_id') or '-'}"
+        fingerprint = _fingerprint()
+        try:
+            stored = idempotency.acquire(scope, key, fingerprint)
+        except KeyConflict as e:
+            return jsonify({"error": str(e)}), e.status
+        if stored is not None:
+            response = current_app.response_class(stored["body"], status=stored["status"],
+                                                  mimetype=stored["mimetype"])
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            # The view's commits only flush, so its writes and the stored response commit together
+            with single_transaction(db.session):
+                response = make_response(view(*args, **kwargs))
+            if response.status_code >= 500 or response.is_streamed:
+                db.session.rollback()
+                idempotency.release(scope, key)
+                return response
+            stored = idempotency.complete(scope, key, fingerprint, response)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            idempotency.release(scope, key)
+            raise
+        idempotency.recent.set(f"{scope}|{key}", stored)
+        return response
+    return wrapper
@@ -0,0 +1,379 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from sqlalchemy import bindparam, delete, func, insert, select, update
+
+from . import db, events
+from .cache import cache
+from .dialects import upsert_insert
+from .models import InventoryMovement, Product, StockShard
+
+# Stock model: every change is appended to ``inventory_movements`` and applied
+# to one of the product's ``stock_shards`` rows, whose sum is the live on-hand
+# quantity. ``Product.quantity`` is a projection of that sum, written back by
+# ``compact`` every INVENTORY_COMPACT_SECONDS, so catalog reads stay a single
+# row while checkouts of one product spread their row locks over the shards.
+# Products get shards (and an "opening" movement) the first time stock moves.
+
+# Movements that are published on the admin change feed; "opening" and
+# "import" restate stock rather than move it
+FEED_REASONS = {"sale", "order", "cancel", "adjust"}
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Product {product_id} not available in required quantity")
+        self.product_id = product_id
+
+
+def load_products(product_ids, lock=False):
+    """Load products in one ``IN`` query, keyed by id.
+
+    With ``lock=True`` the rows are selected ``FOR UPDATE`` on backends that
+    support it (PostgreSQL); SQLite serializes writers and ignores the clause.
+    Rows are always read in id order so concurrent lockers cannot deadlock.
+    """
+    query = Product.query.filter(Product.id.in_(product_ids)).order_by(Product.id)
+    if lock:
+        query = query.with_for_update()
+    return {product.id: product for product in query}
+
+
+def _shard_count():
+    return max(1, current_app.config.get("INVENTORY_SHARDS", 4))
+
+
+def _split(quantity, shards):
+    base, extra = divmod(max(quantity, 0), shards)
+    return [base + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def _write_shards(product_id, quantity):
+    shards = _shard_count()
+    rows = [{"product_id": product_id, "shard": shard, "quantity": amount}
+            for shard, amount in enumerate(_split(quantity, shards))]
+    # A negative stock level (from legacy data) stays visible on shard 0
+    if quantity < 0:
+        rows[0]["quantity"] = quantity
+    insert_ = upsert_insert()
+    if insert_ is None:
+        return db.session.execute(insert(StockShard.__table__).values(rows)).rowcount
+    return db.session.execute(insert_(StockShard.__table__).values(rows).on_conflict_do_nothing()).rowcount
+
+
+def _locked_shards(product_id):
+    return db.session.execute(
+        select(StockShard.shard, StockShard.quantity)
+        .where(StockShard.product_id == product_id)
+        .order_by(StockShard.shard)
+        .with_for_update()
+    ).all()
+
+
+def open_stock(product_ids):
+    """Create shards for products that have none yet, from ``Product.quantity``.
+
+    The quantity becomes the product's "opening" movement. Safe to race: when
+    two transactions open the same product, only the first inserts rows.
+    """
+    has_shards = select(StockShard.product_id).where(StockShard.product_id == Product.id).exists()
+    rows = db.session.execute(
+        select(Product.id, Product.quantity).where(Product.id.in_(product_ids), ~has_shards)
+    ).all()
+    opened = {}
+    for product_id, quantity in rows:
+        if _write_shards(product_id, quantity):
+            opened[product_id] = quantity
+    record_movements("opening", None, opened)
+    return opened
+
+
+def record_movements(reason, reference, deltas):
+    """Append one ledger row per ``{product_id: delta}`` entry, skipping zero deltas."""
+    rows = [{"product_id": product_id, "delta": delta, "reason": reason, "reference": reference,
+             "created_at": datetime.utcnow()}
+            for product_id, delta in deltas.items() if delta]
+    if rows:
+        db.session.execute(insert(InventoryMovement), rows)
+    if reason in FEED_REASONS:
+        for row in rows:
+            events.emit("stock.changed", f"stock:{row['product_id']}", product_id=row["product_id"],
+                        delta=row["delta"], reason=reason)
+
+
+def _check_threshold(product_id, before, after):
+    """Publish a ``stock.threshold`` change when stock crosses LOW_STOCK_THRESHOLD either way."""
+    threshold = current_app.config.get("LOW_STOCK_THRESHOLD", 5)
+    below = after <= threshold
+    if below != (before <= threshold):
+        events.emit("stock.threshold", f"threshold:{product_id}", product_id=product_id,
+                    quantity=after, threshold=threshold, below=below)
+
+
+def decrement_stock(product_id, quantity):
+    """Take ``quantity`` units, raising OutOfStock if there are not enough.
+
+    The units come from one shard picked at random with a conditional
+    UPDATE, so concurrent checkouts of the same product mostly lock different
+    rows and can never both take the last unit. When no single shard has
+    enough, every shard of the product is locked and drained in order.
+    Callers record the matching ledger movement.
+    """
+    result = db.session.execute(
+        update(StockShard)
+        .where(StockShard.product_id == product_id,
+               StockShard.shard == random.randrange(_shard_count()),
+               StockShard.quantity >= quantity)
+        .values(quantity=StockShard.quantity - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        return
+
+    shards = _locked_shards(product_id)
+    if not shards and open_stock([product_id]):
+        shards = _locked_shards(product_id)
+    if sum(amount for _, amount in shards) < quantity:
+        raise OutOfStock(product_id)
+    remaining = quantity
+    for shard, amount in shards:
+        taken = min(max(amount, 0), remaining)
+        if taken:
+            db.session.execute(
+                update(StockShard)
+                .where(StockShard.product_id == product_id, StockShard.shard == shard)
+                .values(quantity=StockShard.quantity - taken)
+                .execution_options(synchronize_session=False)
+            )
+            remaining -= taken
+        if not remaining:
+            return
+
+
+def increment_stock(product_id, quantity):
+    """Put ``quantity`` units back on one shard; callers record the movement."""
+    for shard in (random.randrange(_shard_count()), 0):
+        result = db.session.execute(
+            update(StockShard)
+            .where(StockShard.product_id == product_id, StockShard.shard == shard)
+            .values(quantity=StockShard.quantity + quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return
+        open_stock([product_id])
+
+
+def restate(product_ids, reason, reference=None):
+    """Make the live stock match ``Product.quantity`` after it was set directly.
+
+    Used by manual edits and imports: the difference from the live on-hand
+    quantity is recorded as one movement and the shards are rewritten.
+    Products without shards are simply opened at the new quantity.
+    """
+    deltas = {}
+    for product_id in sorted(product_ids):
+        shards = _locked_shards(product_id)
+        if not shards:
+            open_stock([product_id])
+            continue
+        quantity = db.session.execute(select(Product.quantity).where(Product.id == product_id)).scalar()
+        deltas[product_id] = quantity - sum(amount for _, amount in shards)
+        _check_threshold(product_id, quantity - deltas[product_id], quantity)
+        forget(product_id)
+        _write_shards(product_id, quantity)
+    record_movements(reason, reference, deltas)
+
+
+def forget(product_id):
+    """Drop a product's shards (its ledger rows are kept)."""
+    db.session.execute(delete(StockShard).where(StockShard.product_id == product_id))
+
+
+def stock_report(product):
+    """Live and stored stock for ``product``; for tracked products ``on_hand`` equals ``ledger_total``."""
+    tracked = db.session.execute(
+        select(func.count(), func.sum(StockShard.quantity)).where(StockShard.product_id == product.id)
+    ).one()
+    ledger_total = db.session.execute(
+        select(func.coalesce(func.sum(InventoryMovement.delta), 0))
+        .where(InventoryMovement.product_id == product.id)
+    ).scalar()
+    return {
+        "product_id": product.id,
+        "tracked": bool(tracked[0]),
+        "on_hand": tracked[1] if tracked[0] else product.quantity,
+        "quantity": product.quantity,
+        "ledger_total": ledger_total,
+    }
+
+
+def _tracked_totals():
+    return (select(StockShard.product_id, func.sum(StockShard.quantity).label("on_hand"))
+            .group_by(StockShard.product_id).subquery())
+
+
+def live_quantities():
+    """``select`` of (product id, live on-hand stock) for every product, in id order.
+
+    Tracked products sum their shards; the others have never moved stock,
+    so their stored quantity is exact.
+    """
+    totals = _tracked_totals()
+    return (select(Product.id, func.coalesce(totals.c.on_hand, Product.quantity))
+            .outerjoin(totals, totals.c.product_id == Product.id).order_by(Product.id))
+
+
+def low_stock(threshold):
+    """``to_dict`` rows, with live quantities, for products whose live stock is at most ``threshold``."""
+    totals = (select(StockShard.product_id, func.sum(StockShard.quantity).label("on_hand"))
+              .group_by(StockShard.product_id).having(func.sum(StockShard.quantity) <= threshold).subquery())
+    tracked = db.session.query(Product, totals.c.on_hand).join(totals, totals.c.product_id == Product.id).all()
+    untracked = Product.query.filter(
+        Product.quantity <= threshold,
+        ~select(StockShard.product_id).where(StockShard.product_id == Product.id).exists()
+    ).all()
+    rows = [(product, on_hand) for product, on_hand in tracked]
+    rows += [(product, product.quantity) for product in untracked]
+    rows.sort(key=lambda row: row[0].id)
+    return [dict(product.to_dict(), quantity=on_hand) for product, on_hand in rows]
+
+
+def ledger_mismatches():
+    """(product_id, on_hand, ledger_total) for tracked products whose shards and ledger disagree."""
+    shards = _tracked_totals()
+    ledger = (select(InventoryMovement.product_id, func.sum(InventoryMovement.delta).label("total"))
+              .group_by(InventoryMovement.product_id).subquery())
+    return db.session.execute(
+        select(shards.c.product_id, shards.c.on_hand, func.coalesce(ledger.c.total, 0))
+        .outerjoin(ledger, ledger.c.product_id == shards.c.product_id)
+        .where(shards.c.on_hand != func.coalesce(ledger.c.total, 0))
+        .order_by(shards.c.product_id)
+    ).all()
+
+
+def compact(since=None):
+    """Write live on-hand totals back into ``Product.quantity``.
+
+    Only products with movements at or after ``since`` are considered (all
+    products with shards when None), and only rows whose stored quantity
+    differs are updated. Shards left uneven by one-sided traffic are
+    rebalanced so single-shard decrements keep succeeding. Returns the ids
+    whose quantity changed; the caller commits.
+    """
+    totals = select(StockShard.product_id, func.sum(StockShard.quantity).label("total"),
+                    func.min(StockShard.quantity).label("smallest"),
+                    func.count().label("shards")).group_by(StockShard.product_id)
+    if since is not None:
+        touched = select(InventoryMovement.product_id).where(InventoryMovement.created_at >= since)
+        totals = totals.where(StockShard.product_id.in_(touched))
+    totals = totals.subquery()
+    rows = db.session.execute(
+        select(totals.c.product_id, totals.c.total, totals.c.smallest, totals.c.shards, Product.quantity)
+        .join(Product, Product.id == totals.c.product_id)
+    ).all()
+
+    changed = [{"product_id": row.product_id, "total": row.total, "stored": row.quantity}
+               for row in rows if row.total != row.quantity]
+    if changed:
+        # Skip rows edited since they were read; the next run picks them up
+        products = Product.__table__
+        db.session.execute(
+            update(products)
+            .where(products.c.id == bindparam("product_id"), products.c.quantity == bindparam("stored"))
+            .values(quantity=bindparam("total")),
+            changed
+        )
+        for row in changed:
+            _check_threshold(row["product_id"], row["stored"], row["total"])
+
+    shards = _shard_count()
+    for row in rows:
+        if row.shards != shards or row.smallest < row.total // shards // 2:
+            locked = _locked_shards(row.product_id)
+            forget(row.product_id)
+            _write_shards(row.product_id, sum(amount for _, amount in locked))
+    return [row["product_id"] for row in changed]
+
+
+class Compactor:
+    """Runs ``compact`` every ``INVENTORY_COMPACT_SECONDS`` in a background thread.
+
+    The thread is started by the process's first API request (in each
+    worker after a gunicorn fork) and does all its database work off the
+    request path, so stored quantities trail live stock by about that
+    interval. Each run looks at products moved since the previous run,
+    minus an overlap for transactions that committed late; the first run in
+    a process covers every product.
+    """
+
+    OVERLAP = timedelta(seconds=60)
+
+    def __init__(self):
+        self._since = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Start the compaction thread in this process unless it is already running."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, args=(app,), daemon=True, name="inventory-compactor").start()
+            self._pid = os.getpid()
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                self.run()
+                db.session.remove()
+                time.sleep(app.config.get("INVENTORY_COMPACT_SECONDS", 5))
+
+    def run(self):
+        """Compact the products moved since the previous run; returns the ids whose quantity changed."""
+        started = datetime.utcnow()
+        try:
+            changed = compact(self._since)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Inventory compaction failed")
+            return []
+        if changed:
+            cache.invalidate("products", changed)
+        self._since = started - self.OVERLAP
+        return changed
+
+
+compactor = Compactor()
+
+
+# Catalog reads that filter on or return the stored Product.quantity
+STORED_QUANTITY_ENDPOINTS = {"api.get_products", "api.get_product", "api.search_catalog", "api.export_products"}
+
+
+def init_inventory(app, blueprint):
+    """Start the compaction thread with ``blueprint``'s first request, unless compaction runs elsewhere.
+
+    Catalog responses that use the stored quantity carry a
+    ``Stock-Lag-Seconds`` header: how far it may trail live stock while
+    compaction keeps up. Checkout, alerts and reorder points read live stock.
+    """
+    def add_stock_lag(response):
+        if request.endpoint in STORED_QUANTITY_ENDPOINTS:
+            response.headers["Stock-Lag-Seconds"] = f"{app.config.get('INVENTORY_COMPACT_SECONDS', 5):g}"
+        return response
+    app.after_request_funcs.setdefault(blueprint.name, []).append(add_stock_lag)
+
+    if not app.config.get("INVENTORY_COMPACT_IN_BACKGROUND", True):
+        return
+
+    def start_compactor():
+        compactor.start(app)
+    app.before_request_funcs.setdefault(blueprint.name, []).append(start_compactor)
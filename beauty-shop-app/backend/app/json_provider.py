@@ -0,0 +1,57 @@
+from datetime import date
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+
+class ShopJSONProvider(DefaultJSONProvider):
+    """Render Decimal money columns as JSON numbers rather than strings."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return DefaultJSONProvider.default(o)
+
+
+class OrjsonProvider(ShopJSONProvider):
+    """ShopJSONProvider output encoded with orjson, which is several times faster.
+
+    Dates are passed through to ``default`` so they keep Flask's HTTP-date
+    format; keys are sorted as with the default provider.
+    """
+
+    def __init__(self, app):
+        import orjson  # Optional dependency, only needed for this provider
+        super().__init__(app)
+        self._orjson = orjson
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return http_date(o)
+        return ShopJSONProvider.default(o)
+
+    def _encode(self, obj, indent=False):
+        options = self._options | self._orjson.OPT_INDENT_2 if indent else self._options
+        return self._orjson.dumps(obj, default=self.default, option=options)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return self._orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._encode(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {"default": ShopJSONProvider, "orjson": OrjsonProvider}
@@ -0,0 +1,27 @@
+from sqlalchemy.orm import joinedload, selectinload, raiseload
+
+from .models import Booking, ProductSale, Order, OrderItem
+
+ORDER_ITEMS = selectinload(Order.items).joinedload(OrderItem.product)
+
+# Per-endpoint loading profiles. Each profile preloads exactly the
+# relationships its serializer touches and turns any other lazy load into
+# an error, so a missed relationship shows up as a failure instead of N+1.
+LOADING_PROFILES = {
+    "order": (ORDER_ITEMS, raiseload("*")),
+    # Write paths keep lazy loading enabled since commit expires the rows
+    "order_update": (ORDER_ITEMS,),
+    "booking": (
+        joinedload(Booking.service),
+        joinedload(Booking.customer),
+        raiseload("*"),
+    ),
+    "sale": (
+        joinedload(ProductSale.product),
+        raiseload("*"),
+    ),
+}
+
+
+def with_profile(query, name):
+    return query.options(*LOADING_PROFILES[name])
@@ -0,0 +1,187 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+
+# Request latency histogram bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointStats:
+    __slots__ = ("buckets", "count", "latency_sum", "statuses", "sql_statements", "db_time", "response_bytes")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.latency_sum = 0.0
+        self.statuses = {}  # status class (2 for 2xx) -> count
+        self.sql_statements = 0
+        self.db_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """Per-endpoint request metrics for this process, rendered as Prometheus text.
+
+    Each gunicorn worker keeps its own registry, so scrape workers
+    individually or aggregate by instance.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, seconds, sql_statements, db_time, response_bytes):
+        key = (endpoint, method)
+        status_class = status // 100
+        slot = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = EndpointStats()
+            stats.buckets[slot] += 1
+            stats.count += 1
+            stats.latency_sum += seconds
+            stats.statuses[status_class] = stats.statuses.get(status_class, 0) + 1
+            stats.sql_statements += sql_statements
+            stats.db_time += db_time
+            stats.response_bytes += response_bytes
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def render(self):
+        with self._lock:
+            snapshot = [(key, _copy(stats)) for key, stats in sorted(self._stats.items())]
+
+        lines = [
+            "# HELP shop_http_requests_total Requests handled, by endpoint and status class.",
+            "# TYPE shop_http_requests_total counter",
+        ]
+        for (endpoint, method), stats in snapshot:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'shop_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}xx"}} {count}')
+
+        lines += [
+            "# HELP shop_http_request_duration_seconds Request latency.",
+            "# TYPE shop_http_request_duration_seconds histogram",
+        ]
+        for (endpoint, method), stats in snapshot:
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                cumulative += count
+                lines.append(f'shop_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"shop_http_request_duration_seconds_sum{{{labels}}} {stats.latency_sum:.6f}")
+            lines.append(f"shop_http_request_duration_seconds_count{{{labels}}} {stats.count}")
+
+        for name, attribute, help_text in (
+            ("shop_db_statements_total", "sql_statements", "SQL statements executed."),
+            ("shop_db_time_seconds_total", "db_time", "Time spent executing SQL statements."),
+            ("shop_http_response_bytes_total", "response_bytes", "Response body bytes (streamed bodies excluded)."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (endpoint, method), stats in snapshot:
+                value = getattr(stats, attribute)
+                value = f"{value:.6f}" if isinstance(value, float) else value
+                lines.append(f'{name}{{endpoint="{endpoint}",method="{method}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _copy(stats):
+    copy = EndpointStats()
+    for name in EndpointStats.__slots__:
+        value = getattr(stats, name)
+        setattr(copy, name, value.copy() if isinstance(value, (list, dict)) else value)
+    return copy
+
+
+metrics = MetricsRegistry()
+
+
+class RequestTimer:
+    __slots__ = ("started", "statements", "db_time", "sql")
+
+    def __init__(self, capture_sql):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.sql = [] if capture_sql else None
+
+
+# The timer for the API request running in this thread/context, if any. A
+# ContextVar keeps the per-statement hooks far cheaper than going through g.
+_current = ContextVar("request_timer", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current.get()
+    if timer is None:
+        return
+    elapsed = time.perf_counter() - context.metrics_started
+    timer.statements += 1
+    timer.db_time += elapsed
+    if timer.sql is not None:
+        timer.sql.append((elapsed, statement))
+
+
+def _log_slow_request(elapsed, statements):
+    lines = [f"Slow request: {request.method} {request.full_path.rstrip('?')} took "
+             f"{elapsed * 1000:.1f} ms with {len(statements)} SQL statements"]
+    for seconds, statement in statements:
+        lines.append(f"  [{seconds * 1000:.2f} ms] {' '.join(statement.split())}")
+    current_app.logger.warning("\n".join(lines))
+
+
+def request_hooks(slow_request_ms=None):
+    """Return ``(before_request, after_request)`` functions that time each request."""
+    capture_sql = slow_request_ms is not None
+    threshold = slow_request_ms / 1000 if capture_sql else None
+
+    def start_request():
+        _current.set(RequestTimer(capture_sql))
+
+    def finish_request(response):
+        timer = _current.get()
+        if timer is None:
+            return response
+        _current.set(None)
+        elapsed = time.perf_counter() - timer.started
+        req = request._get_current_object()
+        size = 0 if response.is_streamed else int(response.headers.get("Content-Length", 0))
+        metrics.observe(
+            req.endpoint, req.method, response.status_code, elapsed,
+            timer.statements, timer.db_time, size
+        )
+        if capture_sql and elapsed >= threshold:
+            _log_slow_request(elapsed, timer.sql)
+        return response
+
+    return start_request, finish_request
+
+
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app, engines, blueprint):
+    """Record request metrics for ``blueprint`` and serve them at ``/metrics``."""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+    start_request, finish_request = request_hooks(app.config.get("SLOW_REQUEST_MS"))
+    # Blueprint-scoped hooks on this app only, so the module-level blueprint
+    # can be registered on several apps
+    app.before_request_funcs.setdefault(blueprint.name, []).append(start_request)
+    app.after_request_funcs.setdefault(blueprint.name, []).append(finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
@@ -0,0 +1,201 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+
+from . import db
+from .rollups import backfill_rollups
+from .search import create_search_indexes
+from .models import (
+    Booking, Customer, Order, OrderItem, Product, ProductSale, Service,
+    ProductSalesRollup, ServiceBookingRollup, RevokedToken, InventoryMovement, StockShard,
+    IdempotencyKey, ReplicaHeartbeat, ProductPair, RelatedProduct, ChangeEvent
+)
+
+# Kept out of db.metadata so create_all never touches it
+_version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _column_ddl(conn, column):
+    return column.type.compile(dialect=conn.dialect)
+
+
+# Reusable step builders
+def add_columns(*columns):
+    def step(conn):
+        inspector = inspect(conn)
+        for column in columns:
+            table = column.table.name
+            if column.name in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {_column_ddl(conn, column)}"
+            if column.default is not None:
+                ddl += f" NOT NULL DEFAULT {column.default.arg}"
+            conn.execute(text(ddl))
+    return step
+
+
+def create_tables(*models):
+    def step(conn):
+        for model in models:
+            model.__table__.create(conn, checkfirst=True)
+    return step
+
+
+def create_indexes(*models):
+    def step(conn):
+        for model in models:
+            for index in model.__table__.indexes:
+                index.create(conn, checkfirst=True)
+    return step
+
+
+def alter_types(*columns):
+    """Change column types in place. SQLite only has type affinity, so it is skipped there."""
+    def step(conn):
+        if conn.dialect.name != "postgresql":
+            return
+        for column in columns:
+            ddl = _column_ddl(conn, column)
+            conn.execute(text(
+                f"ALTER TABLE {column.table.name} ALTER COLUMN {column.name} "
+                f"TYPE {ddl} USING {column.name}::{ddl}"
+            ))
+    return step
+
+
+def _backfill_booking_end_times(conn, batch_size=1000):
+    from .availability import DEFAULT_DURATION_MINUTES
+    bookings, services = Booking.__table__, Service.__table__
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(bookings.c.id, bookings.c.scheduled_time, services.c.duration_minutes)
+            .join(services, services.c.id == bookings.c.service_id)
+            .where(bookings.c.end_time == None, bookings.c.id > last_id)
+            .order_by(bookings.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        for row in rows:
+            minutes = row.duration_minutes or DEFAULT_DURATION_MINUTES
+            conn.execute(bookings.update().where(bookings.c.id == row.id).values(
+                end_time=row.scheduled_time + timedelta(minutes=minutes)
+            ))
+        last_id = rows[-1].id
+
+
+def add_booking_end_time(conn):
+    add_columns(Booking.__table__.c.end_time)(conn)
+    _backfill_booking_end_times(conn)
+
+
+def add_sale_cost_price(conn):
+    """Store each sale's unit cost; existing sales get their product's current cost, the best known."""
+    add_columns(ProductSale.__table__.c.cost_price)(conn)
+    sales, products = ProductSale.__table__, Product.__table__
+    conn.execute(sales.update().values(cost_price=func.coalesce(
+        select(products.c.cost_price).where(products.c.id == sales.c.product_id).scalar_subquery(), 0
+    )))
+
+
+def add_booking_price(conn):
+    """Store the price each booking was recorded at; existing bookings get their service's current price."""
+    add_columns(Booking.__table__.c.price)(conn)
+    bookings, services = Booking.__table__, Service.__table__
+    conn.execute(bookings.update().values(price=func.coalesce(
+        select(services.c.price).where(services.c.id == bookings.c.service_id).scalar_subquery(), 0
+    )))
+
+
+def drop_hourly_rollups(conn):
+    for model in (ProductSalesRollup, ServiceBookingRollup):
+        conn.execute(model.__table__.delete().where(model.__table__.c.granularity == "hour"))
+
+
+# Ordered list of schema changes. Append new steps; never edit applied ones.
+MIGRATIONS = [
+    (1, "add cost_price columns to products and order_items", add_columns(
+        Product.__table__.c.cost_price, OrderItem.__table__.c.cost_price
+    )),
+    (2, "create sales and booking rollup tables", create_tables(
+        ProductSalesRollup, ServiceBookingRollup
+    )),
+    (3, "add access-pattern indexes", create_indexes(
+        Product, Booking, ProductSale, Order, OrderItem
+    )),
+    (4, "store money as NUMERIC", alter_types(
+        Product.__table__.c.price, Product.__table__.c.cost_price,
+        Service.__table__.c.price, ProductSale.__table__.c.sale_price,
+        Order.__table__.c.total_price,
+        OrderItem.__table__.c.price, OrderItem.__table__.c.cost_price,
+        ProductSalesRollup.__table__.c.revenue, ProductSalesRollup.__table__.c.cost,
+        ServiceBookingRollup.__table__.c.revenue
+    )),
+    (5, "add bookings.end_time for availability checks", add_booking_end_time),
+    (6, "add full-text search indexes for products and services", create_search_indexes),
+    (7, "create revoked_tokens table", create_tables(RevokedToken)),
+    (8, "create inventory ledger and stock shard tables", create_tables(InventoryMovement, StockShard)),
+    (9, "create idempotency_keys table", create_tables(IdempotencyKey)),
+    (10, "create replica_heartbeats table", create_tables(ReplicaHeartbeat)),
+    (11, "create product_pairs and related_products tables", create_tables(ProductPair, RelatedProduct)),
+    (12, "create change_events table", create_tables(ChangeEvent)),
+    (13, "widen customers.password_hash for scrypt hashes", alter_types(Customer.__table__.c.password_hash)),
+    (14, "add product_sales.cost_price", add_sale_cost_price),
+    (15, "add bookings.price", add_booking_price),
+    (16, "drop hourly rollup rows, which nothing reads", drop_hourly_rollups),
+    (17, "backfill sales and booking rollups from existing history", backfill_rollups),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine):
+    if not inspect(engine).has_table("schema_migrations"):
+        return None
+    with engine.connect() as conn:
+        return conn.execute(select(db.func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def _stamp(conn, version, description):
+    conn.execute(schema_migrations.insert().values(
+        version=version, description=description, applied_at=datetime.utcnow()
+    ))
+
+
+def upgrade(engine):
+    """Bring the database schema up to date and return the list of applied versions.
+
+    An empty database gets the current schema from ``create_all`` and then
+    runs every step, which is a no-op for anything ``create_all`` already
+    built but still creates raw DDL such as the search indexes. A database
+    created before migrations existed starts from version 0; every step is
+    written to be safe on it.
+    """
+    version = current_version(engine)
+    if version is None:
+        fresh = not inspect(engine).has_table(Product.__tablename__)
+        with engine.begin() as conn:
+            _version_metadata.create_all(conn)
+            if fresh:
+                db.metadata.create_all(conn)
+                for number, description, step in MIGRATIONS:
+                    step(conn)
+                    _stamp(conn, number, description)
+                return [number for number, _, _ in MIGRATIONS]
+        version = 0
+
+    applied = []
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            _stamp(conn, number, description)
+        applied.append(number)
+    return applied
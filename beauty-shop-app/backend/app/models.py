@@ -1,6 +1,33 @@
 from . import db
-import hashlib
-from datetime import datetime
+from . import passwords
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+# Money is stored as exact decimals; the JSON provider renders it as numbers
+Money = db.Numeric(10, 2)
+MoneyTotal = db.Numeric(14, 2)
+
+
+def money(value):
+    """Convert a request value to an exact Decimal, raising ValueError if invalid."""
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+
+
+def utc_datetime(value):
+    """Parse an ISO 8601 request value as the naive UTC datetime the database stores.
+
+    Values with an offset are converted to UTC; naive values are taken as UTC.
+    Raises ValueError if invalid.
+    """
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid datetime: {value!r}")
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -8,9 +35,10 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    price = db.Column(db.Float, nullable=False)
-    quantity = db.Column(db.Integer, nullable=False, default=0)
-    expiration_date = db.Column(db.Date, nullable=True)
+    price = db.Column(Money, nullable=False)
+    cost_price = db.Column(Money, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0, index=True)  # low-stock alerts
+    expiration_date = db.Column(db.Date, nullable=True, index=True)  # expiry alerts
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -19,6 +47,7 @@ class Product(db.Model):
             "name": self.name,
             "description": self.description,
             "price": self.price,
+            "cost_price": self.cost_price,
             "quantity": self.quantity,
             "expiration_date": self.expiration_date.isoformat() if self.expiration_date else None,
             "created_at": self.created_at.isoformat()
@@ -30,7 +59,7 @@ class Service(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(Money, nullable=False)
     duration_minutes = db.Column(db.Integer, nullable=True)  # Optional: How long the service takes
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -46,11 +75,17 @@ class Service(db.Model):
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index("ix_bookings_service_time", "service_id", "scheduled_time"),
+        db.Index("ix_bookings_customer", "customer_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
     scheduled_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)  # scheduled_time + service duration
+    price = db.Column(Money, nullable=False, default=0)  # service price at time of booking
     status = db.Column(db.String(50), default="scheduled")  # scheduled, completed, cancelled
     payment_status = db.Column(db.String(50), default="unpaid")  # unpaid, paid
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -65,6 +100,7 @@ class Booking(db.Model):
             "customer_id": self.customer_id,
             "customer_name": self.customer.name if self.customer else None,
             "scheduled_time": self.scheduled_time.isoformat(),
+            "end_time": self.end_time.isoformat() if self.end_time else None,
             "status": self.status,
             "payment_status": self.payment_status,
             "created_at": self.created_at.isoformat()
@@ -72,12 +108,17 @@ class Booking(db.Model):
         
 class ProductSale(db.Model):
     __tablename__ = 'product_sales'
+    __table_args__ = (
+        # Per-product history and MAX(sale_date) per product for slow-seller alerts
+        db.Index("ix_product_sales_product_date", "product_id", "sale_date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity_sold = db.Column(db.Integer, nullable=False)
-    sale_price = db.Column(db.Float, nullable=False)
-    sale_date = db.Column(db.DateTime, default=datetime.utcnow)
+    sale_price = db.Column(Money, nullable=False)
+    cost_price = db.Column(Money, nullable=False, default=0)  # unit cost at time of sale
+    sale_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     product = db.relationship('Product', backref='sales')
 
@@ -99,15 +140,15 @@ class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # scrypt hashes run past 128 characters
 
     bookings = db.relationship("Booking", backref="customer", lazy=True)
 
     def set_password(self, password):
-        self.password_hash = hashlib.sha256(password.encode()).hexdigest()
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return self.password_hash == hashlib.sha256(password.encode()).hexdigest()
+        return passwords.verify_password(self.password_hash, password)
 
     def to_dict(self):
         return {
@@ -118,11 +159,15 @@ class Customer(db.Model):
         
 class Order(db.Model):
     __tablename__ = "orders"
+    __table_args__ = (
+        db.Index("ix_orders_customer_date", "customer_id", "order_date"),
+        db.Index("ix_orders_status_date", "status", "order_date"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
+    total_price = db.Column(Money, nullable=False)
     status = db.Column(db.String(50), default="pending")  # pending, completed, cancelled
-    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    order_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     items = db.relationship("OrderItem", backref="order", lazy=True)
 
@@ -139,10 +184,11 @@ class Order(db.Model):
 class OrderItem(db.Model):
     __tablename__ = "order_items"
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
-    price = db.Column(db.Float, nullable=False)  # unit price at time of order
+    price = db.Column(Money, nullable=False)  # unit price at time of order
+    cost_price = db.Column(Money, nullable=False, default=0)  # unit cost at time of order
 
     product = db.relationship("Product")
 
@@ -153,3 +199,145 @@ class OrderItem(db.Model):
             "quantity": self.quantity,
             "price": self.price
         }
+
+
+# Pre-aggregated sales figures, maintained by app/rollups.py in the same
+# transaction as the write that produced them.
+class ProductSalesRollup(db.Model):
+    __tablename__ = "product_sales_rollups"
+    __table_args__ = (
+        db.UniqueConstraint("granularity", "bucket_start", "channel", "product_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    channel = db.Column(db.String(20), nullable=False)  # sale, order
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(MoneyTotal, nullable=False, default=0)
+    cost = db.Column(MoneyTotal, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "granularity": self.granularity,
+            "bucket_start": self.bucket_start.isoformat(),
+            "channel": self.channel,
+            "product_id": self.product_id,
+            "units": self.units,
+            "revenue": self.revenue,
+            "cost": self.cost
+        }
+
+class ServiceBookingRollup(db.Model):
+    __tablename__ = "service_booking_rollups"
+    __table_args__ = (
+        db.UniqueConstraint("granularity", "bucket_start", "service_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(MoneyTotal, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "granularity": self.granularity,
+            "bucket_start": self.bucket_start.isoformat(),
+            "service_id": self.service_id,
+            "bookings": self.bookings,
+            "revenue": self.revenue
+        }
+
+# Access tokens revoked before they expire (logout); see app/auth.py
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(64), primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+# Append-only stock ledger: one row per change, never updated or deleted; see app/inventory.py
+class InventoryMovement(db.Model):
+    __tablename__ = "inventory_movements"
+    __table_args__ = (
+        db.Index("ix_inventory_movements_product", "product_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)  # No FK: the history outlives the product
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # opening, sale, order, cancel, adjust, import
+    reference = db.Column(db.String(50), nullable=True)  # e.g. "order:12"
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "delta": self.delta,
+            "reason": self.reason,
+            "reference": self.reference,
+            "created_at": self.created_at.isoformat()
+        }
+
+# Live on-hand stock, split over a few rows per product so checkouts rarely share a row lock
+class StockShard(db.Model):
+    __tablename__ = "stock_shards"
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete="CASCADE"), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+# First response to each Idempotency-Key, replayed to retries; see app/idempotency.py
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+
+    scope = db.Column(db.String(100), primary_key=True)  # endpoint and customer
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # hash of the request it was first used with
+    status = db.Column(db.Integer, nullable=True)  # NULL while the first request is in flight
+    body = db.Column(db.Text, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class ReplicaHeartbeat(db.Model):
+    __tablename__ = "replica_heartbeats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)  # stamped on the primary, read back from the replica
+
+# How many (non-cancelled) orders contained both products; stored in both directions, see app/recommendations.py
+class ProductPair(db.Model):
+    __tablename__ = "product_pairs"
+    __table_args__ = (
+        db.Index("ix_product_pairs_product_orders", "product_id", "orders"),
+    )
+
+    product_id = db.Column(db.Integer, primary_key=True)  # No FKs: rebuilt from order history
+    related_id = db.Column(db.Integer, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+# Top pairs per product, ranked from 0, served by /api/products/<id>/related
+class RelatedProduct(db.Model):
+    __tablename__ = "related_products"
+
+    product_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, nullable=False)
+    orders = db.Column(db.Integer, nullable=False)
+
+# Outbox of committed changes, tailed by each process for /api/admin/events; see app/events.py
+class ChangeEvent(db.Model):
+    __tablename__ = "change_events"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)  # e.g. order.created, stock.changed
+    key = db.Column(db.String(60), nullable=False)  # events with one key coalesce, e.g. "stock:12"
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
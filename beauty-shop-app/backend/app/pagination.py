@@ -0,0 +1,189 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import request, jsonify
+from sqlalchemy import and_, or_
+
+from .models import utc_datetime
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class QueryArgError(ValueError):
+    """Raised when a list endpoint receives a malformed query parameter."""
+
+
+# Cursors are opaque to clients: a base64 encoded [sort_value, id] pair
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, sort_column):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if sort_value is not None and sort_column.type.python_type is datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise QueryArgError("Invalid cursor")
+
+
+def _parse_datetime(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return utc_datetime(value)
+    except ValueError:
+        raise QueryArgError(f"Invalid '{name}' date. Use ISO 8601 format.")
+
+
+def _parse_float(name):
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise QueryArgError(f"Invalid '{name}' value. Must be a number.")
+
+
+# Filter helpers: each turns request args into a list of SQL predicates
+def date_range_filter(column, start_arg="from", end_arg="to"):
+    predicates = []
+    start = _parse_datetime(start_arg)
+    end = _parse_datetime(end_arg)
+    if start:
+        predicates.append(column >= start)
+    if end:
+        predicates.append(column <= end)
+    return predicates
+
+
+def number_range_filter(column, min_arg="min_price", max_arg="max_price"):
+    predicates = []
+    low = _parse_float(min_arg)
+    high = _parse_float(max_arg)
+    if low is not None:
+        predicates.append(column >= low)
+    if high is not None:
+        predicates.append(column <= high)
+    return predicates
+
+
+def escape_like(value):
+    """Escape LIKE wildcards in ``value``; use with ``escape="\\"``."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def prefix_filter(column, arg="name"):
+    prefix = request.args.get(arg)
+    if not prefix:
+        return []
+    return [column.like(escape_like(prefix) + "%", escape="\\")]
+
+
+def equals_filter(column, arg, type=str):
+    value = request.args.get(arg)
+    if value in (None, ""):
+        return []
+    try:
+        return [column == type(value)]
+    except ValueError:
+        raise QueryArgError(f"Invalid '{arg}' value.")
+
+
+class Page:
+    def __init__(self, items, next_cursor, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+
+    def to_dict(self, serialize):
+        body = {
+            "items": [serialize(item) for item in self.items],
+            "next_cursor": self.next_cursor,
+        }
+        if self.total is not None:
+            body["total"] = self.total
+        return body
+
+
+def parse_ids(arg="ids"):
+    """Ids requested with ``ids=1,2,3``, deduplicated in order, or None."""
+    value = request.args.get(arg)
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(",") if part.strip()))
+    except ValueError:
+        raise QueryArgError(f"Invalid '{arg}' value. Use comma-separated integers.")
+    if not 0 < len(ids) <= MAX_LIMIT:
+        raise QueryArgError(f"'{arg}' must name between 1 and {MAX_LIMIT} ids.")
+    return ids
+
+
+def fetch_many(query, id_column, ids):
+    """Load the rows for ``ids`` with one IN query; returns (rows in id order, missing ids)."""
+    found = {getattr(row, id_column.key): row for row in query.filter(id_column.in_(ids))}
+    return [found[id] for id in ids if id in found], [id for id in ids if id not in found]
+
+
+def parse_limit():
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def wants_count():
+    return request.args.get("count", "").lower() in ("1", "true", "yes")
+
+
+def sort_order(sort_column, id_column, descending=False):
+    columns = [id_column] if sort_column is id_column else [sort_column, id_column]
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+def paginate(query, sort_column, id_column, descending=False):
+    """Keyset-paginate ``query`` on (sort_column, id_column).
+
+    Only fetches ``limit + 1`` rows to detect whether another page exists;
+    ``COUNT(*)`` is only issued when the caller passes ``count=true``.
+    """
+    limit = parse_limit()
+    total = query.order_by(None).count() if wants_count() else None
+
+    token = request.args.get("cursor")
+    same_column = sort_column is id_column
+    if token:
+        sort_value, last_id = decode_cursor(token, sort_column)
+        if same_column:
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        elif descending:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > last_id)
+            ))
+
+    rows = query.order_by(*sort_order(sort_column, id_column, descending)).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return Page(rows, next_cursor, total)
+
+
+def page_response(page, serialize=lambda obj: obj.to_dict()):
+    return jsonify(page.to_dict(serialize))
@@ -0,0 +1,62 @@
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# KDF work runs on a small shared pool. hashlib releases the GIL while it
+# hashes, so request threads keep serving while a login waits, and the pool
+# size caps how many CPU cores a burst of logins can occupy at once.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get("PASSWORD_HASH_WORKERS", 2),
+                thread_name_prefix="password-kdf"
+            )
+        return _executor
+
+
+def _method():
+    return current_app.config.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+
+def _is_legacy(password_hash):
+    # Unsalted SHA-256 hex digests written before the KDF was introduced
+    return "$" not in password_hash
+
+
+def hash_password(password):
+    return _pool().submit(generate_password_hash, password, _method()).result()
+
+
+def verify_password(password_hash, password):
+    if not password_hash or password is None:
+        return False
+    if _is_legacy(password_hash):
+        digest = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(password_hash, digest)
+    return _pool().submit(check_password_hash, password_hash, password).result()
+
+
+_dummy_hashes = {}
+
+
+def dummy_hash():
+    """A hash in the configured method, for checks that must cost as much as a real login."""
+    method = _method()
+    if method not in _dummy_hashes:
+        _dummy_hashes[method] = hash_password("not-a-real-password")
+    return _dummy_hashes[method]
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a different method or cost than configured."""
+    return _is_legacy(password_hash) or password_hash.split("$", 1)[0] != _method()
@@ -0,0 +1,37 @@
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in testing mode when a request issues too many SQL statements."""
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statement_count = g.get("sql_statement_count", 0) + 1
+
+
+def init_query_budget(app, engines):
+    """Count SQL statements per request and enforce configured budgets.
+
+    ``SQL_STATEMENT_BUDGET`` sets a default limit and ``SQL_STATEMENT_BUDGETS``
+    maps endpoint names (e.g. ``"api.get_all_orders"``) to their own limit.
+    Budgets are only enforced when the app runs with ``TESTING`` enabled.
+    """
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _count_statement)
+
+    @app.after_request
+    def check_query_budget(response):
+        if not app.testing:
+            return response
+
+        budgets = app.config.get("SQL_STATEMENT_BUDGETS", {})
+        budget = budgets.get(request.endpoint, app.config.get("SQL_STATEMENT_BUDGET"))
+        count = g.get("sql_statement_count", 0)
+        if budget is not None and count > budget:
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} ran {count} SQL statements "
+                f"(budget {budget})"
+            )
+        return response
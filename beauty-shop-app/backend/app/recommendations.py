@@ -0,0 +1,156 @@
+from itertools import chain, permutations
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+
+from . import archive, db
+from .dialects import upsert_insert
+from .models import Order, OrderItem, Product, ProductPair, RelatedProduct
+
+# "Frequently bought together": ``product_pairs`` counts the orders holding
+# both products of each pair (both directions), and ``related_products``
+# keeps each product's top RELATED_PRODUCTS_TOP_K pairs by rank, so the
+# related endpoint is a single primary-key range read. ``rebuild`` derives
+# both tables from order history; ``record_order`` applies one order (or
+# backs out a cancelled one) in the order's own transaction. Ties rank by
+# product id, in both paths.
+
+
+def _top_k():
+    return max(1, current_app.config.get("RELATED_PRODUCTS_TOP_K", 10))
+
+
+def _add_pairs(rows):
+    """Add ``orders`` to each ``{product_id, related_id, orders}`` row, creating missing pairs."""
+    table = ProductPair.__table__
+    insert_ = upsert_insert()
+    if insert_ is not None:
+        stmt = insert_(table)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.product_id, table.c.related_id],
+            set_={"orders": table.c.orders + stmt.excluded.orders}
+        ), rows)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            update(table)
+            .where(table.c.product_id == row["product_id"], table.c.related_id == row["related_id"])
+            .values(orders=table.c.orders + row["orders"])
+        ).rowcount
+        if not updated:
+            db.session.execute(insert(table).values(**row))
+
+
+def refresh(product_ids, trim=True):
+    """Re-rank the related products of ``product_ids`` from their pair counts.
+
+    ``trim=False`` skips dropping surplus ranks, for callers that only ever
+    add to pair counts (a product's list can then only grow).
+    """
+    top_k = _top_k()
+    table = RelatedProduct.__table__
+    insert_ = upsert_insert()
+    for product_id in sorted(product_ids):
+        top = db.session.execute(
+            select(ProductPair.related_id, ProductPair.orders)
+            .where(ProductPair.product_id == product_id, ProductPair.orders > 0)
+            .order_by(ProductPair.orders.desc(), ProductPair.related_id)
+            .limit(top_k)
+        ).all()
+        rows = [{"product_id": product_id, "rank": rank, "related_id": related_id, "orders": orders}
+                for rank, (related_id, orders) in enumerate(top)]
+        # Overwrite ranks in place so concurrent refreshes of one product never collide on insert
+        if rows and insert_ is not None:
+            stmt = insert_(table)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.product_id, table.c.rank],
+                set_={"related_id": stmt.excluded.related_id, "orders": stmt.excluded.orders}
+            ), rows)
+        elif rows:
+            db.session.execute(delete(table).where(table.c.product_id == product_id))
+            db.session.execute(insert(table), rows)
+        if trim:
+            db.session.execute(delete(table).where(table.c.product_id == product_id, table.c.rank >= len(rows)))
+
+
+def record_order(product_ids, sign=1):
+    """Count one order over its distinct ``product_ids``; ``sign=-1`` backs out a cancellation."""
+    product_ids = sorted(set(product_ids))
+    if len(product_ids) < 2:
+        return
+    _add_pairs([{"product_id": a, "related_id": b, "orders": sign}
+                for a, b in permutations(product_ids, 2)])
+    if sign < 0:
+        db.session.execute(delete(ProductPair).where(
+            ProductPair.product_id.in_(product_ids), ProductPair.orders <= 0
+        ))
+    refresh(product_ids, trim=sign < 0)
+
+
+def related(product_id, limit):
+    """``(related_id, name, price, orders)`` rows for ``product_id``, best first."""
+    return db.session.execute(
+        select(RelatedProduct.related_id, Product.name, Product.price, RelatedProduct.orders)
+        .join(Product, Product.id == RelatedProduct.related_id)
+        .where(RelatedProduct.product_id == product_id, RelatedProduct.rank < limit)
+        .order_by(RelatedProduct.rank)
+    ).all()
+
+
+def rebuild(batch_size=10000):
+    """Recompute both tables from every non-cancelled order, archived ones included; returns ``(pairs, related rows)``.
+
+    With B the order-by-product incidence matrix (1 where the order holds
+    the product), B.T @ B counts the orders shared by every product pair;
+    its off-diagonal entries are the pairs. Each product's top K is taken
+    with one lexsort over all pairs instead of a per-product loop.
+    """
+    import numpy as np  # Optional dependencies, only needed for full rebuilds
+    from scipy import sparse
+
+    result = db.session.execute(
+        select(OrderItem.order_id, OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.status != "cancelled")
+        .execution_options(yield_per=batch_size)
+    )
+    archived_orders, archived_items = archive.archived_orders, archive.archived_order_items
+    archived = archive.partitions(
+        select(archived_items.c.order_id, archived_items.c.product_id)
+        .join_from(archived_items, archived_orders, archived_orders.c.id == archived_items.c.order_id)
+        .where(archived_orders.c.status != "cancelled"), batch_size
+    )
+    chunks = [np.array(chunk, dtype=np.int64) for chunk in chain(result.partitions(), archived)]
+    items = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+
+    order_ids, order_index = np.unique(items[:, 0], return_inverse=True)
+    product_ids, product_index = np.unique(items[:, 1], return_inverse=True)
+    basket = sparse.csr_matrix(
+        (np.ones(len(items), dtype=np.int32), (order_index, product_index)),
+        shape=(len(order_ids), len(product_ids))
+    )
+    basket.data[:] = 1  # Repeated lines for one product count once per order
+    together = (basket.T @ basket).tocoo()
+    off_diagonal = together.row != together.col
+    rows = product_ids[together.row[off_diagonal]]
+    cols = product_ids[together.col[off_diagonal]]
+    counts = together.data[off_diagonal].astype(np.int64)
+
+    ordered = np.lexsort((cols, -counts, rows))
+    rows, cols, counts = rows[ordered], cols[ordered], counts[ordered]
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    top = ranks < _top_k()
+
+    db.session.execute(delete(ProductPair))
+    db.session.execute(delete(RelatedProduct))
+    pairs = [{"product_id": a, "related_id": b, "orders": n}
+             for a, b, n in zip(rows.tolist(), cols.tolist(), counts.tolist())]
+    for start in range(0, len(pairs), batch_size):
+        db.session.execute(insert(ProductPair), pairs[start:start + batch_size])
+    ranked = [{"product_id": a, "rank": r, "related_id": b, "orders": n}
+              for a, r, b, n in zip(rows[top].tolist(), ranks[top].tolist(),
+                                    cols[top].tolist(), counts[top].tolist())]
+    for start in range(0, len(ranked), batch_size):
+        db.session.execute(insert(RelatedProduct), ranked[start:start + batch_size])
+    db.session.commit()
+    return len(pairs), len(ranked)
@@ -0,0 +1,153 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from . import db
+from .inventory import live_quantities
+from .models import Product, ProductSalesRollup
+from .rollups import bucket_start
+
+# Reorder points for the whole catalog. Daily demand per product comes from
+# the "day" sales rollups (sales and order items, net of cancellations), read
+# in one grouped query; statistics and reorder points are computed with NumPy
+# over catalog-wide arrays, never per product. Stock levels are live (stock
+# shard totals, not the compacted Product.quantity) as of ``generated_at``.
+#
+#   velocity       mean units per day over the window (days without sales count as 0)
+#   safety stock   z * daily std dev * sqrt(lead time)
+#   reorder point  velocity * lead time + safety stock
+#   order quantity what lifts stock to the reorder point plus `review` days of demand
+
+
+class DemandSnapshot:
+    """Catalog-wide arrays, aligned by position and sorted by product id."""
+
+    def __init__(self, product_ids, quantity, velocity, std, window_days, generated_at):
+        self.product_ids = product_ids
+        self.quantity = quantity
+        self.velocity = velocity
+        self.std = std
+        self.window_days = window_days
+        self.generated_at = generated_at
+
+    def __len__(self):
+        return len(self.product_ids)
+
+
+def _columns(result, width, dtype):
+    """Stack a result's rows into a ``(rows, width)`` array, one partition at a time."""
+    import numpy as np
+    chunks = [np.fromiter(chain.from_iterable(chunk), dtype=dtype, count=len(chunk) * width).reshape(-1, width)
+              for chunk in result.partitions()]
+    return np.concatenate(chunks) if chunks else np.empty((0, width), dtype=dtype)
+
+
+def snapshot(window_days, now=None, batch_size=50000):
+    import numpy as np
+
+    now = now or datetime.utcnow()
+    start = bucket_start(now, "day") - timedelta(days=window_days - 1)
+
+    products = _columns(db.session.execute(
+        live_quantities().execution_options(yield_per=batch_size)
+    ), 2, np.int64)
+    daily = _columns(db.session.execute(
+        select(ProductSalesRollup.product_id, func.sum(ProductSalesRollup.units))
+        .where(ProductSalesRollup.granularity == "day", ProductSalesRollup.bucket_start >= start)
+        .group_by(ProductSalesRollup.product_id, ProductSalesRollup.bucket_start)
+        .execution_options(yield_per=batch_size)
+    ), 2, np.float64)
+
+    product_ids = products[:, 0]
+    # Position of each (product, day) row in the catalog; rows of deleted products are dropped
+    position = np.searchsorted(product_ids, daily[:, 0])
+    known = position < len(product_ids)
+    known[known] = product_ids[position[known]] == daily[known, 0]
+    position = position[known]
+    units = np.clip(daily[known, 1], 0, None)
+
+    total = np.bincount(position, weights=units, minlength=len(product_ids))
+    squares = np.bincount(position, weights=units * units, minlength=len(product_ids))
+    velocity = total / window_days
+    std = np.sqrt(np.clip(squares / window_days - velocity * velocity, 0, None))
+    return DemandSnapshot(product_ids, products[:, 1], velocity, std, window_days, now)
+
+
+def reorder_points(demand, lead_days, review_days, z):
+    """Return ``(positions, columns)`` of products at or below their reorder point, most urgent first."""
+    import numpy as np
+
+    safety = z * demand.std * math.sqrt(lead_days)
+    reorder_point = demand.velocity * lead_days + safety
+    selling = demand.velocity > 0
+    cover = np.full(len(demand), np.inf)
+    np.divide(demand.quantity, demand.velocity, out=cover, where=selling)
+    order_quantity = np.ceil(np.clip(reorder_point + demand.velocity * review_days - demand.quantity, 0, None))
+
+    flagged = np.flatnonzero(selling & (demand.quantity <= reorder_point))
+    # Fewest days of cover first; product id breaks ties
+    positions = flagged[np.lexsort((demand.product_ids[flagged], cover[flagged]))]
+    return positions, {
+        "days_of_cover": cover,
+        "safety_stock": safety,
+        "reorder_point": reorder_point,
+        "order_quantity": order_quantity,
+    }
+
+
+def describe(demand, positions, columns):
+    """JSON-ready rows for ``positions``, with product names loaded in one query."""
+    ids = demand.product_ids[positions].tolist()
+    names = dict(db.session.execute(select(Product.id, Product.name).where(Product.id.in_(ids))).all())
+    return [
+        {
+            "product_id": product_id,
+            "name": names.get(product_id),
+            "quantity": int(demand.quantity[position]),
+            "daily_velocity": round(float(demand.velocity[position]), 3),
+            "daily_std": round(float(demand.std[position]), 3),
+            "days_of_cover": round(float(columns["days_of_cover"][position]), 1),
+            "safety_stock": round(float(columns["safety_stock"][position]), 2),
+            "reorder_point": round(float(columns["reorder_point"][position]), 2),
+            "order_quantity": int(columns["order_quantity"][position]),
+        }
+        for product_id, position in zip(ids, positions.tolist())
+    ]
+
+
+class DemandCache:
+    """Keeps one ``DemandSnapshot`` per process for ``REORDER_CACHE_SECONDS``.
+
+    One thread rebuilds an expired snapshot while the others keep serving
+    the previous one; only the very first build makes callers wait.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._built = None
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        ttl = current_app.config.get("REORDER_CACHE_SECONDS", 300)
+        return self._snapshot is not None and time.monotonic() - self._built < ttl
+
+    def get(self):
+        if self._fresh():
+            return self._snapshot
+        if not self._lock.acquire(blocking=self._snapshot is None):
+            return self._snapshot
+        try:
+            if not self._fresh():
+                self._snapshot = snapshot(current_app.config.get("REORDER_WINDOW_DAYS", 90))
+                self._built = time.monotonic()
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+demand_cache = DemandCache()
+
@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, request
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+from .engine import init_sqlite_pragmas
+from .models import ReplicaHeartbeat
+
+BIND = "replica"
+READ_METHODS = ("GET", "HEAD")
+STICKY_COOKIE = "read_primary_until"
+
+
+def primary_reads(view):
+    """Keep a GET view on the primary even when a replica is configured."""
+    view.primary_reads = True
+    return view
+
+
+class ReplicaMonitor:
+    """Whether the replica may serve reads, re-checked every ``READ_REPLICA_CHECK_SECONDS`` per process.
+
+    Lag is measured with a heartbeat row: each check stamps it on the
+    primary and reads it back from the replica. A replica holding the stamp
+    that was current before this check is caught up; otherwise its lag is
+    the age of the stamp it holds, so the estimate errs high by at most the
+    check interval. A replica that cannot be reached, or lags more than
+    ``READ_REPLICA_MAX_LAG_SECONDS``, is skipped until a later check passes.
+    """
+
+    def __init__(self, primary, replica, interval=2, max_lag=10):
+        self.primary = primary
+        self.replica = replica
+        self.interval = interval
+        self.max_lag = max_lag
+        self.available = False
+        self.lag = None
+        self.error = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def _beat(self, now):
+        """Stamp the heartbeat on the primary; returns the stamp it replaced."""
+        table = ReplicaHeartbeat.__table__
+        with self.primary.begin() as conn:
+            previous = conn.execute(select(table.c.beat_at).where(table.c.id == 1)).scalar()
+            if not conn.execute(update(table).where(table.c.id == 1).values(beat_at=now)).rowcount:
+                # Two processes racing for the first beat: the loser's check fails once
+                conn.execute(insert(table).values(id=1, beat_at=now))
+        return previous
+
+    def check(self):
+        now = datetime.utcnow()
+        try:
+            previous = self._beat(now)
+            with self.replica.connect() as conn:
+                replicated = conn.execute(select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == 1)).scalar()
+        except SQLAlchemyError as e:
+            self.available, self.lag, self.error = False, None, str(e)
+            return self.available
+
+        if replicated is None:
+            self.lag = None  # The replica has not seen a heartbeat yet
+        elif previous is not None and replicated >= previous:
+            self.lag = 0.0
+        else:
+            self.lag = max((now - replicated).total_seconds(), 0.0)
+        self.available = self.lag is not None and self.lag <= self.max_lag
+        self.error = None
+        return self.available
+
+    def usable(self):
+        if self._checked is None or time.monotonic() - self._checked >= self.interval:
+            if self._lock.acquire(blocking=False):  # Other threads keep the last verdict meanwhile
+                try:
+                    self._checked = time.monotonic()
+                    self.check()
+                finally:
+                    self._lock.release()
+        return self.available
+
+    def status(self):
+        return {"available": self.available, "lag_seconds": self.lag, "error": self.error,
+                "max_lag_seconds": self.max_lag}
+
+
+def _sticky():
+    """True while the client is inside the read-your-writes window of its last write."""
+    try:
+        return time.time() < float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+
+
+def init_read_replica(app, blueprint):
+    """Route ``blueprint``'s GET requests to the ``replica`` bind when ``READ_REPLICA_URL`` is set.
+
+    A client that wrote within ``READ_REPLICA_STICKY_SECONDS`` reads from
+    the primary (tracked with a cookie), as do views marked
+    ``primary_reads`` and every request while the replica is down or behind.
+    Register this after other hooks that write, so they run on the primary.
+    """
+    if BIND not in (app.config.get("SQLALCHEMY_BINDS") or {}):
+        return
+    replica = db.engines[BIND]
+    # SQLite stand-ins (a copy of the primary file) are opened read-only
+    init_sqlite_pragmas(replica, {**(app.config.get("SQLITE_PRAGMAS") or {}), "query_only": 1})
+    monitor = ReplicaMonitor(
+        db.engines[None], replica,
+        interval=app.config.get("READ_REPLICA_CHECK_SECONDS", 2),
+        max_lag=app.config.get("READ_REPLICA_MAX_LAG_SECONDS", 10)
+    )
+    app.extensions["read_replica"] = monitor
+    sticky_seconds = app.config.get("READ_REPLICA_STICKY_SECONDS", 5)
+    # Cached responses built from replica rows live no longer than the lag we tolerate
+    replica_cache_ttl = max(1, int(min(monitor.max_lag, app.config.get("CACHE_TTL") or monitor.max_lag)))
+
+    def route_reads():
+        if request.method not in READ_METHODS:
+            return
+        if _sticky():
+            g.cache_fresh = True  # A cached page may predate the client's own write
+            return
+        if getattr(current_app.view_functions.get(request.endpoint), "primary_reads", False):
+            return
+        if monitor.usable():
+            db.session.info["replica"] = replica
+            g.cache_max_ttl = replica_cache_ttl
+
+    def remember_write(response):
+        if request.method not in READ_METHODS:
+            response.set_cookie(STICKY_COOKIE, f"{time.time() + sticky_seconds:.3f}",
+                                max_age=int(sticky_seconds) + 1, httponly=True, samesite="Lax")
+        return response
+
+    def stop_routing(exc):
+        db.session.info.pop("replica", None)
+
+    app.before_request_funcs.setdefault(blueprint.name, []).append(route_reads)
+    app.after_request_funcs.setdefault(blueprint.name, []).append(remember_write)
+    app.teardown_request_funcs.setdefault(blueprint.name, []).append(stop_routing)
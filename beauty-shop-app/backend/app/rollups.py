@@ -0,0 +1,243 @@
+from collections import defaultdict
+from itertools import chain
+
+from sqlalchemy import delete, func, insert, select
+
+from . import archive, db
+from .dialects import upsert_insert
+from .models import (
+    Product, Service, Booking, ProductSale, Order, OrderItem,
+    ProductSalesRollup, ServiceBookingRollup
+)
+
+# Only daily rows are kept: every reader sums days, and each extra granularity
+# would add one more upsert to every sale, order and booking write
+GRANULARITIES = ("day",)
+
+
+def bucket_start(moment, granularity="day"):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _increment(model, keys, amounts):
+    """Add ``amounts`` to the rollup row identified by ``keys``, creating it if needed.
+
+    Runs on the current session so the rollup change commits or rolls back
+    together with the write that caused it.
+    """
+    insert = upsert_insert()
+    if insert is not None:
+        table = model.__table__
+        stmt = insert(table).values(**keys, **amounts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in amounts}
+        )
+        db.session.execute(stmt)
+        return
+
+    row = model.query.filter_by(**keys).with_for_update().first()
+    if row is None:
+        db.session.add(model(**keys, **amounts))
+        db.session.flush()
+    else:
+        for name, value in amounts.items():
+            setattr(row, name, getattr(row, name) + value)
+
+
+def _record_product(channel, product, moment, units, revenue, unit_cost):
+    for granularity in GRANULARITIES:
+        _increment(ProductSalesRollup, {
+            "granularity": granularity,
+            "bucket_start": bucket_start(moment, granularity),
+            "channel": channel,
+            "product_id": product.id,
+        }, {
+            "units": units,
+            "revenue": revenue,
+            "cost": units * (unit_cost or 0),
+        })
+
+
+# Hooks called by the write handlers in routes.py
+def record_product_sale(sale, product, sign=1):
+    _record_product(
+        "sale", product, sale.sale_date,
+        sign * sale.quantity_sold, sign * sale.quantity_sold * sale.sale_price,
+        sale.cost_price
+    )
+
+
+def record_order(order, items, sign=1):
+    """Apply an order's line items; ``sign=-1`` reverses them on cancellation."""
+    for item in items:
+        _record_product(
+            "order", item.product, order.order_date,
+            sign * item.quantity, sign * item.quantity * item.price,
+            item.cost_price
+        )
+
+
+def record_sales_batch(rows):
+    """Apply many imported sales at once, one upsert per touched bucket."""
+    buckets = defaultdict(lambda: [0, 0, 0])
+    for row in rows:
+        cost_price = row["cost_price"] or 0
+        for granularity in GRANULARITIES:
+            bucket = buckets[(granularity, bucket_start(row["sale_date"], granularity), row["product_id"])]
+            bucket[0] += row["quantity_sold"]
+            bucket[1] += row["quantity_sold"] * row["sale_price"]
+            bucket[2] += row["quantity_sold"] * cost_price
+    for (granularity, start, product_id), (units, revenue, cost) in buckets.items():
+        _increment(ProductSalesRollup, {
+            "granularity": granularity,
+            "bucket_start": start,
+            "channel": "sale",
+            "product_id": product_id,
+        }, {"units": units, "revenue": revenue, "cost": cost})
+
+
+def record_booking(booking, sign=1):
+    """Apply a booking at the price it was booked for, so reversals take back what was added."""
+    for granularity in GRANULARITIES:
+        _increment(ServiceBookingRollup, {
+            "granularity": granularity,
+            "bucket_start": bucket_start(booking.scheduled_time, granularity),
+            "service_id": booking.service_id,
+        }, {
+            "bookings": sign,
+            "revenue": sign * booking.price,
+        })
+
+
+# Read side used by the summary endpoints
+def product_totals(channel, predicates=()):
+    revenue, cost = db.session.query(
+        func.coalesce(func.sum(ProductSalesRollup.revenue), 0),
+        func.coalesce(func.sum(ProductSalesRollup.cost), 0)
+    ).filter(
+        ProductSalesRollup.granularity == "day",
+        ProductSalesRollup.channel == channel,
+        *predicates
+    ).one()
+    return revenue, cost
+
+
+def most_sold_product(channel="sale"):
+    return db.session.query(
+        Product.name, func.sum(ProductSalesRollup.units).label("total_sold")
+    ).join(Product, Product.id == ProductSalesRollup.product_id).filter(
+        ProductSalesRollup.granularity == "day",
+        ProductSalesRollup.channel == channel
+    ).group_by(Product.id).having(func.sum(ProductSalesRollup.units) > 0).order_by(
+        db.desc("total_sold")
+    ).first()
+
+
+def most_booked_service():
+    return db.session.query(
+        Service.name, func.sum(ServiceBookingRollup.bookings).label("total_booked")
+    ).join(Service, Service.id == ServiceBookingRollup.service_id).filter(
+        ServiceBookingRollup.granularity == "day"
+    ).group_by(Service.id).having(func.sum(ServiceBookingRollup.bookings) > 0).order_by(
+        db.desc("total_booked")
+    ).first()
+
+
+def _rebuild(conn, batch_size=1000):
+    """Replace every rollup row on ``conn`` with totals recomputed from raw history, archived rows included."""
+    product_buckets = defaultdict(lambda: [0, 0, 0])
+    service_buckets = defaultdict(lambda: [0, 0])
+
+    def add_product(channel, product_id, moment, units, revenue, cost_price):
+        for granularity in GRANULARITIES:
+            bucket = product_buckets[(granularity, bucket_start(moment, granularity), channel, product_id)]
+            bucket[0] += units
+            bucket[1] += revenue
+            bucket[2] += units * (cost_price or 0)
+
+    def stream(statement):
+        return conn.execution_options(yield_per=batch_size).execute(statement)
+
+    sales = select(
+        ProductSale.product_id, ProductSale.sale_date, ProductSale.quantity_sold,
+        ProductSale.sale_price, ProductSale.cost_price
+    ).join(Product, Product.id == ProductSale.product_id)
+    for product_id, sale_date, quantity, price, cost_price in stream(sales):
+        add_product("sale", product_id, sale_date, quantity, quantity * price, cost_price)
+    # Archived rows cannot join the live catalog; drop deleted ids as the join does. Rows archived
+    # before sales stored their cost have none, and take the product's current cost as the migration did.
+    cost_prices = dict(conn.execute(select(Product.id, Product.cost_price)).all())
+    archived_sales = archive.archived_product_sales.c
+    for product_id, sale_date, quantity, price, cost_price in archive.rows(select(
+        archived_sales.product_id, archived_sales.sale_date, archived_sales.quantity_sold, archived_sales.sale_price,
+        archived_sales.cost_price
+    ), batch_size):
+        if product_id in cost_prices:
+            add_product("sale", product_id, sale_date, quantity, quantity * price,
+                        cost_prices[product_id] if cost_price is None else cost_price)
+
+    order_items = select(
+        OrderItem.product_id, Order.order_date, OrderItem.quantity,
+        OrderItem.price, OrderItem.cost_price
+    ).join(Order, Order.id == OrderItem.order_id).where(Order.status != "cancelled")
+    archived_orders, archived_items = archive.archived_orders.c, archive.archived_order_items.c
+    archived_order_items = archive.rows(select(
+        archived_items.product_id, archived_orders.order_date, archived_items.quantity,
+        archived_items.price, archived_items.cost_price
+    ).join_from(archive.archived_order_items, archive.archived_orders,
+                archived_orders.id == archived_items.order_id).where(archived_orders.status != "cancelled"), batch_size)
+    for product_id, order_date, quantity, price, cost_price in chain(stream(order_items), archived_order_items):
+        add_product("order", product_id, order_date, quantity, quantity * price, cost_price)
+
+    bookings = select(
+        Booking.service_id, Booking.scheduled_time, Booking.price
+    ).join(Service, Service.id == Booking.service_id).where(Booking.status != "cancelled")
+    # Rows archived before bookings stored their price take the service's current one
+    service_prices = dict(conn.execute(select(Service.id, Service.price)).all())
+    archived_bookings = archive.archived_bookings.c
+    archived_booking_rows = (
+        (service_id, scheduled_time, service_prices[service_id] if price is None else price)
+        for service_id, scheduled_time, price in archive.rows(select(
+            archived_bookings.service_id, archived_bookings.scheduled_time, archived_bookings.price
+        ).where(archived_bookings.status != "cancelled"), batch_size)
+        if service_id in service_prices
+    )
+    for service_id, scheduled_time, price in chain(stream(bookings), archived_booking_rows):
+        for granularity in GRANULARITIES:
+            bucket = service_buckets[(granularity, bucket_start(scheduled_time, granularity), service_id)]
+            bucket[0] += 1
+            bucket[1] += price
+
+    conn.execute(delete(ProductSalesRollup))
+    conn.execute(delete(ServiceBookingRollup))
+    if product_buckets:
+        conn.execute(insert(ProductSalesRollup), [
+            {"granularity": g, "bucket_start": b, "channel": c, "product_id": p,
+             "units": units, "revenue": revenue, "cost": cost}
+            for (g, b, c, p), (units, revenue, cost) in product_buckets.items()
+        ])
+    if service_buckets:
+        conn.execute(insert(ServiceBookingRollup), [
+            {"granularity": g, "bucket_start": b, "service_id": s,
+             "bookings": count, "revenue": revenue}
+            for (g, b, s), (count, revenue) in service_buckets.items()
+        ])
+    return len(product_buckets), len(service_buckets)
+
+
+def rebuild_rollups(batch_size=1000):
+    """Recompute every rollup row from raw sales, order and booking history, archived rows included."""
+    counts = _rebuild(db.session.connection(bind_arguments={"bind": db.engine}), batch_size)
+    db.session.commit()
+    return counts
+
+
+def backfill_rollups(conn):
+    """Migration step: fill the rollups from the history written before they existed.
+
+    Databases that gained the rollup tables by upgrade got them empty, and
+    their summaries read zero for everything sold or booked before then.
+    A full rebuild is exact whatever the tables held, so it simply runs once.
+    """
+    _rebuild(conn)
@@ -1,11 +1,33 @@
-from flask import request, jsonify
-from . import db
-from .models import Product, Service, Booking, ProductSale, Customer, Order, OrderItem
+from flask import request, jsonify, current_app, g
+from . import db, passwords
+from .auth import auth, login_required
+from .idempotency import idempotent
+from .replicas import primary_reads
+from .models import Product, Service, Booking, ProductSale, Customer, Order, OrderItem, InventoryMovement, money, utc_datetime
+from .cache import cache
+from .loading import with_profile
+from .fields import project
+from .streaming import list_response
+from . import (
+    rollups, analytics, inventory, bulk, availability, search, batch, recommendations, replenishment, events,
+    archive
+)
+from .pagination import (
+    QueryArgError, parse_limit,
+    date_range_filter, number_range_filter, prefix_filter, equals_filter
+)
 from flask import Blueprint
 from datetime import datetime, timedelta 
+from sqlalchemy import insert
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
+
+def _chunk_size():
+    size = request.args.get("chunk_size", bulk.DEFAULT_CHUNK_SIZE, type=int)
+    return max(1, min(size, 10000))
+
+
 # CREATE a product
 
 @bp.route("/products", methods=["POST"])
@@ -27,13 +49,19 @@ def create_product():
         product = Product(
             name=data["name"],
             description=data.get("description"),
-            price=float(data["price"]),
+            price=money(data["price"]),
+            cost_price=money(data.get("cost_price") or 0),
             quantity=int(data["quantity"]),
             expiration_date=expiration_date
         )
 
         db.session.add(product)
+        db.session.flush()
+        inventory.open_stock([product.id])
+        events.emit("product.created", f"product:{product.id}", product_id=product.id, name=product.name,
+                    quantity=product.quantity)
         db.session.commit()
+        cache.invalidate("products", [product.id])
         return jsonify(product.to_dict()), 201
 
     except Exception as e:
@@ -43,15 +71,25 @@ def create_product():
 
 # READ all products
 @bp.route("/products", methods=["GET"])
+@cache.cached("products")
 def get_products():
     try:
-        products = Product.query.all()
-        return jsonify([p.to_dict() for p in products])
+        fields = project("products")
+        query = fields.apply(Product.query).filter(
+            *prefix_filter(Product.name),
+            *number_range_filter(Product.price)
+        )
+        if request.args.get("in_stock", "").lower() in ("1", "true", "yes"):
+            query = query.filter(Product.quantity > 0)
+        return list_response(query, Product.id, Product.id, serialize=fields.serialize)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # READ a single product
 @bp.route("/products/<int:id>", methods=["GET"])
+@cache.cached("products", id_arg="id")
 def get_product(id):
     try:
         product = Product.query.get_or_404(id)
@@ -59,6 +97,58 @@ def get_product(id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Bulk import products from a CSV or NDJSON body (mode=upsert replaces rows matching id)
+@bp.route("/products/import", methods=["POST"])
+def import_products():
+    report = bulk.import_records(
+        Product, bulk.iter_records(request.stream, request.content_type), bulk.product_row,
+        upsert=request.args.get("mode") == "upsert", chunk_size=_chunk_size(),
+        after_chunk=lambda rows: inventory.restate([row["id"] for row in rows if "id" in row], "import")
+    )
+    events.emit("product.imported", "product:import", processed=report.processed, error_count=report.error_count)
+    db.session.commit()
+    cache.invalidate_all("products")
+    return jsonify(report.to_dict())
+
+# Live stock of a product next to its stored quantity and its ledger total
+@bp.route("/products/<int:id>/stock", methods=["GET"])
+@primary_reads
+def get_product_stock(id):
+    product = Product.query.get_or_404(id)
+    return jsonify(inventory.stock_report(product))
+
+# Products most often bought together with a product (precomputed, see app/recommendations.py)
+@bp.route("/products/<int:id>/related", methods=["GET"])
+def get_related_products(id):
+    top_k = current_app.config.get("RELATED_PRODUCTS_TOP_K", 10)
+    limit = max(1, min(request.args.get("limit", top_k, type=int), top_k))
+    rows = recommendations.related(id, limit)
+    if not rows and db.session.get(Product, id) is None:
+        return jsonify({"error": "Product not found"}), 404
+    return jsonify({
+        "product_id": id,
+        "items": [{"id": related_id, "name": name, "price": price, "orders": orders}
+                  for related_id, name, price, orders in rows]
+    })
+
+# Stock movements of a product, newest first
+@bp.route("/products/<int:id>/movements", methods=["GET"])
+def get_product_movements(id):
+    try:
+        query = InventoryMovement.query.filter(
+            InventoryMovement.product_id == id,
+            *equals_filter(InventoryMovement.reason, "reason"),
+            *date_range_filter(InventoryMovement.created_at)
+        )
+        return list_response(query, InventoryMovement.id, InventoryMovement.id, descending=True)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Stream all products as CSV (default) or NDJSON
+@bp.route("/products/export", methods=["GET"])
+def export_products():
+    return bulk.export_response(Product, request.args.get("format", "csv"))
+
 # UPDATE a product
 @bp.route("/products/<int:id>", methods=["PUT"])
 def update_product(id):
@@ -67,7 +157,11 @@ def update_product(id):
 
     product.name = data.get("name", product.name)
     product.description = data.get("description", product.description)
-    product.price = data.get("price", product.price)
+    try:
+        product.price = money(data.get("price", product.price))
+        product.cost_price = money(data.get("cost_price", product.cost_price))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     product.quantity = data.get("quantity", product.quantity)
 
     # Convert expiration_date to a Python date object if provided
@@ -83,7 +177,13 @@ def update_product(id):
     product.expiration_date = expiration_date
 
     try:
+        # A quantity set by hand becomes an "adjust" movement against live stock
+        if "quantity" in data:
+            db.session.flush()
+            inventory.restate([id], "adjust")
+        events.emit("product.updated", f"product:{id}", product_id=id, fields=sorted(data))
         db.session.commit()
+        cache.invalidate("products", [id])
         return jsonify(product.to_dict())
     except Exception as e:
         db.session.rollback()
@@ -95,8 +195,11 @@ def update_product(id):
 def delete_product(id):
     product = Product.query.get_or_404(id)
     try:
+        inventory.forget(id)
         db.session.delete(product)
+        events.emit("product.deleted", f"product:{id}", product_id=id)
         db.session.commit()
+        cache.invalidate("products", [id])
         return jsonify({"message": "Product deleted successfully"})
     except Exception as e:
         db.session.rollback()
@@ -113,11 +216,12 @@ def create_service():
         service = Service(
             name=data["name"],
             description=data.get("description"),
-            price=float(data["price"]),
-            duration_minutes=int(data["duration_minutes"]) if data.get("duration_minutes") else None
+            price=money(data["price"]),
+            duration_minutes=availability.duration_minutes(data.get("duration_minutes"))
         )
         db.session.add(service)
         db.session.commit()
+        cache.invalidate("services", [service.id])
         return jsonify(service.to_dict()), 201
     except Exception as e:
         db.session.rollback()
@@ -125,15 +229,23 @@ def create_service():
 
 # GET all services
 @bp.route("/services", methods=["GET"])
+@cache.cached("services")
 def get_services():
     try:
-        services = Service.query.all()
-        return jsonify([s.to_dict() for s in services])
+        fields = project("services")
+        query = fields.apply(Service.query).filter(
+            *prefix_filter(Service.name),
+            *number_range_filter(Service.price)
+        )
+        return list_response(query, Service.id, Service.id, serialize=fields.serialize)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # GET one service
 @bp.route("/services/<int:id>", methods=["GET"])
+@cache.cached("services", id_arg="id")
 def get_service(id):
     try:
         service = Service.query.get_or_404(id)
@@ -141,6 +253,21 @@ def get_service(id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Bulk import services from a CSV or NDJSON body (mode=upsert replaces rows matching id)
+@bp.route("/services/import", methods=["POST"])
+def import_services():
+    report = bulk.import_records(
+        Service, bulk.iter_records(request.stream, request.content_type), bulk.service_row,
+        upsert=request.args.get("mode") == "upsert", chunk_size=_chunk_size()
+    )
+    cache.invalidate_all("services")
+    return jsonify(report.to_dict())
+
+# Stream all services as CSV (default) or NDJSON
+@bp.route("/services/export", methods=["GET"])
+def export_services():
+    return bulk.export_response(Service, request.args.get("format", "csv"))
+
 # UPDATE service
 @bp.route("/services/<int:id>", methods=["PUT"])
 def update_service(id):
@@ -149,9 +276,10 @@ def update_service(id):
     try:
         service.name = data.get("name", service.name)
         service.description = data.get("description", service.description)
-        service.price = float(data.get("price", service.price))
-        service.duration_minutes = int(data.get("duration_minutes", service.duration_minutes))
+        service.price = money(data.get("price", service.price))
+        service.duration_minutes = availability.duration_minutes(data.get("duration_minutes", service.duration_minutes))
         db.session.commit()
+        cache.invalidate("services", [id])
         return jsonify(service.to_dict())
     except Exception as e:
         db.session.rollback()
@@ -164,44 +292,139 @@ def delete_service(id):
         service = Service.query.get_or_404(id)
         db.session.delete(service)
         db.session.commit()
+        cache.invalidate("services", [id])
         return jsonify({"message": "Service deleted successfully"})
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
+# SEARCH products and services by name/description (ranked, last word matches as a prefix)
+@bp.route("/search", methods=["GET"])
+def search_catalog():
+    q = request.args.get("q", "").strip()
+    kind = request.args.get("type", "all")
+    if not q:
+        return jsonify({"error": "Missing 'q' parameter"}), 400
+    if kind not in ("products", "services", "all"):
+        return jsonify({"error": "'type' must be products, services or all"}), 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    prefix = request.args.get("prefix", "true").lower() not in ("0", "false", "no")
+
+    try:
+        results = {}
+        if kind in ("products", "all"):
+            predicates = number_range_filter(Product.price)
+            if request.args.get("in_stock", "").lower() in ("1", "true", "yes"):
+                predicates.append(Product.quantity > 0)
+            products = search.search("products", q, predicates, limit, prefix)
+            results["products"] = [product.to_dict() for product in products]
+        if kind in ("services", "all"):
+            services = search.search("services", q, number_range_filter(Service.price), limit, prefix)
+            results["services"] = [service.to_dict() for service in services]
+        return jsonify(results)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 # CREATE a booking
 @bp.route("/bookings", methods=["POST"])
 def create_booking():
     data = request.get_json()
-    if not data or "service_id" not in data or "customer_name" not in data or "scheduled_time" not in data:
+    if not data or "service_id" not in data or "customer_id" not in data or "scheduled_time" not in data:
         return jsonify({"error": "Missing required fields"}), 400
 
+    service = Service.query.get(data["service_id"])
+    if not service:
+        return jsonify({"error": "Service not found"}), 404
+
     try:
         booking = Booking(
-            service_id=data["service_id"],
-            customer_name=data["customer_name"],
-            scheduled_time=datetime.fromisoformat(data["scheduled_time"]),
+            service_id=service.id,
+            customer_id=data["customer_id"],
+            scheduled_time=utc_datetime(data["scheduled_time"]),
+            price=service.price,
             status=data.get("status", "scheduled"),
             payment_status=data.get("payment_status", "unpaid")
         )
+        availability.reserve(booking, service)
         db.session.add(booking)
+        if booking.status != "cancelled":
+            rollups.record_booking(booking)
+        db.session.flush()
+        events.emit("booking.created", f"booking:{booking.id}", booking_id=booking.id, service_id=service.id,
+                    customer_id=booking.customer_id, scheduled_time=booking.scheduled_time, status=booking.status)
         db.session.commit()
         return jsonify(booking.to_dict()), 201
+    except availability.BookingConflict as e:
+        db.session.rollback()
+        return _conflict_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
+def _conflict_response(conflict):
+    return jsonify({
+        "error": str(conflict),
+        "conflicts": [
+            {"id": b.id, "scheduled_time": b.scheduled_time.isoformat(), "end_time": b.end_time.isoformat()}
+            for b in conflict.conflicts
+        ]
+    }), 409
+
+# GET free slots for a service
+@bp.route("/services/<int:id>/availability", methods=["GET"])
+def get_service_availability(id):
+    service = Service.query.get_or_404(id)
+    try:
+        start = utc_datetime(request.args["from"])
+        end = utc_datetime(request.args["to"])
+    except KeyError:
+        return jsonify({"error": "Both 'from' and 'to' are required"}), 400
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use ISO 8601."}), 400
+    if end <= start or end - start > availability.MAX_RANGE:
+        return jsonify({"error": "'to' must be after 'from' and within 62 days"}), 400
+
+    duration = availability.booking_duration(service)
+    step = request.args.get("step", str(int(duration.total_seconds() // 60) or 1))
+    if not step.isdigit() or int(step) < 1:
+        return jsonify({"error": "'step' must be a positive whole number of minutes"}), 400
+    step = timedelta(minutes=int(step))
+    free = availability.free_intervals(
+        service.id, start, end,
+        current_app.config.get("BOOKING_OPEN_HOUR", 0),
+        current_app.config.get("BOOKING_CLOSE_HOUR", 24)
+    )
+    slots = availability.available_slots(free, duration, step, availability.MAX_SLOTS + 1)
+    return jsonify({
+        "service_id": service.id,
+        "duration_minutes": int(duration.total_seconds() // 60),
+        "free": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in free],
+        "slots": [slot.isoformat() for slot in slots[:availability.MAX_SLOTS]],
+        "truncated": len(slots) > availability.MAX_SLOTS
+    })
+
 # GET all bookings
 @bp.route("/bookings", methods=["GET"])
 def get_bookings():
-    bookings = Booking.query.all()
-    return jsonify([b.to_dict() for b in bookings])
+    try:
+        fields = project("bookings")
+        query = fields.apply(Booking.query).filter(
+            *equals_filter(Booking.status, "status"),
+            *equals_filter(Booking.payment_status, "payment_status"),
+            *equals_filter(Booking.service_id, "service_id", int),
+            *equals_filter(Booking.customer_id, "customer_id", int),
+            *date_range_filter(Booking.scheduled_time)
+        )
+        return list_response(query, Booking.id, Booking.id, serialize=fields.serialize)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
 
 # GET one booking
 @bp.route("/bookings/<int:id>", methods=["GET"])
 def get_booking(id):
-    booking = Booking.query.get_or_404(id)
+    booking = with_profile(Booking.query, "booking").get_or_404(id)
     return jsonify(booking.to_dict())
 
 # UPDATE booking
@@ -209,10 +432,24 @@ def get_booking(id):
 def update_booking(id):
     booking = Booking.query.get_or_404(id)
     data = request.get_json()
-    booking.customer_name = data.get("customer_name", booking.customer_name)
-    booking.scheduled_time = datetime.fromisoformat(data.get("scheduled_time")) if data.get("scheduled_time") else booking.scheduled_time
+    try:
+        scheduled_time = utc_datetime(data["scheduled_time"]) if data.get("scheduled_time") else booking.scheduled_time
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use ISO 8601."}), 400
+    # Back out the old slot from the rollups and re-add the updated one, both at the booked price
+    if booking.status != "cancelled":
+        rollups.record_booking(booking, sign=-1)
+    booking.customer_id = data.get("customer_id", booking.customer_id)
+    booking.scheduled_time = scheduled_time
     booking.status = data.get("status", booking.status)
     booking.payment_status = data.get("payment_status", booking.payment_status)
+    try:
+        availability.reserve(booking, booking.service)
+    except availability.BookingConflict as e:
+        db.session.rollback()
+        return _conflict_response(e)
+    if booking.status != "cancelled":
+        rollups.record_booking(booking)
     db.session.commit()
     return jsonify(booking.to_dict())
 
@@ -220,13 +457,16 @@ def update_booking(id):
 @bp.route("/bookings/<int:id>", methods=["DELETE"])
 def delete_booking(id):
     booking = Booking.query.get_or_404(id)
+    if booking.status != "cancelled":
+        rollups.record_booking(booking, sign=-1)
     db.session.delete(booking)
     db.session.commit()
     return jsonify({"message": "Booking deleted successfully"})
 
 
-# Create a sale
+# Create a sale (send an Idempotency-Key header to make retries safe)
 @bp.route("/sales", methods=["POST"])
+@idempotent
 def create_product_sale():
     data = request.get_json()
     if not data or "product_id" not in data or "quantity_sold" not in data or "sale_price" not in data:
@@ -236,32 +476,83 @@ def create_product_sale():
     if not product:
         return jsonify({"error": "Product not found"}), 404
 
-    # Optionally: reduce quantity from stock (optional)
-    if product.quantity < data["quantity_sold"]:
+    # Take the stock from one shard with a conditional UPDATE so concurrent sales cannot oversell
+    try:
+        inventory.decrement_stock(product.id, data["quantity_sold"])
+    except inventory.OutOfStock:
+        db.session.rollback()
         return jsonify({"error": "Not enough stock"}), 400
-    product.quantity -= data["quantity_sold"]
 
     sale = ProductSale(
         product_id=data["product_id"],
         quantity_sold=data["quantity_sold"],
-        sale_price=data["sale_price"]
+        sale_price=money(data["sale_price"]),
+        cost_price=product.cost_price
     )
     db.session.add(sale)
+    db.session.flush()  # Populate sale_date
+    inventory.record_movements("sale", f"sale:{sale.id}", {product.id: -int(data["quantity_sold"])})
+    rollups.record_product_sale(sale, product)
+    events.emit("sale.created", f"sale:{sale.id}", sale_id=sale.id, product_id=product.id,
+                quantity_sold=sale.quantity_sold, sale_price=sale.sale_price)
     db.session.commit()
     return jsonify(sale.to_dict()), 201
 
 # List all sales
 @bp.route("/sales", methods=["GET"])
 def get_product_sales():
-    sales = ProductSale.query.all()
-    return jsonify([s.to_dict() for s in sales])
+    try:
+        fields = project("sales")
+        query = fields.apply(ProductSale.query).filter(
+            *equals_filter(ProductSale.product_id, "product_id", int),
+            *date_range_filter(ProductSale.sale_date),
+            *number_range_filter(ProductSale.sale_price)
+        )
+        return list_response(query, ProductSale.sale_date, ProductSale.id, descending=True,
+                             serialize=fields.serialize)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Bulk import historical sales. Stock is not adjusted, but rollups are.
+@bp.route("/sales/import", methods=["POST"])
+def import_sales():
+    products = {}
+
+    def check_products(rows):
+        wanted = {row["product_id"] for _, row in rows} - products.keys()
+        if wanted:
+            products.update(inventory.load_products(wanted))
+        kept = [(line, row) for line, row in rows if row["product_id"] in products]
+        for _, row in kept:
+            if row["cost_price"] is None:
+                row["cost_price"] = products[row["product_id"]].cost_price
+        errors = [
+            (line, f"Product {row['product_id']} not found")
+            for line, row in rows if row["product_id"] not in products
+        ]
+        return kept, errors
+
+    report = bulk.import_records(
+        ProductSale, bulk.iter_records(request.stream, request.content_type), bulk.sale_row,
+        chunk_size=_chunk_size(), prepare_chunk=check_products,
+        after_chunk=rollups.record_sales_batch
+    )
+    return jsonify(report.to_dict())
+
+# Stream all sales as CSV (default) or NDJSON
+@bp.route("/sales/export", methods=["GET"])
+def export_sales():
+    return bulk.export_response(ProductSale, request.args.get("format", "csv"))
 
 # Get profit summary
 @bp.route("/sales/summary", methods=["GET"])
 def get_sales_summary():
-    sales = ProductSale.query.all()
-    total_revenue = sum(s.quantity_sold * s.sale_price for s in sales)
-    total_cost = sum(s.quantity_sold * s.product.cost_price for s in sales)
+    try:
+        predicates = date_range_filter(rollups.ProductSalesRollup.bucket_start)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
+    total_revenue, total_cost = rollups.product_totals("sale", predicates)
     profit = total_revenue - total_cost
 
     return jsonify({
@@ -270,56 +561,84 @@ def get_sales_summary():
         "net_profit": profit
     })
 
+# Run several API calls in one round trip; atomic=true runs every write in one transaction
+@bp.route("/batch", methods=["POST"])
+def run_batch():
+    data = request.get_json(silent=True) or {}
+    try:
+        results, committed = batch.run(data.get("operations"), atomic=bool(data.get("atomic")))
+    except batch.BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    status = 200 if committed else results[-1]["status"]
+    return jsonify({"results": results, "committed": committed}), status
+
+# Response cache counters
+@bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(cache.stats())
+
 # Alert Api
 @bp.route("/alerts/products", methods=["GET"])
 def product_alerts():
-    low_stock_threshold = 5
-    expiration_threshold = timedelta(days=7)
-    slow_sales_threshold_days = 14
+    low_stock_threshold = request.args.get("threshold", 5, type=int)
+    expiration_threshold = timedelta(days=request.args.get("days", 7, type=int))
+    slow_sales_threshold_days = request.args.get("slow_days", 14, type=int)
     today = datetime.utcnow()
 
-    low_stock = Product.query.filter(Product.quantity <= low_stock_threshold).all()
-    near_expiry = Product.query.filter(Product.expiry_date != None).filter(
-        Product.expiry_date <= (today + expiration_threshold).date()
+    low_stock = inventory.low_stock(low_stock_threshold)
+    near_expiry = Product.query.filter(Product.expiration_date != None).filter(
+        Product.expiration_date <= (today + expiration_threshold).date()
     ).all()
 
-    # Products not sold in the last 14 days
-    slow_selling_products = []
-    all_products = Product.query.all()
-    for product in all_products:
-        recent_sale = ProductSale.query.filter_by(product_id=product.id).order_by(ProductSale.sale_date.desc()).first()
-        if not recent_sale or (today - recent_sale.sale_date).days >= slow_sales_threshold_days:
-            slow_selling_products.append(product)
+    # Products with no sale in the last `slow_days` days, in one grouped query
+    last_sold = db.session.query(
+        ProductSale.product_id, db.func.max(ProductSale.sale_date).label("last_sold_at")
+    ).group_by(ProductSale.product_id).subquery()
+    slow_cutoff = today - timedelta(days=slow_sales_threshold_days)
+    slow_selling_products = Product.query.outerjoin(
+        last_sold, last_sold.c.product_id == Product.id
+    ).filter(
+        db.or_(last_sold.c.last_sold_at == None, last_sold.c.last_sold_at <= slow_cutoff)
+    ).all()
 
     return jsonify({
-        "low_stock": [p.to_dict() for p in low_stock],
+        "low_stock": low_stock,
         "near_expiry": [p.to_dict() for p in near_expiry],
         "slow_selling": [p.to_dict() for p in slow_selling_products]
     })
 
+# Live feed of committed changes for the admin dashboard, as Server-Sent Events
+@bp.route("/admin/events", methods=["GET"])
+@primary_reads
+def admin_events():
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    kinds = request.args.get("kinds")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an integer"}), 400
+    return events.stream_response(last_event_id, set(kinds.split(",")) if kinds else None)
+
 # Summary API endpoints
 @bp.route("/admin/summary", methods=["GET"])
 def admin_summary():
     total_products = Product.query.count()
     total_services = Service.query.count()
-    total_bookings = Booking.query.count()
-    total_sales = ProductSale.query.count()
+    # Archived history still counts; the archive keeps its totals in one small table
+    archived = archive.stats()
+    total_bookings = Booking.query.count() + archive.row_count(archived, archive.archived_bookings)
+    total_sales = ProductSale.query.count() + archive.row_count(archived, archive.archived_product_sales)
 
-    # Total revenue from product sales
-    sales = ProductSale.query.all()
-    total_revenue = sum(s.quantity_sold * s.sale_price for s in sales)
-    total_cost = sum(s.quantity_sold * s.product.cost_price for s in sales)
+    # Revenue and popularity come from the daily rollups, not raw rows
+    total_revenue, total_cost = rollups.product_totals("sale")
     net_profit = total_revenue - total_cost
+    order_revenue, order_cost = rollups.product_totals("order")
 
-    # Most sold product
-    popular_product = db.session.query(
-        Product.name, db.func.sum(ProductSale.quantity_sold).label("total_sold")
-    ).join(ProductSale).group_by(Product.id).order_by(db.desc("total_sold")).first()
-
-    # Most booked service
-    popular_service = db.session.query(
-        Service.name, db.func.count(Booking.id).label("total_booked")
-    ).join(Booking).group_by(Service.id).order_by(db.desc("total_booked")).first()
+    popular_product = rollups.most_sold_product()
+    popular_service = rollups.most_booked_service()
 
     return jsonify({
         "totals": {
@@ -333,6 +652,11 @@ def admin_summary():
             "total_cost": total_cost,
             "net_profit": net_profit
         },
+        "order_revenue": {
+            "total_revenue": order_revenue,
+            "total_cost": order_cost,
+            "net_profit": order_revenue - order_cost
+        },
         "popular_product": {
             "name": popular_product[0] if popular_product else None,
             "sold": popular_product[1] if popular_product else 0
@@ -364,69 +688,140 @@ def register():
 # Login
 @bp.route("/auth/login", methods=["POST"])
 def login():
-    data = request.get_json()
+    data = request.get_json() or {}
     customer = Customer.query.filter_by(email=data.get("email")).first()
-    if not customer or not customer.check_password(data.get("password")):
+    if not customer:
+        # Pay the same KDF cost as a known email, so timing does not reveal who is registered
+        passwords.verify_password(passwords.dummy_hash(), data.get("password") or "")
+        return jsonify({"error": "Invalid email or password"}), 401
+    if not customer.check_password(data.get("password")):
         return jsonify({"error": "Invalid email or password"}), 401
 
+    # Upgrade legacy or lower-cost hashes while we have the plain password
+    if passwords.needs_rehash(customer.password_hash):
+        customer.set_password(data["password"])
+        db.session.commit()
+
+    token, expires_in = auth.issue(customer)
     return jsonify({
         "message": "Login successful",
+        "access_token": token,
+        "token_type": "Bearer",
+        "expires_in": expires_in,
         "customer": customer.to_dict()
     }), 200
 
-# Order
+# Logout: revoke the bearer token used for this request
+@bp.route("/auth/logout", methods=["POST"])
+@login_required
+def logout():
+    auth.revoke(g.token_claims)
+    db.session.commit()
+    return jsonify({"message": "Logged out"})
+
+# Current customer, resolved from the token without a database lookup when cached
+@bp.route("/auth/me", methods=["GET"])
+@login_required
+def current_customer():
+    return jsonify(g.customer)
+
+# Order (send an Idempotency-Key header to make retries safe)
 @bp.route("/orders", methods=["POST"])
+@login_required
+@idempotent
 def place_order():
     data = request.get_json()
-    customer_id = data.get("customer_id")
+    customer_id = g.customer_id
     items = data.get("items")  # [{product_id, quantity}]
 
-    if not customer_id or not items:
+    # customer_id in the body is optional now, but must match the token if sent
+    if data.get("customer_id") not in (None, customer_id):
+        return jsonify({"error": "Cannot place orders for another customer"}), 403
+    if not items:
         return jsonify({"error": "Missing customer or items"}), 400
 
-    total = 0
-    order_items = []
-
-    for item in items:
-        product = Product.query.get(item["product_id"])
-        if not product or product.quantity < item["quantity"]:
-            return jsonify({"error": f"Product {item['product_id']} not available in required quantity"}), 400
+    # Merge repeated lines for the same product into one quantity
+    quantities = {}
+    try:
+        for item in items:
+            quantity = int(item["quantity"])
+            if quantity <= 0:
+                raise ValueError
+            product_id = int(item["product_id"])
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Each item needs a product_id and a positive quantity"}), 400
+
+    products = inventory.load_products(quantities)
+    missing = [product_id for product_id in quantities if product_id not in products]
+    if missing:
+        return jsonify({"error": f"Product {missing[0]} not available in required quantity"}), 400
 
-        price = product.sale_price
-        total += price * item["quantity"]
+    try:
+        # Conditional decrements in id order; any shortfall aborts the whole order
+        for product_id in sorted(quantities):
+            inventory.decrement_stock(product_id, quantities[product_id])
+    except inventory.OutOfStock as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
 
-        order_items.append({
-            "product": product,
-            "quantity": item["quantity"],
-            "price": price
-        })
+    order_items = [
+        {
+            "product_id": product_id,
+            "quantity": quantity,
+            "price": products[product_id].price,
+            "cost_price": products[product_id].cost_price
+        }
+        for product_id, quantity in quantities.items()
+    ]
+    total = sum(item["price"] * item["quantity"] for item in order_items)
 
     # Create Order
     order = Order(customer_id=customer_id, total_price=total)
     db.session.add(order)
     db.session.flush()  # Get order.id
 
+    # Insert all line items as one executemany batch
     for item in order_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item["product"].id,
-            quantity=item["quantity"],
-            price=item["price"]
-        )
-        db.session.add(order_item)
-
-        # Update product stock
-        item["product"].quantity -= item["quantity"]
-
+        item["order_id"] = order.id
+    db.session.execute(insert(OrderItem), order_items)
+    inventory.record_movements("order", f"order:{order.id}",
+                               {product_id: -quantity for product_id, quantity in quantities.items()})
+
+    rollups.record_order(order, order.items)
+    recommendations.record_order(quantities)
+    events.emit("order.created", f"order:{order.id}", order_id=order.id, customer_id=customer_id,
+                total_price=order.total_price, items=len(order_items))
+
+    # Serialize before commit: the products are still loaded in the session
+    payload = order.to_dict()
     db.session.commit()
-    return jsonify(order.to_dict()), 201
+    return jsonify(payload), 201
 
 
 # Get Order History (by Customer)
 @bp.route("/orders/customer/<int:customer_id>", methods=["GET"])
+@login_required
 def get_orders_by_customer(customer_id):
-    orders = Order.query.filter_by(customer_id=customer_id).order_by(Order.order_date.desc()).all()
-    return jsonify([order.to_dict() for order in orders])
+    if customer_id != g.customer_id:
+        return jsonify({"error": "Cannot view another customer's orders"}), 403
+    try:
+        fields = project("orders")
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+    orders = fields.apply(Order.query).filter_by(customer_id=customer_id).order_by(Order.order_date.desc()).all()
+    return jsonify([fields.serialize(order) for order in orders])
+
+def _restock(order):
+    """Return a cancelled order's items to stock, in product id order, and back out its rollups and pairs."""
+    quantities = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    for product_id in sorted(quantities):
+        inventory.increment_stock(product_id, quantities[product_id])
+    inventory.record_movements("cancel", f"order:{order.id}", quantities)
+    rollups.record_order(order, order.items, sign=-1)
+    recommendations.record_order(quantities, sign=-1)
 
 # Admin Order Status Update
 @bp.route("/orders/<int:order_id>/status", methods=["PUT"])
@@ -437,7 +832,7 @@ def update_order_status(order_id):
     if new_status not in ["pending", "completed", "cancelled"]:
         return jsonify({"error": "Invalid status"}), 400
 
-    order = Order.query.get(order_id)
+    order = with_profile(Order.query, "order_update").get(order_id)
     if not order:
         return jsonify({"error": "Order not found"}), 404
 
@@ -446,27 +841,36 @@ def update_order_status(order_id):
 
     # Only restock if order is being cancelled
     if new_status == "cancelled":
-        for item in order.items:
-            product = Product.query.get(item.product_id)
-            if product:
-                product.quantity += item.quantity
+        _restock(order)
 
     order.status = new_status
+    events.emit("order.updated", f"order:{order.id}", order_id=order.id, status=new_status)
+    payload = order.to_dict()
     db.session.commit()
-    return jsonify(order.to_dict())
+    return jsonify(payload)
 
 
 # Get All Orders (for admin view)
 @bp.route("/orders", methods=["GET"])
 def get_all_orders():
-    orders = Order.query.order_by(Order.order_date.desc()).all()
-    return jsonify([order.to_dict() for order in orders])
+    try:
+        fields = project("orders")
+        query = fields.apply(Order.query).filter(
+            *equals_filter(Order.status, "status"),
+            *equals_filter(Order.customer_id, "customer_id", int),
+            *date_range_filter(Order.order_date),
+            *number_range_filter(Order.total_price)
+        )
+        return list_response(query, Order.order_date, Order.id, descending=True,
+                             serialize=fields.serialize)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 # Cancel Order with time limit
 @bp.route("/orders/<int:order_id>/cancel", methods=["PUT"])
 def cancel_order(order_id):
-    order = Order.query.get(order_id)
+    order = with_profile(Order.query, "order_update").get(order_id)
     if not order:
         return jsonify({"error": "Order not found"}), 404
 
@@ -479,23 +883,43 @@ def cancel_order(order_id):
     if datetime.utcnow() > time_limit:
         return jsonify({"error": "Cancellation window has expired"}), 403
 
-    # Restock products
-    for item in order.items:
-        product = Product.query.get(item.product_id)
-        if product:
-            product.quantity += item.quantity
+    _restock(order)
 
     order.status = "cancelled"
+    events.emit("order.updated", f"order:{order.id}", order_id=order.id, status="cancelled")
+    payload = order.to_dict()
     db.session.commit()
-    return jsonify({"message": "Order cancelled and items restocked", "order": order.to_dict()})
+    return jsonify({"message": "Order cancelled and items restocked", "order": payload})
 
 
 # Low Stock Alert
 @bp.route("/alerts/low-stock", methods=["GET"])
 def low_stock_alerts():
     threshold = request.args.get("threshold", 5, type=int)  # Default threshold is 5
-    low_stock_products = Product.query.filter(Product.quantity <= threshold).all()
-    return jsonify([product.to_dict() for product in low_stock_products])
+    return jsonify(inventory.low_stock(threshold))
+
+# Products at or below their demand-based reorder point, fewest days of cover first
+@bp.route("/alerts/reorder", methods=["GET"])
+def reorder_alerts():
+    config = current_app.config
+    lead_days = request.args.get("lead_days", config.get("REORDER_LEAD_TIME_DAYS", 7), type=float)
+    review_days = request.args.get("review_days", config.get("REORDER_REVIEW_DAYS", 14), type=float)
+    z = request.args.get("z", config.get("REORDER_SERVICE_Z", 1.65), type=float)
+    if lead_days <= 0 or review_days < 0 or z < 0:
+        return jsonify({"error": "lead_days must be positive; review_days and z cannot be negative"}), 400
+    offset = max(0, request.args.get("offset", 0, type=int))
+
+    demand = replenishment.demand_cache.get()
+    positions, columns = replenishment.reorder_points(demand, lead_days, review_days, z)
+    return jsonify({
+        "generated_at": demand.generated_at.isoformat(),
+        "window_days": demand.window_days,
+        "lead_days": lead_days,
+        "review_days": review_days,
+        "z": z,
+        "total": len(positions),
+        "items": replenishment.describe(demand, positions[offset:offset + parse_limit()], columns)
+    })
 
 # Expiring Soon Alert
 @bp.route("/alerts/expiring-soon", methods=["GET"])
@@ -505,47 +929,40 @@ def expiring_soon_alerts():
     expiry_limit = today + timedelta(days=days)
 
     expiring_products = Product.query.filter(
-        Product.expiry_date != None,
-        Product.expiry_date <= expiry_limit
+        Product.expiration_date != None,
+        Product.expiration_date <= expiry_limit
     ).all()
     return jsonify([product.to_dict() for product in expiring_products])
 
 # Sales Analytics
 @bp.route("/analytics/profit-loss", methods=["GET"])
 def profit_loss():
-    # Optional: filter by date
+    # Optional: filter by date, bucket by time and group by product/customer
     start_date_str = request.args.get("start")
     end_date_str = request.args.get("end")
+    bucket = request.args.get("bucket")
+    group_by = request.args.get("group_by")
 
-    query = Order.query.filter_by(status="completed")
-
-    if start_date_str:
-        start_date = datetime.fromisoformat(start_date_str)
-        query = query.filter(Order.order_date >= start_date)
-    if end_date_str:
-        end_date = datetime.fromisoformat(end_date_str)
-        query = query.filter(Order.order_date <= end_date)
-
-    orders = query.all()
-
-    total_revenue = 0
-    total_cost = 0
-
-    for order in orders:
-        for item in order.items:
-            product = Product.query.get(item.product_id)
-            if product:
-                revenue = item.quantity * item.price
-                cost = item.quantity * product.cost_price
-                total_revenue += revenue
-                total_cost += cost
-
-    total_profit = total_revenue - total_cost
+    if bucket and bucket not in analytics.BUCKETS:
+        return jsonify({"error": "Invalid bucket. Use day, week or month."}), 400
+    if group_by and group_by not in analytics.GROUPINGS:
+        return jsonify({"error": "Invalid group_by. Use product or customer."}), 400
 
-    return jsonify({
-        "total_revenue": total_revenue,
-        "total_cost": total_cost,
-        "total_profit": total_profit,
+    try:
+        start_date = utc_datetime(start_date_str) if start_date_str else None
+        end_date = utc_datetime(end_date_str) if end_date_str else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use ISO 8601."}), 400
+
+    totals = analytics.profit_loss_breakdown(start_date, end_date)[0]
+    result = {
+        "total_revenue": totals["revenue"],
+        "total_cost": totals["cost"],
+        "total_profit": totals["profit"],
         "from": start_date_str,
         "to": end_date_str
-    })
+    }
+    if bucket or group_by:
+        result["breakdown"] = analytics.profit_loss_breakdown(start_date, end_date, bucket, group_by)
+
+    return jsonify(result)
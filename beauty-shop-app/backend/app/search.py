@@ -0,0 +1,115 @@
+import re
+import weakref
+
+from sqlalchemy import func, inspect, literal_column, text
+from sqlalchemy.sql import column, table
+
+from . import db
+from .dialects import dialect_name
+from .models import Product, Service
+from .pagination import escape_like
+
+# Searchable models and the text columns they index
+INDEXED = {
+    "products": (Product, ("name", "description")),
+    "services": (Service, ("name", "description")),
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(q):
+    return _TOKEN.findall(q.lower())
+
+
+# SQLite: FTS5 external-content tables kept in sync by triggers, so every
+# write path (CRUD handlers, bulk import, upserts) updates the index.
+def _sqlite_ddl(name, columns):
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    fts = f"{name}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{name}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _pg_vector(model, columns):
+    # Must match the indexed expression exactly for PostgreSQL to use the GIN index
+    parts = [func.coalesce(getattr(model, c), "") for c in columns]
+    document = parts[0]
+    for part in parts[1:]:
+        document = document.op("||")(" ").op("||")(part)
+    return func.to_tsvector("simple", document)
+
+
+def create_search_indexes(conn):
+    """Migration step: build the text indexes for the current dialect."""
+    for name, (model, columns) in INDEXED.items():
+        if conn.dialect.name == "sqlite":
+            for statement in _sqlite_ddl(name, columns):
+                conn.execute(text(statement))
+        elif conn.dialect.name == "postgresql":
+            vector = _pg_vector(model, columns).compile(
+                dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+            )
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{name}_search ON {name} USING GIN (({vector}))"
+            ))
+
+
+# Engines known to have each FTS table. Migrations create them and nothing
+# drops them, so only hits are remembered: a database upgraded while the
+# process runs is picked up on its next search.
+_fts_tables = weakref.WeakKeyDictionary()
+
+
+def _has_fts(name):
+    conn = db.session.connection()
+    known = _fts_tables.setdefault(conn.engine, set())
+    if name not in known and inspect(conn).has_table(f"{name}_fts"):
+        known.add(name)
+    return name in known
+
+
+def search(name, q, predicates=(), limit=20, prefix=True):
+    """Ranked matches for ``q`` in the ``name`` index, best first.
+
+    ``predicates`` are extra filters on the model (stock, price range). With
+    ``prefix`` the last token matches as a prefix, for typeahead.
+    """
+    model, columns = INDEXED[name]
+    tokens = tokenize(q)
+    if not tokens:
+        return []
+    dialect = dialect_name()
+
+    if dialect == "postgresql":
+        terms = tokens[:-1] + [tokens[-1] + (":*" if prefix else "")]
+        tsquery = func.to_tsquery("simple", " & ".join(terms))
+        vector = _pg_vector(model, columns)
+        return model.query.filter(vector.op("@@")(tsquery), *predicates).order_by(
+            func.ts_rank(vector, tsquery).desc(), model.id
+        ).limit(limit).all()
+
+    if dialect == "sqlite" and _has_fts(name):
+        fts = table(f"{name}_fts", column("rowid"))
+        terms = [f'"{token}"' for token in tokens]
+        if prefix:
+            terms[-1] += "*"
+        return model.query.join(fts, fts.c.rowid == model.id).filter(
+            text(f"{name}_fts MATCH :match").bindparams(match=" ".join(terms)), *predicates
+        ).order_by(func.bm25(literal_column(f"{name}_fts")), model.id).limit(limit).all()
+
+    # No text index on this database: fall back to substring matching on name
+    matches = [getattr(model, columns[0]).ilike(f"%{escape_like(token)}%", escape="\\") for token in tokens]
+    return model.query.filter(*matches, *predicates).order_by(model.id).limit(limit).all()
@@ -0,0 +1,212 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, insert
+
+from . import archive, db
+from .models import (
+    Booking, Customer, Order, OrderItem, Product, ProductSale, Service,
+    ProductSalesRollup, ServiceBookingRollup, RevokedToken, InventoryMovement, StockShard,
+    IdempotencyKey, ProductPair, RelatedProduct, ChangeEvent
+)
+
+DEFAULT_VOLUMES = {
+    "products": 1000,
+    "services": 50,
+    "customers": 1000,
+    "bookings": 5000,
+    "orders": 5000,
+    "sales": 50000,
+}
+
+SEED_PASSWORD = "password"
+
+# Word lists for readable, searchable names
+_BRANDS = ["Aura", "Bloom", "Velvet", "Lumen", "Silk", "Nova", "Petal", "Glow", "Opal", "Zest"]
+_PRODUCT_KINDS = ["Shampoo", "Conditioner", "Serum", "Toner", "Cleanser", "Lip Balm", "Hair Oil",
+                  "Face Mask", "Body Lotion", "Nail Polish", "Eye Cream", "Sunscreen"]
+_INGREDIENTS = ["argan", "rose", "jojoba", "vitamin C", "shea", "aloe", "charcoal", "coconut",
+                "green tea", "hyaluronic acid"]
+_SERVICE_KINDS = ["Haircut", "Blow Dry", "Manicure", "Pedicure", "Facial", "Massage", "Waxing",
+                  "Hair Colour", "Lash Lift", "Brow Shaping"]
+_DURATIONS = [30, 45, 60, 90]
+
+
+def _price(rng, low, high):
+    return Decimal(rng.randrange(low * 100, high * 100)) / 100
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(model, rows, batch_size):
+    """executemany ``rows`` into ``model``'s table, one commit per batch."""
+    count = 0
+    for batch in _batches(rows, batch_size):
+        db.session.execute(insert(model.__table__), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+
+def clear():
+    """Delete every row the generator writes, children first, and the archived history."""
+    for model in (ChangeEvent, RelatedProduct, ProductPair, IdempotencyKey, InventoryMovement, StockShard, RevokedToken, ProductSalesRollup,
+                  ServiceBookingRollup, OrderItem, Order, ProductSale, Booking, Customer, Service, Product):
+        db.session.execute(delete(model))
+    db.session.commit()
+    archive.clear()
+
+
+def generate(volumes=None, seed=42, batch_size=5000, now=None, progress=None):
+    """Fill the database with deterministic synthetic data; returns rows written per table.
+
+    The same ``seed``, ``volumes`` and ``now`` always produce the same rows.
+    Ids are assigned explicitly, so run it against an empty database (see
+    ``clear``). Rollups and related products are rebuilt afterwards from
+    the raw rows.
+    """
+    from .passwords import hash_password
+    from .recommendations import rebuild as rebuild_related
+    from .rollups import rebuild_rollups
+
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    rng = random.Random(seed)
+    now = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    start = now - timedelta(days=365)
+    report = progress or (lambda table, count: None)
+    written = {}
+
+    products = []
+    for product_id in range(1, volumes["products"] + 1):
+        price = _price(rng, 3, 120)
+        products.append({
+            "id": product_id,
+            "name": f"{rng.choice(_BRANDS)} {rng.choice(_INGREDIENTS).title()} "
+                    f"{rng.choice(_PRODUCT_KINDS)} {product_id}",
+            "description": f"{rng.choice(_PRODUCT_KINDS)} with {rng.choice(_INGREDIENTS)} "
+                           f"and {rng.choice(_INGREDIENTS)}",
+            "price": price,
+            "cost_price": (price * Decimal(rng.randint(30, 70)) / 100).quantize(Decimal("0.01")),
+            "quantity": rng.randint(0, 1000),
+            "expiration_date": (now + timedelta(days=rng.randint(-30, 720))).date()
+                               if rng.random() < 0.6 else None,
+            "created_at": start,
+        })
+    prices = [row["price"] for row in products]
+    costs = [row["cost_price"] for row in products]
+    written["products"] = _insert(Product, products, batch_size)
+    del products
+    report("products", written["products"])
+
+    services = [{
+        "id": service_id,
+        "name": f"{rng.choice(_BRANDS)} {rng.choice(_SERVICE_KINDS)} {service_id}",
+        "description": f"{rng.choice(_SERVICE_KINDS)} with {rng.choice(_INGREDIENTS)} treatment",
+        "price": _price(rng, 15, 200),
+        "duration_minutes": rng.choice(_DURATIONS),
+        "created_at": start,
+    } for service_id in range(1, volumes["services"] + 1)]
+    written["services"] = _insert(Service, services, batch_size)
+    report("services", written["services"])
+
+    # One KDF run shared by every customer; all log in with SEED_PASSWORD
+    password_hash = hash_password(SEED_PASSWORD)
+    customer_count = volumes["customers"]
+    written["customers"] = _insert(Customer, ({
+        "id": customer_id,
+        "name": f"Customer {customer_id}",
+        "email": f"customer{customer_id}@example.com",
+        "password_hash": password_hash,
+    } for customer_id in range(1, customer_count + 1)), batch_size)
+    report("customers", written["customers"])
+
+    # Bookings follow each other per service so none of them overlap, spread
+    # from a year ago to about a month ahead
+    per_service = max(1, volumes["bookings"] // max(1, len(services)))
+    max_gap = int(timedelta(days=395) / timedelta(minutes=15) / per_service) * 2
+
+    def bookings():
+        next_start = {service["id"]: start for service in services}
+        for booking_id in range(1, volumes["bookings"] + 1):
+            service = rng.choice(services)
+            scheduled = next_start[service["id"]] + timedelta(minutes=15 * rng.randint(0, max_gap))
+            end = scheduled + timedelta(minutes=service["duration_minutes"])
+            next_start[service["id"]] = end
+            past = scheduled < now
+            yield {
+                "id": booking_id,
+                "service_id": service["id"],
+                "customer_id": rng.randint(1, customer_count),
+                "scheduled_time": scheduled,
+                "end_time": end,
+                "price": service["price"],
+                "status": rng.choice(["completed", "completed", "cancelled"]) if past else "scheduled",
+                "payment_status": "paid" if past else "unpaid",
+                "created_at": scheduled - timedelta(days=rng.randint(0, 14)),
+            }
+    written["bookings"] = _insert(Booking, bookings(), batch_size)
+    report("bookings", written["bookings"])
+
+    # Orders and their items are generated together so totals match
+    product_count = len(prices)
+    order_ids = range(1, volumes["orders"] + 1)
+    item_id = 0
+    written["orders"] = written["order_items"] = 0
+    for batch in _batches(order_ids, batch_size):
+        orders, items = [], []
+        for order_id in batch:
+            total = Decimal("0")
+            for product_id in rng.sample(range(1, product_count + 1), min(product_count, rng.randint(1, 4))):
+                item_id += 1
+                quantity = rng.randint(1, 3)
+                price = prices[product_id - 1]
+                total += price * quantity
+                items.append({
+                    "id": item_id, "order_id": order_id, "product_id": product_id,
+                    "quantity": quantity, "price": price, "cost_price": costs[product_id - 1],
+                })
+            orders.append({
+                "id": order_id,
+                "customer_id": rng.randint(1, customer_count),
+                "total_price": total,
+                "status": rng.choices(["completed", "pending", "cancelled"], [8, 1, 1])[0],
+                "order_date": start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            })
+        db.session.execute(insert(Order.__table__), orders)
+        db.session.execute(insert(OrderItem.__table__), items)
+        db.session.commit()
+        written["orders"] += len(orders)
+        written["order_items"] += len(items)
+    report("orders", written["orders"])
+
+    def sales():
+        for sale_id in range(1, volumes["sales"] + 1):
+            product_id = rng.randint(1, product_count)
+            yield {
+                "id": sale_id,
+                "product_id": product_id,
+                "quantity_sold": rng.randint(1, 5),
+                "sale_price": prices[product_id - 1],
+                "cost_price": costs[product_id - 1],
+                "sale_date": start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            }
+    written["sales"] = _insert(ProductSale, sales(), batch_size)
+    report("sales", written["sales"])
+
+    product_rollups, service_rollups = rebuild_rollups()
+    written["rollups"] = product_rollups + service_rollups
+    report("rollups", written["rollups"])
+
+    written["product_pairs"], _ = rebuild_related()
+    report("product_pairs", written["product_pairs"])
+    return written
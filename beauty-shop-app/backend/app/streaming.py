@@ -0,0 +1,72 @@
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+from .pagination import fetch_many, paginate, page_response, parse_ids, sort_order
+
+NDJSON = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def stream_format():
+    """Return "ndjson", "json" or None for a regular paginated response.
+
+    NDJSON is negotiated through the ``Accept`` header; a chunked JSON array
+    is requested with ``stream=true``.
+    """
+    accept = request.accept_mimetypes
+    if accept.quality(NDJSON) > accept.quality("application/json"):
+        return "ndjson"
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return "json"
+    return None
+
+
+def stream_response(query, fmt, serialize=lambda obj: obj.to_dict(), batch_size=STREAM_BATCH_SIZE):
+    """Stream every row of ``query``, serializing rows as they are fetched.
+
+    Rows are pulled ``batch_size`` at a time with ``yield_per``, and each batch
+    is written out before the next one is loaded.
+    """
+    dumps = current_app.json.dumps
+    rows = query.yield_per(batch_size)
+
+    def generate_ndjson():
+        lines = []
+        for row in rows:
+            lines.append(dumps(serialize(row)))
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    def generate_array():
+        yield "["
+        parts = []
+        first = True
+        for row in rows:
+            parts.append(("" if first else ",") + dumps(serialize(row)))
+            first = False
+            if len(parts) >= batch_size:
+                yield "".join(parts)
+                parts = []
+        yield "".join(parts) + "]"
+
+    if fmt == "ndjson":
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON)
+    return Response(stream_with_context(generate_array()), mimetype="application/json")
+
+
+def list_response(query, sort_column, id_column, descending=False, serialize=lambda obj: obj.to_dict()):
+    """Paginated response by default, or the whole result streamed when requested.
+
+    ``ids=1,2,3`` instead returns just those rows, in the order asked for,
+    plus the ids that were not found.
+    """
+    ids = parse_ids()
+    if ids is not None:
+        rows, missing = fetch_many(query, id_column, ids)
+        return jsonify({"items": [serialize(row) for row in rows], "missing": missing})
+    fmt = stream_format()
+    if fmt is None:
+        return page_response(paginate(query, sort_column, id_column, descending), serialize=serialize)
+    return stream_response(query.order_by(*sort_order(sort_column, id_column, descending)), fmt, serialize)
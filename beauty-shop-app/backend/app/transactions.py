@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+
+class ShopSession(Session):
+    """Flask-SQLAlchemy session whose ``commit`` can be deferred.
+
+    Inside ``single_transaction`` a view's commit only flushes, so several
+    views can share one transaction that the caller commits or rolls back.
+    While ``info["replica"]`` holds an engine, reads go to it; flushes and
+    INSERT/UPDATE/DELETE statements always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        if self.info.get("defer_commit"):
+            self.flush()
+            return
+        super().commit()
+
+
+@contextmanager
+def single_transaction(session):
+    outer = session.info.get("defer_commit", False)
+    session.info["defer_commit"] = True
+    try:
+        yield
+    finally:
+        session.info["defer_commit"] = outer
@@ -3,5 +3,181 @@ import os
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'beautyshop.db')
+    # Signs access tokens; the fallback is for development and tests only
+    SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key-change-me")
+    # DATABASE_URL selects the engine profile: sqlite:///... or postgresql://...
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        "DATABASE_URL", 'sqlite:///' + os.path.join(BASE_DIR, 'beautyshop.db')
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite profile: WAL lets readers run alongside the single writer, and
+    # writers wait up to busy_timeout ms for the lock instead of failing
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,  # KiB, i.e. 64 MB of page cache per connection
+        "mmap_size": 268435456,
+    }
+
+    # PostgreSQL profile (psycopg2): per-process connection pool
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800
+    DB_CONNECT_TIMEOUT = 10
+
+    # Enforced only when TESTING is on; see app/query_budget.py
+    SQL_STATEMENT_BUDGET = None
+    SQL_STATEMENT_BUDGETS = {}
+
+    # Optional read replica (same schema, e.g. a PostgreSQL standby or a copy
+    # of the SQLite file). API GET requests read from it unless the client
+    # wrote within READ_REPLICA_STICKY_SECONDS, or its heartbeat lag exceeds
+    # READ_REPLICA_MAX_LAG_SECONDS (see app/replicas.py)
+    READ_REPLICA_URL = os.environ.get("READ_REPLICA_URL")
+    READ_REPLICA_STICKY_SECONDS = float(os.environ.get("READ_REPLICA_STICKY_SECONDS", 5))
+    READ_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("READ_REPLICA_MAX_LAG_SECONDS", 10))
+    READ_REPLICA_CHECK_SECONDS = 2
+
+    # Per-endpoint request metrics served at /metrics (see app/metrics.py).
+    # Set SLOW_REQUEST_MS to log the SQL of any API request slower than that.
+    METRICS_ENABLED = True
+    SLOW_REQUEST_MS = float(os.environ["SLOW_REQUEST_MS"]) if os.environ.get("SLOW_REQUEST_MS") else None
+
+    # JSON encoder for responses: "default" or "orjson" (needs the orjson package)
+    JSON_PROVIDER = os.environ.get("JSON_PROVIDER", "default")
+
+    # Response cache for catalog endpoints: "memory", "redis" or "none".
+    # Writes invalidate only the writing process's memory cache, so with
+    # several workers the others serve stale entries until they expire; use
+    # redis there, or cap memory entries with CACHE_MEMORY_MAX_TTL (seconds)
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+    CACHE_TTL = 60
+    CACHE_MEMORY_MAX_TTL = None
+    CACHE_MAXSIZE = 1024
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Apply pending schema migrations on startup (see app/migrations.py)
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+    # Opening hours used when listing free booking slots
+    BOOKING_OPEN_HOUR = 9
+    BOOKING_CLOSE_HOUR = 18
+
+    # Stock is kept in INVENTORY_SHARDS rows per product so checkouts of one
+    # product rarely wait on each other; Product.quantity is refreshed from
+    # them every INVENTORY_COMPACT_SECONDS by a background thread in each
+    # process (see app/inventory.py). With many workers, turn the threads off
+    # and run one `flask compact-inventory --interval 5` alongside them.
+    INVENTORY_SHARDS = int(os.environ.get("INVENTORY_SHARDS", 4))
+    INVENTORY_COMPACT_SECONDS = float(os.environ.get("INVENTORY_COMPACT_SECONDS", 5))
+    INVENTORY_COMPACT_IN_BACKGROUND = os.environ.get("INVENTORY_COMPACT_IN_BACKGROUND", "true").lower() in ("1", "true", "yes")
+
+    # /api/alerts/reorder: daily demand over the last REORDER_WINDOW_DAYS,
+    # cached per process for REORDER_CACHE_SECONDS. The lead time, review
+    # period and service-level z score (1.65 ~ 95%) are per-request defaults
+    REORDER_WINDOW_DAYS = 90
+    REORDER_CACHE_SECONDS = 300
+    REORDER_LEAD_TIME_DAYS = 7
+    REORDER_REVIEW_DAYS = 14
+    REORDER_SERVICE_Z = 1.65
+
+    # Related products kept per product for /api/products/<id>/related;
+    # `flask rebuild-related` recomputes them from order history
+    RELATED_PRODUCTS_TOP_K = 10
+
+    # `flask archive-history` moves closed orders, sales and bookings older
+    # than ARCHIVE_AFTER_DAYS to the ARCHIVE_DATABASE_URL database, in
+    # transactions of ARCHIVE_BATCH_SIZE rows (see app/archive.py)
+    ARCHIVE_DATABASE_URL = os.environ.get("ARCHIVE_DATABASE_URL")
+    ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+    ARCHIVE_BATCH_SIZE = 1000
+
+    # /api/admin/events change feed (see app/events.py). Each open stream
+    # holds a server thread, so EVENTS_MAX_CLIENTS must stay below the
+    # threads a process has; under gunicorn it is sized from the pool, and
+    # GUNICORN_ROLE=events runs a dedicated pool for streams (see
+    # gunicorn.conf.py). A client more than EVENTS_CLIENT_BUFFER changes
+    # behind is sent "resync"
+    EVENTS_POLL_SECONDS = 0.5
+    EVENTS_HEARTBEAT_SECONDS = 15
+    EVENTS_CLIENT_BUFFER = 1000
+    EVENTS_MAX_CLIENTS = int(os.environ.get("EVENTS_MAX_CLIENTS", 8))
+    EVENTS_REPLAY_LIMIT = 1000
+    EVENTS_RETENTION_SECONDS = 3600
+    LOW_STOCK_THRESHOLD = 5
+
+    # Access tokens issued by /api/auth/login (see app/auth.py)
+    AUTH_TOKEN_MAX_AGE = 3600
+    AUTH_REVOCATION_SYNC_SECONDS = 10
+    AUTH_CUSTOMER_CACHE_SIZE = 4096
+    AUTH_CUSTOMER_CACHE_TTL = 300
+
+    # Idempotency-Key handling for POST /api/orders and /api/sales: first
+    # responses are kept this long, a duplicate waits this long for the
+    # original, and a claim older than IDEMPOTENCY_LOCK_SECONDS is abandoned
+    IDEMPOTENCY_TTL = 86400
+    IDEMPOTENCY_WAIT_SECONDS = 10
+    IDEMPOTENCY_LOCK_SECONDS = 60
+    IDEMPOTENCY_CACHE_SIZE = 10000
+
+    # Password KDF in werkzeug's "method:params" form; raising the cost
+    # rehashes each customer's password on their next login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+
+
+class ProductionConfig(Config):
+    """Used by wsgi.py. Schema changes run once per deploy via ``flask db-upgrade``
+    (or gunicorn.conf.py), not on every worker boot."""
+    DEBUG = False
+    SECRET_KEY = os.environ.get("SECRET_KEY")  # Required: create_app refuses to start without it
+    # gunicorn runs several workers: share the cache through Redis when one
+    # is configured, otherwise keep per-worker entries about as fresh as stock
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "redis" if os.environ.get("CACHE_REDIS_URL") else "memory")
+    CACHE_MEMORY_MAX_TTL = 5
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+
+
+class TestingConfig(Config):
+    """Used by the test suite (tests/conftest.py). Every request there must stay
+    within its SQL statement budget, so an N+1 regression fails the tests."""
+    TESTING = True
+    CACHE_BACKEND = "memory"
+    # A cheap hash keeps registering and logging in test customers fast
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    # Tests compact explicitly rather than race a background thread
+    INVENTORY_COMPACT_IN_BACKGROUND = False
+
+    # Statements per request with a cold cache. Reads must not grow with the
+    # number of rows returned; writes grow only with the lines they write.
+    SQL_STATEMENT_BUDGET = 12
+    SQL_STATEMENT_BUDGETS = {
+        "api.get_products": 1,
+        "api.get_product": 1,
+        "api.get_services": 1,
+        "api.get_service": 1,
+        "api.search_catalog": 4,
+        "api.get_service_availability": 2,
+        "api.get_bookings": 1,
+        "api.get_booking": 1,
+        "api.get_product_sales": 1,
+        "api.get_all_orders": 2,
+        "api.get_orders_by_customer": 2,
+        "api.get_related_products": 1,
+        "api.get_product_movements": 1,
+        "api.get_sales_summary": 1,
+        "api.low_stock_alerts": 2,
+        "api.product_alerts": 4,
+        "api.reorder_alerts": 3,
+        "api.expiring_soon_alerts": 1,
+        "api.profit_loss": 2,
+        "api.admin_summary": 8,
+        # About 6 statements per order line, plus shard locking under contention
+        "api.place_order": 30,
+        "api.cancel_order": 30,
+        # One request per sub-operation
+        "api.run_batch": None,
+    }
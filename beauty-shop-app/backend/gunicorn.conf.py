@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+
+# GUNICORN_ROLE picks the pool this server runs:
+#
+#   api     (default) the JSON API: a few threads per worker, each request
+#           short-lived, so a worker count that follows the CPUs
+#   events  /api/admin/events only, run as a second service behind the
+#           proxy. Every open stream holds one thread for its whole life but
+#           sleeps on a condition, and the database is read by a single
+#           tailer thread per process (see app/events.py), so one process
+#           with many threads serves many dashboards cheaply.
+#
+# Streams per process are capped at EVENTS_MAX_CLIENTS. Unless it is set,
+# an events worker accepts all but EVENTS_SPARE_THREADS of its threads as
+# streams (the spare ones answer the 503 for the rest), and an API worker
+# half of its threads, so stray dashboards never take all of its threads.
+# Total capacity is workers * EVENTS_MAX_CLIENTS streams.
+role = os.environ.get("GUNICORN_ROLE", "api")
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+if role == "events":
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    threads = int(os.environ.get("GUNICORN_THREADS", 64))
+    os.environ.setdefault("EVENTS_MAX_CLIENTS", str(max(1, threads - int(os.environ.get("EVENTS_SPARE_THREADS", 4)))))
+    # The API pool compacts stock; this one only reads the change feed
+    os.environ.setdefault("INVENTORY_COMPACT_IN_BACKGROUND", "false")
+else:
+    workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+    os.environ.setdefault("EVENTS_MAX_CLIENTS", str(max(1, threads // 2)))
+# Threads make gunicorn use its gthread worker, whose timeout watches the
+# worker process rather than each request, so open streams are not killed
+worker_class = "gthread"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+accesslog = "-"
+
+# Build the app once in the master, so AUTO_MIGRATE (if enabled) runs once
+# per deploy rather than once per worker.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Connections must not be shared across processes: drop the pool
+    # inherited from the master so each worker opens its own.
+    from app import db
+    from wsgi import app
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,46 @@
+import pytest
+
+import config
+from app import create_app, db
+
+
+class _TestConfig(config.TestingConfig):
+    """Takes each test's database URI, leaving TestingConfig itself untouched."""
+
+
+@pytest.fixture
+def make_app():
+    """Create apps on given SQLite files, disposing of their engines afterwards."""
+    apps = []
+
+    def make_app(path):
+        _TestConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        apps.append(create_app(_TestConfig))
+        return apps[-1]
+    yield make_app
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    # A file database, so threads get their own connections like real workers
+    return make_app(tmp_path / "shop.db")
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Register a customer and return the Authorization header for them."""
+    def login(email="customer@example.com", password="secret"):
+        client.post("/api/auth/register", json={"name": email, "email": email, "password": password})
+        response = client.post("/api/auth/login", json={"email": email, "password": password})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+    return login
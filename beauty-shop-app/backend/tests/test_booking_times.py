@@ -0,0 +1,44 @@
+import pytest
+
+
+@pytest.fixture
+def service(client):
+    return client.post("/api/services", json={"name": "Facial", "price": 40, "duration_minutes": 60}).get_json()
+
+
+def _book(client, service, scheduled_time):
+    return client.post("/api/bookings", json={"service_id": service["id"], "customer_id": 1,
+                                              "scheduled_time": scheduled_time})
+
+
+def test_offsets_are_stored_as_utc(client, service):
+    response = _book(client, service, "2030-06-03T12:00:00+02:00")
+    assert response.status_code == 201
+    assert response.get_json()["scheduled_time"].startswith("2030-06-03T10:00:00")
+
+    # Same instant written as naive UTC conflicts with it
+    assert _book(client, service, "2030-06-03T10:30:00").status_code == 409
+
+
+def test_availability_accepts_offsets(client, service):
+    _book(client, service, "2030-06-03T10:00:00")
+    response = client.get(f"/api/services/{service['id']}/availability",
+                          query_string={"from": "2030-06-03T09:00:00+00:00", "to": "2030-06-03T13:00:00Z"})
+    assert response.status_code == 200
+    assert "2030-06-03T10:00:00" not in response.get_json()["slots"]
+
+
+def test_update_booking_with_offset_and_bad_input(client, service):
+    booking = _book(client, service, "2030-06-03T10:00:00").get_json()
+    response = client.put(f"/api/bookings/{booking['id']}", json={"scheduled_time": "2030-06-03T16:00:00+03:00"})
+    assert response.status_code == 200
+    assert response.get_json()["scheduled_time"].startswith("2030-06-03T13:00:00")
+
+    assert client.put(f"/api/bookings/{booking['id']}", json={"scheduled_time": "tomorrow"}).status_code == 400
+    assert client.put(f"/api/bookings/{booking['id']}", json={"scheduled_time": 5}).status_code == 400
+    assert client.get(f"/api/bookings/{booking['id']}").get_json()["scheduled_time"].startswith("2030-06-03T13:00:00")
+
+
+@pytest.mark.parametrize("value", ["soon", "2030-13-01T10:00:00"])
+def test_create_booking_rejects_bad_times(client, service, value):
+    assert _book(client, service, value).status_code == 400
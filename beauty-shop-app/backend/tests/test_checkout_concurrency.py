@@ -0,0 +1,107 @@
+import threading
+
+from sqlalchemy import func, select
+
+from app import db, inventory
+from app.models import InventoryMovement, OrderItem, Product, StockShard
+
+STOCK = 20
+BUYERS = 16
+ORDERS_PER_BUYER = 4
+
+
+def _add_product(app, quantity):
+    with app.app_context():
+        product = Product(name="Serum", price=25.0, cost_price=10.0, quantity=quantity)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def _on_hand(app, product_id):
+    with app.app_context():
+        rows = db.session.execute(
+            select(StockShard.quantity).where(StockShard.product_id == product_id)
+        ).scalars().all()
+        db.session.remove()
+        return rows
+
+
+def test_parallel_orders_never_oversell(app, login):
+    product_id = _add_product(app, STOCK)
+    headers = [login(f"buyer{n}@example.com") for n in range(BUYERS)]
+    statuses = []
+    lock = threading.Lock()
+    start = threading.Barrier(BUYERS)
+    done = threading.Event()
+    seen = []
+
+    def buy(auth):
+        client = app.test_client()
+        start.wait()
+        for _ in range(ORDERS_PER_BUYER):
+            response = client.post("/api/orders", headers=auth,
+                                   json={"items": [{"product_id": product_id, "quantity": 1}]})
+            with lock:
+                statuses.append(response.status_code)
+
+    def watch():
+        # Stock as other transactions see it while the orders race
+        while not done.is_set():
+            seen.append(_on_hand(app, product_id))
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    buyers = [threading.Thread(target=buy, args=(auth,)) for auth in headers]
+    for thread in buyers:
+        thread.start()
+    for thread in buyers:
+        thread.join()
+    done.set()
+    watcher.join()
+
+    assert len(statuses) == BUYERS * ORDERS_PER_BUYER
+    assert set(statuses) <= {201, 400}
+    assert statuses.count(201) == STOCK
+    assert all(amount >= 0 for shards in seen for amount in shards)
+
+    with app.app_context():
+        sold = db.session.execute(
+            select(func.sum(OrderItem.quantity)).where(OrderItem.product_id == product_id)
+        ).scalar()
+        assert sold == STOCK
+        assert sum(_on_hand(app, product_id)) == 0
+        assert db.session.execute(
+            select(func.sum(InventoryMovement.delta)).where(InventoryMovement.product_id == product_id)
+        ).scalar() == 0
+        assert inventory.ledger_mismatches() == []
+        inventory.compact()
+        db.session.commit()
+        assert db.session.get(Product, product_id).quantity == 0
+
+
+def test_parallel_multi_unit_orders_never_oversell(app, login):
+    product_id = _add_product(app, 7)
+    headers = [login(f"bulk{n}@example.com") for n in range(8)]
+    statuses = []
+    lock = threading.Lock()
+    start = threading.Barrier(len(headers))
+
+    def buy(auth):
+        client = app.test_client()
+        start.wait()
+        response = client.post("/api/orders", headers=auth,
+                               json={"items": [{"product_id": product_id, "quantity": 3}]})
+        with lock:
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=buy, args=(auth,)) for auth in headers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 7 units fit two orders of 3; whichever shards they drew, the rest are refused
+    assert statuses.count(201) == 2
+    assert statuses.count(400) == len(headers) - 2
+    assert sum(_on_hand(app, product_id)) == 1
@@ -0,0 +1,45 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from app import db
+from app.migrations import LATEST_VERSION, current_version
+from app.models import ProductSalesRollup, ServiceBookingRollup
+
+# Shipped database, as created before migrations and rollups existed
+LEGACY_DB = Path(__file__).resolve().parent.parent / "beautyshop.db"
+
+
+def test_upgrade_backfills_rollups_from_legacy_history(make_app, tmp_path):
+    path = tmp_path / "legacy.db"
+    shutil.copy(LEGACY_DB, path)
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            INSERT INTO customers (id, name, email, password_hash) VALUES (1, 'Ann', 'ann@example.com', 'x');
+            INSERT INTO products (id, name, price, quantity, created_at) VALUES (1, 'Serum', 25.0, 10, '2024-01-01');
+            INSERT INTO services (id, name, price, duration_minutes, created_at) VALUES (1, 'Facial', 40.0, 60, '2024-01-01');
+            INSERT INTO product_sales (product_id, quantity_sold, sale_price, sale_date)
+                VALUES (1, 2, 25.0, '2024-03-01 10:00:00'), (1, 1, 20.0, '2024-03-02 10:00:00');
+            INSERT INTO orders (id, customer_id, total_price, status, order_date)
+                VALUES (1, 1, 75.0, 'completed', '2024-03-01 12:00:00'), (2, 1, 25.0, 'cancelled', '2024-03-01 13:00:00');
+            INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (1, 1, 3, 25.0), (2, 1, 1, 25.0);
+            INSERT INTO bookings (service_id, customer_id, scheduled_time, status)
+                VALUES (1, 1, '2024-03-01 09:00:00', 'completed'), (1, 1, '2024-03-02 09:00:00', 'cancelled');
+        """)
+
+    app = make_app(path)
+    with app.app_context():
+        assert current_version(db.engine) == LATEST_VERSION
+        sales = db.session.execute(
+            select(ProductSalesRollup.channel, func.sum(ProductSalesRollup.units), func.sum(ProductSalesRollup.revenue))
+            .group_by(ProductSalesRollup.channel).order_by(ProductSalesRollup.channel)
+        ).all()
+        assert [(channel, units, float(revenue)) for channel, units, revenue in sales] == [
+            ("order", 3, 75.0), ("sale", 3, 70.0)
+        ]
+        bookings = db.session.execute(
+            select(func.sum(ServiceBookingRollup.bookings), func.sum(ServiceBookingRollup.revenue))
+        ).one()
+        assert (bookings[0], float(bookings[1])) == (1, 40.0)
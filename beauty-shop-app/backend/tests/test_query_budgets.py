@@ -0,0 +1,49 @@
+import pytest
+
+from app.query_budget import QueryBudgetExceeded
+
+ROWS = 8
+
+
+@pytest.fixture
+def shop(client, login):
+    """ROWS of every kind, so a per-row query in any list endpoint breaks its budget."""
+    headers = login()
+    customer_id = client.get("/api/auth/me", headers=headers).get_json()["id"]
+    products = [client.post("/api/products", json={"name": f"Rose serum {n}", "price": 10 + n, "cost_price": 4,
+                                                   "quantity": 100, "expiration_date": "2030-01-01"}).get_json()["id"]
+                for n in range(ROWS)]
+    services = [client.post("/api/services", json={"name": f"Facial {n}", "price": 40, "duration_minutes": 30})
+                .get_json()["id"] for n in range(ROWS)]
+    for n in range(ROWS):
+        assert client.post("/api/bookings", json={"service_id": services[n], "customer_id": customer_id,
+                                                  "scheduled_time": f"2030-06-03T1{n}:00:00"}).status_code == 201
+        assert client.post("/api/sales", json={"product_id": products[n], "quantity_sold": 1,
+                                               "sale_price": 10}).status_code == 201
+        items = [{"product_id": products[n], "quantity": 1}, {"product_id": products[(n + 1) % ROWS], "quantity": 2}]
+        assert client.post("/api/orders", headers=headers, json={"items": items}).status_code == 201
+    return {"headers": headers, "customer_id": customer_id, "product_id": products[0], "service_id": services[0]}
+
+
+def test_hot_endpoints_stay_within_their_statement_budgets(client, shop):
+    urls = [
+        "/api/products", "/api/products?in_stock=true", f"/api/products/{shop['product_id']}",
+        f"/api/products/{shop['product_id']}/related", f"/api/products/{shop['product_id']}/movements",
+        "/api/services", f"/api/services/{shop['service_id']}",
+        f"/api/services/{shop['service_id']}/availability?from=2030-06-01T00:00:00&to=2030-06-08T00:00:00",
+        "/api/search?q=rose", "/api/bookings", "/api/bookings?fields=status&include=service,customer",
+        "/api/sales", "/api/sales?fields=quantity_sold&include=product", "/api/sales/summary",
+        "/api/orders", "/api/orders?fields=status&include=items", f"/api/orders/customer/{shop['customer_id']}",
+        "/api/alerts/products", "/api/alerts/low-stock?threshold=200", "/api/alerts/reorder",
+        "/api/alerts/expiring-soon?days=5000", "/api/analytics/profit-loss",
+        "/api/analytics/profit-loss?bucket=month&group_by=product", "/api/admin/summary",
+    ]
+    for url in urls:
+        response = client.get(url, headers=shop["headers"])
+        assert response.status_code == 200, url
+
+
+def test_exceeding_a_budget_fails_the_request(app, client):
+    app.config["SQL_STATEMENT_BUDGETS"] = dict(app.config["SQL_STATEMENT_BUDGETS"], **{"api.get_products": 0})
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/api/products")
@@ -0,0 +1,66 @@
+from sqlalchemy import func, select
+
+from app import db
+from app.models import ProductSalesRollup, ServiceBookingRollup
+from app.rollups import rebuild_rollups
+
+
+def _rollup_totals(app):
+    with app.app_context():
+        return db.session.execute(
+            select(ProductSalesRollup.granularity, func.sum(ProductSalesRollup.units),
+                   func.sum(ProductSalesRollup.revenue), func.sum(ProductSalesRollup.cost))
+            .group_by(ProductSalesRollup.granularity).order_by(ProductSalesRollup.granularity)
+        ).all()
+
+
+def _rebuilt_totals(app):
+    with app.app_context():
+        rebuild_rollups()
+    return _rollup_totals(app)
+
+
+def test_rebuild_keeps_the_cost_recorded_at_sale_time(app, client):
+    product = client.post("/api/products", json={"name": "Serum", "price": 25, "cost_price": 10, "quantity": 50})
+    product_id = product.get_json()["id"]
+    assert client.post("/api/sales", json={"product_id": product_id, "quantity_sold": 2, "sale_price": 25}).status_code == 201
+    body = f"product_id,quantity_sold,sale_price,cost_price,sale_date\n{product_id},1,20,,2030-01-01T10:00:00\n" \
+           f"{product_id},3,20,7,2030-01-02T10:00:00\n"
+    assert client.post("/api/sales/import", data=body, content_type="text/csv").get_json()["error_count"] == 0
+
+    assert client.put(f"/api/products/{product_id}", json={"cost_price": 30}).status_code == 200
+    incremental = _rollup_totals(app)
+    assert [float(cost) for *_, cost in incremental] == [2 * 10 + 10 + 3 * 7] * len(incremental)
+    assert _rebuilt_totals(app) == incremental
+
+
+def _booking_totals(app):
+    with app.app_context():
+        return db.session.execute(
+            select(ServiceBookingRollup.granularity, func.sum(ServiceBookingRollup.bookings),
+                   func.sum(ServiceBookingRollup.revenue))
+            .group_by(ServiceBookingRollup.granularity).order_by(ServiceBookingRollup.granularity)
+        ).all()
+
+
+def test_rescheduling_backs_out_the_booked_price(app, client):
+    service_id = client.post("/api/services", json={"name": "Facial", "price": 40, "duration_minutes": 60}).get_json()["id"]
+    booking_id = client.post("/api/bookings", json={"service_id": service_id, "customer_id": 1,
+                                                    "scheduled_time": "2030-06-03T10:00:00"}).get_json()["id"]
+    assert client.put(f"/api/services/{service_id}", json={"price": 100}).status_code == 200
+
+    assert client.put(f"/api/bookings/{booking_id}", json={"scheduled_time": "2030-06-04T10:00:00"}).status_code == 200
+    totals = _booking_totals(app)
+    assert [(count, float(revenue)) for _, count, revenue in totals] == [(1, 40.0)] * len(totals)
+    with app.app_context():
+        days = db.session.execute(
+            select(ServiceBookingRollup.bucket_start, ServiceBookingRollup.revenue)
+            .where(ServiceBookingRollup.granularity == "day").order_by(ServiceBookingRollup.bucket_start)
+        ).all()
+    assert [(start.day, float(revenue)) for start, revenue in days] == [(3, 0.0), (4, 40.0)]
+    with app.app_context():
+        rebuild_rollups()
+    assert _booking_totals(app) == totals
+
+    assert client.delete(f"/api/bookings/{booking_id}").status_code == 200
+    assert [(count, float(revenue)) for _, count, revenue in _booking_totals(app)] == [(0, 0.0)] * len(totals)
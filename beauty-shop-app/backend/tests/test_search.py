@@ -0,0 +1,35 @@
+from sqlalchemy import text
+
+from app import db, search
+
+
+def _names(client, q):
+    return [product["name"] for product in client.get("/api/search", query_string={"q": q, "type": "products"})
+            .get_json()["products"]]
+
+
+def _drop_fts(app):
+    with app.app_context():
+        for statement in ("DROP TRIGGER products_fts_ai", "DROP TRIGGER products_fts_ad",
+                          "DROP TRIGGER products_fts_au", "DROP TABLE products_fts"):
+            db.session.execute(text(statement))
+        db.session.commit()
+
+
+def test_fts_lookup_is_cached_per_engine(app, client, monkeypatch):
+    client.post("/api/products", json={"name": "Rose serum", "price": 25, "quantity": 8})
+    assert _names(client, "rose") == ["Rose serum"]
+
+    def inspect(conn):
+        raise AssertionError("has_table should be cached")
+    monkeypatch.setattr(search, "inspect", inspect)
+    assert _names(client, "serum") == ["Rose serum"]
+
+
+def test_fallback_matches_wildcards_literally(app, client):
+    _drop_fts(app)
+    for name in ("oil_free toner", "oilXfree toner", "100% argan", "1000 argan"):
+        client.post("/api/products", json={"name": name, "price": 10, "quantity": 1})
+    assert _names(client, "oil_free") == ["oil_free toner"]
+    assert _names(client, "toner") == ["oil_free toner", "oilXfree toner"]
+    assert _names(client, "100 argan") == ["100% argan", "1000 argan"]
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.mark.parametrize("minutes", [0, -30, 1441, "abc"])
+def test_create_and_update_reject_bad_durations(client, minutes):
+    assert client.post("/api/services", json={"name": "Facial", "price": 40, "duration_minutes": minutes}).status_code == 400
+    service = client.post("/api/services", json={"name": "Facial", "price": 40, "duration_minutes": 60}).get_json()
+    assert client.put(f"/api/services/{service['id']}", json={"duration_minutes": minutes}).status_code == 400
+
+
+@pytest.mark.parametrize("minutes", ["0", "-30", "1441", "2000000"])
+def test_import_rejects_bad_durations(client, minutes):
+    body = f"name,price,duration_minutes\nFacial,40,{minutes}\nMassage,60,90\n"
+    report = client.post("/api/services/import", data=body, content_type="text/csv").get_json()
+    assert (report["processed"], report["error_count"]) == (1, 1)
+    assert [error["line"] for error in report["errors"]] == [2]
+    assert [service["name"] for service in client.get("/api/services").get_json()["items"]] == ["Massage"]
+
+
+def test_empty_duration_uses_the_default(client):
+    service = client.post("/api/services", json={"name": "Facial", "price": 40}).get_json()
+    assert service["duration_minutes"] is None
+    report = client.post("/api/services/import", data="name,price\nMassage,60\n", content_type="text/csv").get_json()
+    assert (report["processed"], report["error_count"]) == (1, 0)
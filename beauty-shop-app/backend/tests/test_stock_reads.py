@@ -0,0 +1,31 @@
+from app import db
+from app.models import Product
+
+
+def test_low_stock_alerts_read_live_stock_before_compaction(app, client, login):
+    headers = login()
+    low = client.post("/api/products", json={"name": "Serum", "price": 25, "quantity": 8}).get_json()["id"]
+    plenty = client.post("/api/products", json={"name": "Toner", "price": 15, "quantity": 50}).get_json()["id"]
+    untracked = client.post("/api/products", json={"name": "Mask", "price": 9, "quantity": 2}).get_json()["id"]
+    with app.app_context():
+        db.session.execute(Product.__table__.insert().values(name="Legacy", price=5, quantity=1))
+        db.session.commit()
+    assert client.post("/api/orders", headers=headers,
+                       json={"items": [{"product_id": low, "quantity": 6}]}).status_code == 201
+
+    # Compaction is off in tests, so the stored quantity still says 8
+    with app.app_context():
+        assert db.session.get(Product, low).quantity == 8
+
+    alerts = client.get("/api/alerts/low-stock").get_json()
+    assert [(row["name"], row["quantity"]) for row in alerts] == [("Serum", 2), ("Mask", 2), ("Legacy", 1)]
+    assert plenty not in [row["id"] for row in alerts] and untracked in [row["id"] for row in alerts]
+    assert client.get("/api/alerts/products").get_json()["low_stock"] == alerts
+
+
+def test_catalog_reads_state_the_stock_lag(app, client):
+    product = client.post("/api/products", json={"name": "Serum", "price": 25, "quantity": 8}).get_json()
+    lag = f"{app.config['INVENTORY_COMPACT_SECONDS']:g}"
+    assert client.get("/api/products?in_stock=true").headers["Stock-Lag-Seconds"] == lag
+    assert client.get(f"/api/products/{product['id']}").headers["Stock-Lag-Seconds"] == lag
+    assert "Stock-Lag-Seconds" not in client.get("/api/alerts/low-stock").headers
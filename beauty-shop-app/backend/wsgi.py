@@ -0,0 +1,6 @@
+import os
+
+from app import create_app
+
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app(os.environ.get("SHOP_CONFIG", "config.ProductionConfig"))